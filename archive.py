@@ -0,0 +1,379 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compact binary archives of placements.
+
+An archive holds a (potentially very large) set of placements of a single
+problem. It consists of:
+
+    - An 8 byte magic string.
+    - A little-endian 32-bit header length, followed by a JSON header holding
+      the board, the components, and the tables of positions, holes and
+      jumpers that records index into. The header is padded so that the
+      records start on an 8 byte boundary.
+    - A sequence of fixed-width records, one per placement. Each record holds
+      the index of each component's position, followed by a bitmask of
+      drilled holes and a bitmask of jumpers.
+
+Records are appended as placements arrive, so archives can be written as a
+stream, and read while they are still being written. The record layout is
+simple enough to be viewed directly with NumPy (see
+`ArchiveReader.as_array`).
+
+"""
+
+__all__ = (
+    'ArchiveReader',
+    'ArchiveWriter',
+)
+
+import json
+import mmap
+import os
+import struct
+
+import component
+import placer
+
+_MAGIC = b"STRPYAR1"
+_ALIGN = 8
+
+def _num_mask_bytes(n):
+    return (n + 7) // 8
+
+class _Layout():
+    """
+    Record layout, shared by readers and writers.
+
+    Attributes:
+        index_format: struct format character used for position indices.
+        num_components: Number of position indices in each record.
+        drilled_bytes: Size of the drilled hole bitmask.
+        jumper_bytes: Size of the jumper bitmask.
+
+    """
+
+    def __init__(self, index_format, num_components, num_holes, num_jumpers):
+        self.index_format = index_format
+        self.num_components = num_components
+        self.drilled_bytes = _num_mask_bytes(num_holes)
+        self.jumper_bytes = _num_mask_bytes(num_jumpers)
+        self.struct = struct.Struct("<{}{}{}s{}s".format(
+                                        num_components, index_format,
+                                        self.drilled_bytes, self.jumper_bytes))
+
+    @property
+    def record_size(self):
+        return self.struct.size
+
+    def pack(self, pos_idxs, drilled_mask, jumper_mask):
+        return self.struct.pack(
+                          *pos_idxs,
+                          drilled_mask.to_bytes(self.drilled_bytes, "little"),
+                          jumper_mask.to_bytes(self.jumper_bytes, "little"))
+
+    def unpack(self, buf, offset=0):
+        fields = self.struct.unpack_from(buf, offset)
+        pos_idxs = fields[:self.num_components]
+        drilled_mask = int.from_bytes(fields[-2], "little")
+        jumper_mask = int.from_bytes(fields[-1], "little")
+        return pos_idxs, drilled_mask, jumper_mask
+
+class ArchiveWriter():
+    """
+    Write placements to an archive.
+
+    The header is written on construction, and a record is written for each
+    call to `write`.
+
+    """
+
+    def __init__(self, file, board, components, *, max_jumper_length=0):
+        """
+        Initialize the writer, and write the archive header.
+
+        file: Binary file object to write to.
+        board: The board that the placements are on.
+        components: The components that are placed.
+        max_jumper_length: Maximum jumper length used when finding the
+            placements.
+
+        """
+        self._file = file
+        self._components = list(components)
+        self._holes = sorted(board.holes)
+        self._jumpers = placer.get_jumpers(board, max_jumper_length)
+        positions = {c: placer.get_positions(c, board)
+                                                     for c in self._components}
+
+        # Lookup tables mapping placement elements to indices.
+        self._pos_idx = {c: {placer.position_key(c, pos): idx
+                                    for idx, pos in enumerate(positions[c])}
+                         for c in self._components}
+        self._hole_idx = {h: idx for idx, h in enumerate(self._holes)}
+        self._jumper_idx = {j: idx for idx, j in enumerate(self._jumpers)}
+
+        max_positions = max((len(p) for p in positions.values()), default=0)
+        index_format = "H" if max_positions <= 0xffff else "I"
+        self._layout = _Layout(index_format, len(self._components),
+                               len(self._holes), len(self._jumpers))
+
+        header = {
+            'board': {
+                'holes': sorted(board.holes),
+                'spaces': sorted(board.spaces),
+                'traces': sorted(board.traces),
+            },
+            'components': [{
+                    'label': c.label,
+                    'color': c.color,
+                    'terminals': [t.label for t in c.terminals],
+                    'positions': [
+                        [[pos.terminal_positions[t] for t in c.terminals],
+                         sorted(pos.occupies)]
+                                for pos in positions[c]],
+                } for c in self._components],
+            'holes': self._holes,
+            'jumpers': self._jumpers,
+            'index_format': index_format,
+        }
+        header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        pad = -(len(_MAGIC) + 4 + len(header)) % _ALIGN
+        header += b" " * pad
+
+        file.write(_MAGIC)
+        file.write(struct.pack("<I", len(header)))
+        file.write(header)
+
+        self.count = 0
+
+    def write(self, placement):
+        """
+        Append a placement to the archive.
+
+        """
+        pos_idxs = [self._pos_idx[c][placer.position_key(c, placement[c])]
+                                                     for c in self._components]
+        drilled_mask = sum(1 << self._hole_idx[h]
+                                             for h in placement.drilled_holes)
+        jumper_mask = sum(1 << self._jumper_idx[j] for j in placement.jumpers)
+
+        self._file.write(self._layout.pack(pos_idxs, drilled_mask,
+                                           jumper_mask))
+        self.count += 1
+
+    def write_all(self, placements):
+        """
+        Append each placement in an iterable to the archive.
+
+        Returns:
+            The number of placements written.
+
+        """
+        count = 0
+        for placement in placements:
+            self.write(placement)
+            count += 1
+        return count
+
+class _ArchivedComponent(component.Component):
+    """
+    A component reconstructed from an archive header.
+
+    Only the positions recorded in the archive are available.
+
+    """
+
+    def __init__(self, label, terminal_labels, positions, *, color):
+        terminals = tuple(component.Terminal(l) for l in terminal_labels)
+        super().__init__(label, terminals, color=color)
+
+        # Express the recorded positions relative to the first terminal.
+        self._relative_positions = {}
+        for terminal_holes, occupies in positions:
+            x0, y0 = terminal_holes[0]
+            rel_holes = tuple((x - x0, y - y0) for x, y in terminal_holes)
+            rel_occupies = frozenset((x - x0, y - y0) for x, y in occupies)
+            self._relative_positions[rel_holes, rel_occupies] = None
+
+    def get_relative_positions(self):
+        for rel_holes, rel_occupies in self._relative_positions:
+            yield component.Position(rel_occupies,
+                                     zip(self.terminals, rel_holes))
+
+class ArchiveReader():
+    """
+    Read placements from an archive.
+
+    The archive is memory-mapped, and placements are constructed lazily as
+    they are accessed. The reader is a sequence of `placer.Placement` objects.
+
+    Attributes:
+        board: The board that the placements are on.
+        components: The components that are placed.
+
+    """
+
+    def __init__(self, path, components=None):
+        """
+        Open an archive.
+
+        path: Path to the archive.
+        components: Optional sequence of components, corresponding with those
+            passed to the `ArchiveWriter`. If omitted, stand-in components are
+            constructed from the archive header.
+
+        Raises:
+            ValueError: If the file is not a placement archive, or is
+                truncated.
+
+        """
+        # An empty file can't be mapped, so check there is room for the magic
+        # and header length first.
+        header_start = len(_MAGIC) + 4
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < header_start:
+                raise ValueError("{} is not a placement archive".format(path))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_len, = struct.unpack_from("<I", self._mmap, len(_MAGIC))
+        header_end = header_start + header_len
+        if (self._mmap[:len(_MAGIC)] != _MAGIC or
+                len(self._mmap) < header_end):
+            self._mmap.close()
+            raise ValueError("{} is not a placement archive".format(path))
+        header = json.loads(
+                       self._mmap[header_start:header_end].decode("utf-8"))
+        self._data_start = header_end
+
+        def to_coords(l):
+            return [tuple(h) for h in l]
+
+        board_header = header['board']
+        self.board = component.Board(
+                    to_coords(board_header['holes']),
+                    to_coords(board_header['spaces']),
+                    [to_coords(t) for t in board_header['traces']])
+
+        comp_headers = header['components']
+        if components is None:
+            components = [_ArchivedComponent(
+                              h['label'], h['terminals'],
+                              [(to_coords(terminal_holes), to_coords(occupies))
+                                  for terminal_holes, occupies
+                                                           in h['positions']],
+                              color=h['color'])
+                          for h in comp_headers]
+        self.components = list(components)
+        if len(self.components) != len(comp_headers):
+            raise ValueError("Archive has {} components, but {} were "
+                             "given".format(len(comp_headers),
+                                            len(self.components)))
+        self._comp_headers = comp_headers
+        self._positions = {}
+
+        self._holes = to_coords(header['holes'])
+        self._jumpers = [tuple(to_coords(j)) for j in header['jumpers']]
+        self._layout = _Layout(header['index_format'], len(self.components),
+                               len(self._holes), len(self._jumpers))
+
+        self._len = ((len(self._mmap) - self._data_start) //
+                                                    self._layout.record_size)
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._len
+
+    def _get_position(self, comp_idx, pos_idx):
+        # Positions are constructed on first use, and then shared between
+        # placements.
+        key = comp_idx, pos_idx
+        if key not in self._positions:
+            comp = self.components[comp_idx]
+            terminal_holes, occupies = \
+                        self._comp_headers[comp_idx]['positions'][pos_idx]
+            self._positions[key] = component.Position(
+                      (tuple(c) for c in occupies),
+                      zip(comp.terminals, (tuple(h) for h in terminal_holes)))
+        return self._positions[key]
+
+    def record(self, idx):
+        """
+        Return the raw contents of a record.
+
+        Returns:
+            A tuple `(pos_idxs, drilled_mask, jumper_mask)`.
+
+        """
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError(idx)
+        offset = self._data_start + idx * self._layout.record_size
+        return self._layout.unpack(self._mmap, offset)
+
+    def __getitem__(self, idx):
+        pos_idxs, drilled_mask, jumper_mask = self.record(idx)
+
+        mapping = {comp: self._get_position(comp_idx, pos_idx)
+                        for comp_idx, (comp, pos_idx) in
+                                 enumerate(zip(self.components, pos_idxs))}
+        drilled_holes = {h for i, h in enumerate(self._holes)
+                                                     if drilled_mask >> i & 1}
+        jumpers = {j for i, j in enumerate(self._jumpers)
+                                                     if jumper_mask >> i & 1}
+
+        return placer.Placement(self.board, mapping, drilled_holes, jumpers)
+
+    def __iter__(self):
+        for idx in range(self._len):
+            yield self[idx]
+
+    def as_array(self):
+        """
+        View the records as a NumPy structured array, without copying.
+
+        The array has fields `pos` (position index of each component),
+        `drilled` and `jumpers` (little-endian bitmasks, as bytes).
+
+        Requires NumPy.
+
+        """
+        import numpy
+
+        layout = self._layout
+        dtype = numpy.dtype([
+            ('pos', '<u{}'.format(struct.calcsize(layout.index_format)),
+                                                   (layout.num_components,)),
+            ('drilled', 'u1', (layout.drilled_bytes,)),
+            ('jumpers', 'u1', (layout.jumper_bytes,)),
+        ])
+        return numpy.frombuffer(self._mmap, dtype=dtype, count=self._len,
+                                offset=self._data_start)
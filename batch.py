@@ -0,0 +1,312 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Run many placement problems, and collect the results in one directory.
+
+Problems are either scripts, like those in `examples/`, which call
+`cli.main`, or problem files in the format described in the `netlist` module.
+A manifest lists the problems to run and the arguments to pass to each:
+
+    {
+        "jobs": [
+            {"script": "examples/dip2.py", "args": ["--max-drilled=2"]},
+            {"problem": "examples/dip2.json", "args": ["--max-drilled=2"]},
+            {"name": "dip3", "script": "examples/dip3.py",
+             "args": ["--first-only", "--max-drilled=2"],
+             "timeout": 60}
+        ]
+    }
+
+Paths are relative to the manifest. A job's name defaults to the file's name
+without its extension. `timeout` (in seconds) and `memory` (in
+megabytes) override the limits given on the command line.
+
+Each job runs in its own process, forked from this one once the placement
+modules have been imported, so jobs do not pay for interpreter start-up or
+imports. A job which runs past its timeout is killed, and one which exceeds
+its memory cap fails. Jobs share an on-disk cache of encodings and solutions.
+
+Each job is run in `<output>/<name>/`, so any files it writes (for example
+with `--svg`) end up there, along with its standard output and error
+(`stdout.txt`, `stderr.txt`) and placement statistics (`stats.json`). A
+summary of every job is written to `<output>/summary.json`.
+
+"""
+
+__all__ = (
+    'Job',
+    'main',
+    'read_manifest',
+    'run_jobs',
+)
+
+import argparse
+import collections
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import resource
+import runpy
+import sys
+import time
+import traceback
+
+# Import everything `cli.main` uses, so that jobs forked from this process
+# start with the modules already loaded.
+import cli
+import strippy
+
+# Exit status used by a job which runs out of memory.
+_MEMORY_EXIT = 3
+
+class Job(collections.namedtuple('_JobBase',
+                                 ('name', 'kind', 'path', 'args',
+                                  'timeout', 'memory'))):
+    """
+    A placement problem to be run by `run_jobs`.
+
+    Attributes:
+        name: Name of the job, which is also the name of its output
+            directory.
+        kind: "script" if `path` is a script which calls `cli.main`, or
+            "problem" if it is a problem file.
+        path: Path to the script or problem file.
+        args: List of command line arguments to pass to the script.
+        timeout: Number of seconds after which the job is killed. None
+            implies unbounded.
+        memory: Maximum address space of the job's process, in bytes. None
+            implies unbounded.
+
+    """
+
+def read_manifest(path, *, timeout=None, memory=None):
+    """
+    Read a manifest, as described in the module docstring.
+
+    timeout: Default timeout, in seconds.
+    memory: Default memory cap, in bytes.
+
+    Returns:
+        A list of `Job`s.
+
+    Raises:
+        ValueError: If an entry doesn't have exactly one of "script" and
+            "problem", or two jobs have the same name.
+
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    jobs = []
+    names = set()
+    for entry in manifest['jobs']:
+        kinds = [kind for kind in ("script", "problem") if kind in entry]
+        if len(kinds) != 1:
+            raise ValueError("Job {!r} in {} must have exactly one of "
+                             "\"script\" and \"problem\"".format(entry, path))
+        kind, = kinds
+        job_path = os.path.join(base, entry[kind])
+        name = entry.get('name',
+                         os.path.splitext(os.path.basename(job_path))[0])
+        if name in names:
+            raise ValueError("Duplicate job name {!r} in {}".format(name,
+                                                                    path))
+        names.add(name)
+        job_memory = entry.get('memory')
+        jobs.append(Job(name, kind, job_path, list(entry.get('args', [])),
+                        entry.get('timeout', timeout),
+                        (job_memory * 1024 * 1024 if job_memory is not None
+                                                  else memory)))
+    return jobs
+
+def _run_job(job, job_dir, cache_dir):
+    # Entry point of a job's process. Never returns.
+    try:
+        os.chdir(job_dir)
+
+        # Redirect at the file descriptor level, so that output from
+        # external solvers is captured too.
+        for name, fd in (("stdout.txt", 1), ("stderr.txt", 2)):
+            with open(name, "w") as f:
+                os.dup2(f.fileno(), fd)
+
+        if job.memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (job.memory, job.memory))
+
+        args = job.args + ["--stats", "json", "--stats-file", "stats.json"]
+        if cache_dir is not None:
+            args += ["--cache-dir", cache_dir]
+
+        if job.kind == "problem":
+            strippy.main(["place", job.path] + args)
+        else:
+            sys.argv = [job.path] + args
+            sys.path.insert(0, os.path.dirname(job.path))
+            runpy.run_path(job.path, run_name="__main__")
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except MemoryError:
+        status = _MEMORY_EXIT
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(status)
+
+def _pool_context():
+    # Forking shares the modules imported by this process with each job.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+def run_jobs(jobs, output_dir, *, workers=None, cache_dir=None,
+             file=sys.stderr):
+    """
+    Run jobs, with at most `workers` running at once.
+
+    output_dir: Directory to write each job's results to.
+    workers: Number of jobs to run at once. Defaults to the number of CPUs.
+    cache_dir: Directory in which to cache encodings and solutions, shared by
+        all jobs. None disables caching.
+    file: File to report progress to.
+
+    Returns:
+        A list of dicts, one per job in the order given, suitable for
+        conversion to JSON. Each has the job's `name`, `kind`, `path` and
+        `args`, its `status` (one of "ok", "failed", "timeout" or "memory"),
+        its `exit_code` and the number of `seconds` it ran for.
+
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ctx = _pool_context()
+
+    pending = collections.deque(enumerate(jobs))
+    running = {}
+    results = [None] * len(jobs)
+
+    def finish(idx, status, exit_code, start):
+        job = jobs[idx]
+        results[idx] = {
+            'name': job.name,
+            'kind': job.kind,
+            'path': job.path,
+            'args': job.args,
+            'status': status,
+            'exit_code': exit_code,
+            'seconds': time.monotonic() - start,
+        }
+        print("{}: {} ({:.2f}s)".format(job.name, status,
+                                        results[idx]['seconds']),
+              file=file)
+
+    while pending or running:
+        while pending and len(running) < workers:
+            idx, job = pending.popleft()
+            job_dir = os.path.join(output_dir, job.name)
+            os.makedirs(job_dir, exist_ok=True)
+            proc = ctx.Process(target=_run_job, args=(job, job_dir,
+                                                      cache_dir))
+            proc.start()
+            start = time.monotonic()
+            deadline = (start + job.timeout if job.timeout is not None
+                                            else None)
+            running[proc.sentinel] = proc, idx, start, deadline
+
+        now = time.monotonic()
+        deadlines = [d for _, _, _, d in running.values() if d is not None]
+        wait_time = (max(0., min(deadlines) - now) if deadlines else None)
+        ready = multiprocessing.connection.wait(list(running), wait_time)
+
+        now = time.monotonic()
+        for sentinel in list(running):
+            proc, idx, start, deadline = running[sentinel]
+            if sentinel in ready:
+                proc.join()
+                if proc.exitcode == 0:
+                    status = "ok"
+                elif proc.exitcode == _MEMORY_EXIT:
+                    status = "memory"
+                else:
+                    status = "failed"
+            elif deadline is not None and now >= deadline:
+                proc.kill()
+                proc.join()
+                status = "timeout"
+            else:
+                continue
+            del running[sentinel]
+            finish(idx, status, proc.exitcode, start)
+
+    return results
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+                          description='Run a batch of placement problems.')
+    parser.add_argument('manifest', help="Manifest listing the problems")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Directory to write results to")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of problems to run at once. Defaults "
+                             "to the number of CPUs.")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Default number of seconds after which a "
+                             "problem is stopped")
+    parser.add_argument('--memory', type=int, default=None,
+                        help="Default memory cap for each problem, in "
+                             "megabytes")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory in which to cache encodings and "
+                             "solutions. Defaults to a directory named "
+                             "'cache' in the output directory.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Disable caching")
+
+    parsed_args = parser.parse_args(args if args is not None else sys.argv[1:])
+
+    memory = (parsed_args.memory * 1024 * 1024
+                             if parsed_args.memory is not None else None)
+    jobs = read_manifest(parsed_args.manifest, timeout=parsed_args.timeout,
+                         memory=memory)
+
+    output_dir = os.path.abspath(parsed_args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    if parsed_args.no_cache:
+        cache_dir = None
+    else:
+        cache_dir = os.path.abspath(parsed_args.cache_dir or
+                                    os.path.join(output_dir, "cache"))
+
+    results = run_jobs(jobs, output_dir, workers=parsed_args.workers,
+                       cache_dir=cache_dir)
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(results, f, indent=2)
+
+    if any(r['status'] != "ok" for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
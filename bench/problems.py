@@ -0,0 +1,161 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Generators for families of benchmark problems.
+
+Each generator returns a `Problem`. Components are created afresh on each
+call, since a component's terminals may only belong to one component.
+
+"""
+
+__all__ = (
+    'astable',
+    'dip_resistors',
+    'Problem',
+    'resistor_ring',
+    'SUITES',
+)
+
+import collections
+
+import component
+
+class Problem(collections.namedtuple('_ProblemBase',
+                        ('name', 'board', 'components', 'nets', 'options'))):
+    """
+    A benchmark placement problem.
+
+    Attributes:
+        name: Name used to identify the problem in results.
+        board, components, nets: Arguments for `placer.place`.
+        options: Dict of keyword arguments for `placer.place`.
+
+    """
+    pass
+
+def resistor_ring(n, width, height, *, max_length=1, **options):
+    """
+    `n` resistors on a `width` x `height` strip board, joined in a ring.
+
+    """
+    resistors = [component.Resistor("R{}".format(i + 1), max_length)
+                                                           for i in range(n)]
+    nets = [(resistors[i].terminals[1], resistors[(i + 1) % n].terminals[0])
+                                                           for i in range(n)]
+
+    options.setdefault('max_drilled', 0)
+    return Problem("resistor_ring(n={}, size={}x{})".format(n, width, height),
+                   component.StripBoard((width, height)),
+                   resistors, nets, options)
+
+def dip_resistors(num_pins, width, height, *, across=False, row_spacing=2,
+                  max_length=1, **options):
+    """
+    A DIP package with a resistor joining each pair of pins.
+
+    If `across` is false, resistors join adjacent pins (1 to 2, 3 to 4, and so
+    on), as in `examples/dip2.py`. Otherwise resistors join opposite pins (1 to
+    `num_pins`, 2 to `num_pins - 1`, and so on), as in `examples/dip3.py`.
+
+    """
+    ic = component.DualInlinePackage("IC1", num_pins, row_spacing=row_spacing)
+    resistors = [component.Resistor("R{}".format(i + 1), max_length)
+                                                 for i in range(num_pins // 2)]
+
+    if across:
+        pairs = [(i, num_pins - 1 - i) for i in range(num_pins // 2)]
+    else:
+        pairs = [(2 * i, 2 * i + 1) for i in range(num_pins // 2)]
+    nets = [net for r, (p1, p2) in zip(resistors, pairs)
+                for net in ((ic.terminals[p1], r.terminals[0]),
+                            (ic.terminals[p2], r.terminals[1]))]
+
+    options.setdefault('max_drilled', num_pins // 2)
+    return Problem("dip_resistors(pins={}, size={}x{}, across={})".format(
+                        num_pins, width, height, across),
+                   component.StripBoard((width, height)),
+                   [ic] + resistors, nets, options)
+
+def astable(width, height, *, max_length=4, **options):
+    """
+    A 555 astable circuit (as in `examples/astable.py`) on a board of a given
+    size, with a given maximum lead length for the passive components.
+
+    """
+    ic555 = component.DualInlinePackage("555", 8)
+    r1 = component.Resistor("R1", max_length)
+    r2 = component.Resistor("R2", max_length)
+    c1 = component.Capacitor("C1", max_length)
+    c2 = component.Capacitor("C2", max_length)
+
+    nets = (
+        (r1.terminals[0], ic555.terminals[3], ic555.terminals[7]),
+        (r1.terminals[1], ic555.terminals[6], r2.terminals[0]),
+        (r2.terminals[1], ic555.terminals[5], ic555.terminals[1],
+                                                            c1.terminals[0]),
+        (c1.terminals[1], ic555.terminals[0], c2.terminals[1]),
+        (c2.terminals[0], ic555.terminals[4]),
+        (ic555.terminals[2],)
+    )
+
+    options.setdefault('max_drilled', 0)
+    return Problem("astable(size={}x{}, max_length={})".format(width, height,
+                                                               max_length),
+                   component.StripBoard((width, height)),
+                   (ic555, r1, r2, c1, c2), nets, options)
+
+# Named suites of problems. Each entry is a function that builds the problem,
+# so that components are not shared between runs.
+SUITES = {
+    'quick': [
+        lambda: resistor_ring(2, 2, 2),
+        lambda: resistor_ring(4, 3, 4, max_length=2),
+        lambda: dip_resistors(4, 5, 2),
+        lambda: dip_resistors(4, 5, 3),
+        lambda: dip_resistors(4, 5, 4, across=True, max_jumpers=2,
+                              max_jumper_length=1),
+    ],
+    'full': [
+        lambda: resistor_ring(2, 2, 2),
+        lambda: resistor_ring(4, 3, 4, max_length=2),
+        lambda: resistor_ring(6, 4, 6, max_length=2),
+        lambda: dip_resistors(4, 5, 2),
+        lambda: dip_resistors(4, 5, 3),
+        lambda: dip_resistors(4, 5, 4, across=True, max_jumpers=2,
+                              max_jumper_length=1),
+        lambda: dip_resistors(8, 9, 4),
+        lambda: dip_resistors(4, 6, 5, across=True, max_jumpers=2,
+                              max_jumper_length=2),
+    ],
+    # Problems which take many minutes each, so are only run on request.
+    'slow': [
+        lambda: dip_resistors(6, 7, 6, across=True, max_length=3,
+                              max_jumpers=3, max_jumper_length=3),
+        # The 555's opposite pins share strips, and two of its nets join pins
+        # on different strips, so it needs drilled holes and jumpers, and a
+        # board with room around it for them.
+        lambda: astable(10, 7, max_length=2, max_drilled=4, max_jumpers=5,
+                        max_jumper_length=4),
+        lambda: astable(10, 7, max_drilled=4, max_jumpers=5,
+                        max_jumper_length=4),
+    ],
+}
@@ -0,0 +1,291 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Run benchmark suites, and compare the results of different runs.
+
+Each problem is run in a fresh interpreter, so that peak memory usage can be
+measured in isolation. The time spent in each phase of `placer.place` is
+measured with `instrument.Stats`.
+
+"""
+
+__all__ = (
+    'compare',
+    'main',
+    'run_problem',
+    'run_suite',
+)
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import instrument
+import placer
+import solver
+
+from bench import problems
+
+_RESULTS_VERSION = 1
+
+def run_problem(problem, *, max_solutions=None, trace_memory=False):
+    """
+    Run a single problem in this process.
+
+    max_solutions: Stop enumerating after this many solutions. None implies
+        no limit.
+    trace_memory: If set, also measure the peak memory allocated by Python
+        code using tracemalloc. This slows down the run considerably.
+
+    Returns:
+        A dict of measurements, suitable for conversion to JSON.
+
+    """
+    stats = instrument.Stats()
+    timings = {}
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    placements = placer.place(problem.board, problem.components,
+                              problem.nets, hooks=stats, **problem.options)
+
+    num_solutions = 0
+    infeasible = None
+    try:
+        for _ in placements:
+            if num_solutions == 0:
+                timings['first_solution'] = time.perf_counter() - start
+            num_solutions += 1
+            if max_solutions is not None and num_solutions >= max_solutions:
+                break
+    except placer.Infeasible as e:
+        infeasible = e.reason
+    placements.close()
+    timings['total'] = time.perf_counter() - start
+
+    for phase, timer in stats.timers.items():
+        timings[phase] = timer.seconds
+    timings['enumerate'] = timings['total'] - timings.get('encode', 0.)
+
+    out = {
+        'name': problem.name,
+        'phases': timings,
+        'counts': {
+            'solutions': num_solutions,
+            'truncated': (max_solutions is not None and
+                          num_solutions >= max_solutions),
+            'infeasible': infeasible,
+            'vars': stats.counters['vars'],
+            'clauses': stats.counters['clauses'],
+            'literals': stats.counters['literals'],
+        },
+        'families': stats.as_dict()['families'],
+        # ru_maxrss is in kilobytes on Linux.
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    if trace_memory:
+        out['peak_traced_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    return out
+
+def _run_in_child(suite, idx, kwargs):
+    # Converting deeply nested formulae to CNF requires a lot of recursion.
+    sys.setrecursionlimit(100000)
+    return run_problem(problems.SUITES[suite][idx](), **kwargs)
+
+def run_suite(suite, *, repeat=1, **kwargs):
+    """
+    Run each problem in a suite in a fresh interpreter.
+
+    repeat: Number of times to run each problem. The minimum time of each
+        phase, and the maximum peak memory usage are reported.
+
+    Other keyword arguments are passed to `run_problem`.
+
+    Raises:
+        RuntimeError: If a problem in the suite has no solutions.
+
+    Returns:
+        A dict of results, suitable for conversion to JSON.
+
+    """
+    ctx = multiprocessing.get_context("spawn")
+
+    results = []
+    for idx in range(len(problems.SUITES[suite])):
+        runs = []
+        for _ in range(repeat):
+            # Use a fresh process for each run, so that peak memory usage
+            # reflects only this problem.
+            with ctx.Pool(1) as pool:
+                runs.append(pool.apply(_run_in_child, (suite, idx, kwargs)))
+
+        result = runs[0]
+
+        # A problem without solutions only measures how quickly it is ruled
+        # out, rather than the work of placing it.
+        counts = result['counts']
+        if counts['infeasible'] is not None:
+            raise RuntimeError("Problem {} is infeasible: {}".format(
+                                   result['name'], counts['infeasible']))
+        if counts['solutions'] == 0:
+            raise RuntimeError("Problem {} has no solutions".format(
+                                   result['name']))
+
+        for run in runs[1:]:
+            for phase, t in run['phases'].items():
+                result['phases'][phase] = min(result['phases'][phase], t)
+            result['peak_rss_kb'] = max(result['peak_rss_kb'],
+                                        run['peak_rss_kb'])
+        results.append(result)
+
+        print("{}: {:.3f}s, {} solutions".format(
+                  result['name'], result['phases']['total'],
+                  result['counts']['solutions']),
+              file=sys.stderr)
+
+    return {
+        'version': _RESULTS_VERSION,
+        'suite': suite,
+        'environment': {
+            'python': platform.python_version(),
+            'solver': solver.make_solver().version,
+            'encoding_version': placer.ENCODING_VERSION,
+        },
+        'results': results,
+    }
+
+def compare(old, new, *, threshold=0.2, min_time=0.05, file=sys.stdout):
+    """
+    Compare two sets of results, as returned by `run_suite`.
+
+    A phase is reported as a regression if it is slower by more than a
+    fraction `threshold`, ignoring phases that take less than `min_time`
+    seconds in both runs.
+
+    Returns:
+        A list of `(problem name, phase, old time, new time)` tuples, one for
+        each regression.
+
+    """
+    old_results = {r['name']: r for r in old['results']}
+
+    regressions = []
+    for new_result in new['results']:
+        name = new_result['name']
+        if name not in old_results:
+            print("{}: not in baseline".format(name), file=file)
+            continue
+        old_result = old_results[name]
+
+        print(name, file=file)
+        for phase in sorted(new_result['phases']):
+            if phase not in old_result['phases']:
+                continue
+            t_old = old_result['phases'][phase]
+            t_new = new_result['phases'][phase]
+            ratio = t_new / t_old if t_old > 0 else float('inf')
+
+            flag = ""
+            if (max(t_old, t_new) >= min_time and
+                t_new > t_old * (1. + threshold)):
+                flag = "  REGRESSION"
+                regressions.append((name, phase, t_old, t_new))
+            print("    {:24} {:10.4f} {:10.4f} {:8.2f}x{}".format(
+                      phase, t_old, t_new, ratio, flag),
+                  file=file)
+
+        for key in ('peak_rss_kb',):
+            print("    {:24} {:10} {:10}".format(
+                       key, old_result[key], new_result[key]),
+                  file=file)
+        if old_result['counts'] != new_result['counts']:
+            print("    counts differ: {} -> {}".format(
+                        old_result['counts'], new_result['counts']),
+                  file=file)
+
+    return regressions
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Placer benchmarks.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="Run a benchmark suite")
+    run_parser.add_argument('--suite', default='quick',
+                            choices=sorted(problems.SUITES.keys()),
+                            help="Suite to run")
+    run_parser.add_argument('--repeat', type=int, default=1,
+                            help="Number of runs of each problem")
+    run_parser.add_argument('--max-solutions', type=int, default=1000,
+                            help="Stop enumerating solutions after this many. "
+                                 "Passing -1 means no limit.")
+    run_parser.add_argument('--trace-memory', action='store_true',
+                            help="Measure peak Python memory allocation with "
+                                 "tracemalloc")
+    run_parser.add_argument('-o', '--output', default=None,
+                            help="File to write results to. Defaults to "
+                                 "stdout.")
+
+    compare_parser = subparsers.add_parser(
+                         'compare', help="Compare results against a baseline")
+    compare_parser.add_argument('baseline', help="Baseline results file")
+    compare_parser.add_argument('results', help="Results file to compare")
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help="Relative slowdown which counts as a "
+                                     "regression")
+    compare_parser.add_argument('--min-time', type=float, default=0.05,
+                                help="Ignore phases which take less than this "
+                                     "many seconds")
+
+    parsed_args = parser.parse_args(args if args is not None else sys.argv[1:])
+
+    if parsed_args.command == 'run':
+        max_solutions = (None if parsed_args.max_solutions == -1
+                                              else parsed_args.max_solutions)
+        results = run_suite(parsed_args.suite,
+                            repeat=parsed_args.repeat,
+                            max_solutions=max_solutions,
+                            trace_memory=parsed_args.trace_memory)
+        if parsed_args.output:
+            with open(parsed_args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+    else:
+        with open(parsed_args.baseline) as f:
+            old = json.load(f)
+        with open(parsed_args.results) as f:
+            new = json.load(f)
+        regressions = compare(old, new, threshold=parsed_args.threshold,
+                              min_time=parsed_args.min_time)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,223 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+On-disk cache for expensive intermediate results.
+
+Entries are arbitrary picklable objects, identified by a string key (typically
+a fingerprint produced by `placer.fingerprint`). Each entry is stored in its
+own zlib compressed file, which is decompressed in full when the entry is
+loaded. The least recently used entries are evicted once the cache grows
+beyond its limits.
+
+`MemoryCache` has the same interface, but keeps entries in memory, for long
+running processes.
+
+"""
+
+__all__ = (
+    'Cache',
+    'MemoryCache',
+)
+
+import collections
+import os
+import pickle
+import tempfile
+import threading
+import zlib
+
+class Cache():
+    """
+    A directory of cached objects, with LRU eviction.
+
+    Recency is tracked using the modification time of each entry's file, which
+    is bumped whenever the entry is loaded.
+
+    Attributes:
+        directory: Directory in which the entries are stored. It is created
+            if it does not already exist.
+        max_entries: Maximum number of entries to keep. None implies
+            unbounded.
+        max_bytes: Maximum total (compressed) size of the entries to keep.
+            None implies unbounded.
+
+    """
+
+    _SUFFIX = ".cache"
+
+    def __init__(self, directory, *, max_entries=64, max_bytes=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self._SUFFIX)
+
+    def load(self, key):
+        """
+        Return the object stored under `key`, or None if there isn't one.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            obj = pickle.loads(zlib.decompress(data))
+        except Exception:
+            # A truncated or corrupt entry can fail to unpickle in many ways
+            # (eg. EOFError, or AttributeError if it refers to a class which no
+            # longer exists). Treat it as a miss, and remove it so that it is
+            # replaced.
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return obj
+
+    def store(self, key, obj):
+        """
+        Store an object under `key`, replacing any existing entry.
+
+        The entry is written to a temporary file first, so that concurrent
+        readers never see a partially written entry. An object which is larger
+        than `max_bytes` by itself is not stored.
+
+        """
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove least recently used entries until the limits are respected.
+
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self._SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort(reverse=True)
+
+        # Only the entries which are kept count towards the limits, so an
+        # entry which doesn't fit doesn't cause older (smaller) entries to be
+        # evicted too.
+        num_kept = 0
+        total_bytes = 0
+        for _, size, path in entries:
+            if ((self.max_entries is None or num_kept < self.max_entries) and
+                (self.max_bytes is None or
+                                     total_bytes + size <= self.max_bytes)):
+                num_kept += 1
+                total_bytes += size
+            else:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+class MemoryCache():
+    """
+    An in-memory cache of objects, with LRU eviction.
+
+    Objects are stored by reference, so they must not be modified once
+    stored. The cache may be shared between threads.
+
+    Attributes:
+        max_entries: Maximum number of entries to keep. None implies
+            unbounded.
+        backing: Optional `Cache` which entries are also written to, and
+            which is consulted on a miss.
+
+    """
+
+    def __init__(self, *, max_entries=16, backing=None):
+        self.max_entries = max_entries
+        self.backing = backing
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        """
+        Return the object stored under `key`, or None if there isn't one.
+
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.backing is None:
+            return None
+        obj = self.backing.load(key)
+        if obj is not None:
+            self._insert(key, obj)
+        return obj
+
+    def store(self, key, obj):
+        """
+        Store an object under `key`, replacing any existing entry.
+
+        """
+        self._insert(key, obj)
+        if self.backing is not None:
+            self.backing.store(key, obj)
+
+    def _insert(self, key, obj):
+        with self._lock:
+            self._entries[key] = obj
+            self._entries.move_to_end(key)
+            while (self.max_entries is not None and
+                   len(self._entries) > self.max_entries):
+                self._entries.popitem(last=False)
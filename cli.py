@@ -28,18 +28,64 @@ __all__ = (
 )
 
 import argparse
+import contextlib
+import itertools
+import json
+import os
 import sys
 
+import archive
+import cache
+import instrument
 import placer
+import profiling
 import solver
 import svg
 
-def main(board, components, nets, args=None):
+def _parse_cell(s):
+    x, y = s.split(",")
+    return int(x), int(y)
+
+def _parse_weight(s):
+    name, value = s.split("=")
+    if name not in placer.QUALITY_METRICS:
+        raise argparse.ArgumentTypeError(
+                "Unknown metric {!r}; choose from {}".format(
+                                   name, ", ".join(placer.QUALITY_METRICS)))
+    return name, float(value)
+
+def _print_ranked(ranked):
+    """
+    Print the cost of each ranked placement, and return the placements.
+
+    """
+    for i, r in enumerate(ranked):
+        print("#{} cost {:g}: {}".format(
+                  i + 1, r.cost,
+                  ", ".join("{}={}".format(name, value)
+                                for name, value in zip(r.quality._fields,
+                                                       r.quality))),
+              file=sys.stderr)
+    return iter([r.placement for r in ranked])
+
+def main(board, components, nets, args=None, *,
+         pins=None, keep_out=None, component_keep_out=None):
+    """
+    Parse command line arguments, and solve a placement problem.
+
+    `pins`, `keep_out` and `component_keep_out` are passed to
+    `placer.place`. Cells passed with --keep-out are added to `keep_out`.
+
+    """
     sys.setrecursionlimit(100000)
 
     parser = argparse.ArgumentParser( description='Find circuit placements.')
     parser.add_argument('--first-only', action='store_true',
                         help="Only output the first solution")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the predicted size of the problem's "
+                             "encoding, rather than solving it. The output "
+                             "is JSON if --stats=json is also passed.")
     parser.add_argument('--max-drilled', nargs='?', type=int, default=0,
                         help="Maximum number of holes to allow to be drilled "
                              "out. Passing -1 means no limit.")
@@ -48,45 +94,296 @@ def main(board, components, nets, args=None):
                              "means no limit.")
     parser.add_argument('--max-jumper-length', nargs='?', type=int, default=0,
                         help="Maximum jumper length")
+    parser.add_argument('--keep-out', action='append', type=_parse_cell,
+                        default=[], metavar='X,Y',
+                        help="Cell which no component or jumper may "
+                             "occupy. May be passed multiple times.")
+    parser.add_argument('--eco', nargs='?', type=str, default=None,
+                        metavar='ARCHIVE',
+                        help="Re-place after a change to the problem, moving "
+                             "as few components as possible from the first "
+                             "placement in the given archive. Components are "
+                             "matched by label.")
+    parser.add_argument('--max-moves', nargs='?', type=int, default=None,
+                        help="With --eco, the maximum number of components "
+                             "which may be moved")
+    parser.add_argument('--auto-size', action='store_true',
+                        help="Find the smallest strip board, no larger than "
+                             "the given board, which has a placement, and "
+                             "output one placement on it")
+    parser.add_argument('--size-order', nargs='?', type=str, default='area',
+                        choices=placer.SIZE_ORDERS,
+                        help="Order in which --auto-size tries board sizes: "
+                             "by area, or by rows then columns")
+    parser.add_argument('--sweep', action='store_true',
+                        help="Try every combination of limits up to "
+                             "--max-drilled, --max-jumpers and "
+                             "--max-jumper-length, and output a placement "
+                             "for each combination on the Pareto front")
+    parser.add_argument('--workers', nargs='?', type=int, default=None,
+                        help="Number of worker processes used to build the "
+                             "encoding, and by --sweep to solve. Defaults to "
+                             "one, or the number of CPUs for --sweep.")
+    parser.add_argument('--top', nargs='?', type=int, default=None,
+                        metavar='K',
+                        help="Only output the K best placements, lowest "
+                             "cost first. The cost is a weighted sum of "
+                             "the metrics in placer.Quality.")
+    parser.add_argument('--weight', action='append', type=_parse_weight,
+                        default=[], metavar='METRIC=WEIGHT',
+                        help="Weight of a metric in the cost used by --top. "
+                             "Metrics are {}, and each has a weight of 1 by "
+                             "default. May be passed multiple times."
+                             .format(", ".join(placer.QUALITY_METRICS)))
+    parser.add_argument('--prune', action='store_true',
+                        help="With --top, have the solver skip placements "
+                             "which cannot beat the K found so far")
     parser.add_argument('--svg', nargs='?', const=True,
-                        help="Output SVG for the solutions")
+                        help="Output SVG for the solutions, to the given "
+                             "file or to standard output. Solutions appear "
+                             "in a file as they are found, but output to a "
+                             "pipe or terminal only appears once every "
+                             "solution has been found, since the document's "
+                             "size is written last. Use --svg-pages to see "
+                             "solutions as they are found.")
+    parser.add_argument('--svg-pages', nargs='?', type=str, default=None,
+                        help="Output SVG for the solutions as a series of "
+                             "pages. The argument is a path containing {}, "
+                             "which is replaced with the page number.")
+    parser.add_argument('--svg-per-page', nargs='?', type=int, default=1,
+                        help="Number of solutions on each page output by "
+                             "--svg-pages")
+    parser.add_argument('--heatmap', nargs='?', type=str, default=None,
+                        help="Output an SVG heatmap summarising all of the "
+                             "solutions, rather than drawing each one")
+    parser.add_argument('--archive', nargs='?', type=str, default=None,
+                        help="Write the solutions to a binary archive, "
+                             "rather than printing them")
     parser.add_argument('--solver', nargs='?', type=str, default=None,
                         help="Solver to use. Options are: {}.".format(
                             ", ".join(str(x) for x in solver.solvers.keys())))
+    parser.add_argument('--seed', nargs='?', type=int, default=None,
+                        help="Seed which varies the order in which the "
+                             "solver searches for solutions")
+    parser.add_argument('--solver-log', nargs='?', type=str, default=None,
+                        help="File to write the solver's progress, and the "
+                             "value of each variable in each solution, to")
+    parser.add_argument('--cache-dir', nargs='?', type=str, default=None,
+                        help="Directory in which to cache encodings of, "
+                             "and solutions to, placement problems")
+    parser.add_argument('--stats', nargs='?', type=str, default=None,
+                        choices=('text', 'json'),
+                        help="Report the time spent in each phase of "
+                             "placement, and the size of each family of "
+                             "constraints, in the given format")
+    parser.add_argument('--stats-file', nargs='?', type=str, default=None,
+                        help="File to write --stats output to. Defaults to "
+                             "stderr.")
+    parser.add_argument('--profile', nargs='?', type=str, default=None,
+                        choices=profiling.MODES,
+                        help="Profile CPU usage or memory allocation in each "
+                             "phase of placement")
+    parser.add_argument('--profile-dir', nargs='?', type=str,
+                        default="profile",
+                        help="Directory to write per-phase profiles to")
 
     parsed_args = parser.parse_args(args if args is not None else sys.argv[1:])
+    if parsed_args.sweep and -1 in (parsed_args.max_drilled,
+                                    parsed_args.max_jumpers):
+        parser.error("--sweep requires --max-drilled and --max-jumpers to be "
+                     "limited")
+    if parsed_args.eco:
+        with archive.ArchiveReader(parsed_args.eco) as reader:
+            try:
+                previous = reader[0]
+            except IndexError:
+                parser.error("--eco archive {} contains no placements".format(
+                                 parsed_args.eco))
+
+    solver_log = (open(parsed_args.solver_log, "w")
+                                      if parsed_args.solver_log else None)
+    slvr = solver.make_solver(parsed_args.solver or solver.DEFAULT_SOLVER,
+                              seed=parsed_args.seed, log=solver_log)
 
-    if parsed_args.solver:
-        slvr = solver.solvers[parsed_args.solver]
+    if parsed_args.cache_dir:
+        encoding_cache = cache.Cache(
+                           os.path.join(parsed_args.cache_dir, "encodings"))
+        solution_cache = cache.Cache(
+                           os.path.join(parsed_args.cache_dir, "solutions"))
     else:
-        slvr = None
+        encoding_cache = solution_cache = None
+
+    if parsed_args.profile:
+        stats = profiling.Profiler(parsed_args.profile)
+        profile_context = stats
+    else:
+        stats = instrument.Stats() if parsed_args.stats else None
+        profile_context = contextlib.nullcontext()
 
     max_drilled = (None if parsed_args.max_drilled == -1
                                                   else parsed_args.max_drilled)
     max_jumpers = (None if parsed_args.max_jumpers == -1
                                                   else parsed_args.max_jumpers)
-    placement_iter = placer.place(
+    weights = dict(parsed_args.weight)
+    restrictions = {
+        'pins': pins,
+        'keep_out': set(keep_out or ()) | set(parsed_args.keep_out),
+        'component_keep_out': component_keep_out,
+    }
+
+    if parsed_args.dry_run:
+        estimate = placer.estimate(
                           board, components, nets,
                           max_drilled=max_drilled,
                           max_jumpers=max_jumpers,
                           max_jumper_length=parsed_args.max_jumper_length,
-                          slvr=slvr)
+                          **restrictions)
+        if parsed_args.stats == 'json':
+            json.dump(estimate.as_dict(), sys.stdout, indent=2)
+            print()
+        else:
+            estimate.print_text()
+        return
 
-    if parsed_args.first_only:
-        placement_iter = [next(placement_iter)]
+    # `place` would also raise this, but checking first avoids writing
+    # partial output files. Smaller boards are checked by `place_smallest`.
+    if not parsed_args.auto_size:
+        try:
+            placer.check(board, components, nets,
+                         max_drilled=max_drilled,
+                         max_jumpers=max_jumpers,
+                         max_jumper_length=parsed_args.max_jumper_length,
+                         **restrictions)
+        except placer.Infeasible as e:
+            print("No solutions: {}".format(e.reason), file=sys.stderr)
+            sys.exit(1)
 
-    if not parsed_args.svg:
-        count = 0
-        for placement in placement_iter:
-            placement.print_solution()
-            print()
-            count += 1
-        print("{} solutions".format(count))
-    else:
-        if isinstance(parsed_args.svg, str):
-            with open(parsed_args.svg, "w") as f:
-                svg.print_svg(placement_iter, file=f)
+    with profile_context:
+        if parsed_args.auto_size:
+            max_size = (max(x for x, y in board.holes) + 1,
+                        max(y for x, y in board.holes) + 1)
+            try:
+                size, placement = placer.place_smallest(
+                              components, nets, max_size,
+                              order=parsed_args.size_order,
+                              max_drilled=max_drilled,
+                              max_jumpers=max_jumpers,
+                              max_jumper_length=parsed_args.max_jumper_length,
+                              slvr=slvr,
+                              encoding_cache=encoding_cache,
+                              workers=parsed_args.workers or 1,
+                              hooks=stats,
+                              **restrictions)
+            except placer.Infeasible as e:
+                print("No solutions: {}".format(e.reason), file=sys.stderr)
+                sys.exit(1)
+            print("Board size: {}x{}".format(*size), file=sys.stderr)
+            placement_iter = iter([placement])
+        elif parsed_args.sweep:
+            points = placer.sweep(
+                          board, components, nets,
+                          drilled=range(max_drilled + 1),
+                          jumpers=range(max_jumpers + 1),
+                          jumper_lengths=(
+                              range(parsed_args.max_jumper_length + 1)
+                                                   if max_jumpers else (0,)),
+                          slvr=slvr,
+                          encoding_cache=encoding_cache,
+                          workers=parsed_args.workers,
+                          hooks=stats,
+                          **restrictions)
+            front = placer.pareto_front(points)
+            for point in front:
+                print("Feasible: max_jumper_length={} max_drilled={} "
+                      "max_jumpers={}".format(*point.limits),
+                      file=sys.stderr)
+            placement_iter = (point.placement for point in front)
+        elif parsed_args.eco:
+            placement_iter = placer.eco(
+                              previous, board, components, nets,
+                              max_moves=parsed_args.max_moves,
+                              max_drilled=max_drilled,
+                              max_jumpers=max_jumpers,
+                              max_jumper_length=parsed_args.max_jumper_length,
+                              slvr=slvr,
+                              encoding_cache=encoding_cache,
+                              workers=parsed_args.workers or 1,
+                              hooks=stats,
+                              **restrictions)
+            if parsed_args.top is not None:
+                placement_iter = _print_ranked(
+                              placer.rank(placement_iter, nets,
+                                          parsed_args.top, weights=weights,
+                                          hooks=stats))
+        elif parsed_args.top is not None:
+            placement_iter = _print_ranked(placer.place_best(
+                              board, components, nets, parsed_args.top,
+                              weights=weights,
+                              prune=parsed_args.prune,
+                              max_drilled=max_drilled,
+                              max_jumpers=max_jumpers,
+                              max_jumper_length=parsed_args.max_jumper_length,
+                              slvr=slvr,
+                              encoding_cache=encoding_cache,
+                              workers=parsed_args.workers or 1,
+                              hooks=stats,
+                              **restrictions))
         else:
-            svg.print_svg(placement_iter, file=sys.stdout)
+            placement_iter = placer.place(
+                              board, components, nets,
+                              max_drilled=max_drilled,
+                              max_jumpers=max_jumpers,
+                              max_jumper_length=parsed_args.max_jumper_length,
+                              slvr=slvr,
+                              encoding_cache=encoding_cache,
+                              solution_cache=solution_cache,
+                              workers=parsed_args.workers or 1,
+                              hooks=stats,
+                              **restrictions)
 
+        if parsed_args.first_only:
+            placement_iter = itertools.islice(placement_iter, 1)
+
+        if parsed_args.archive:
+            with open(parsed_args.archive, "wb") as f:
+                writer = archive.ArchiveWriter(
+                              f, board, components,
+                              max_jumper_length=parsed_args.max_jumper_length)
+                count = writer.write_all(placement_iter)
+            print("{} solutions".format(count))
+        elif parsed_args.heatmap:
+            with open(parsed_args.heatmap, "w") as f:
+                count = svg.print_heatmap(placement_iter, file=f)
+            print("{} solutions".format(count))
+        elif parsed_args.svg_pages:
+            svg.print_svg_pages(placement_iter, parsed_args.svg_pages,
+                                per_page=parsed_args.svg_per_page)
+        elif not parsed_args.svg:
+            count = 0
+            for placement in placement_iter:
+                placement.print_solution()
+                print()
+                count += 1
+            print("{} solutions".format(count))
+        else:
+            if isinstance(parsed_args.svg, str):
+                with open(parsed_args.svg, "w") as f:
+                    svg.print_svg(placement_iter, file=f)
+            else:
+                svg.print_svg(placement_iter, file=sys.stdout)
+
+    if solver_log is not None:
+        solver_log.close()
+
+    if parsed_args.profile:
+        stats.write(parsed_args.profile_dir)
+        stats.print_summary(file=sys.stderr)
+    if parsed_args.stats:
+        print_stats = (stats.print_json if parsed_args.stats == 'json'
+                                        else stats.print_text)
+        if parsed_args.stats_file:
+            with open(parsed_args.stats_file, "w") as f:
+                print_stats(file=f)
+        else:
+            print_stats(file=sys.stderr)
     
@@ -29,38 +29,213 @@ utility functions.
 __all__ = (
     'at_least_one',
     'at_most_one',
+    'at_most_one_size',
+    'current_pool',
     'exactly_one',
     'iff',
     'implies',
+    'preprocess',
     'Clause',
     'Expr',
+    'Reconstruction',
     'solve',
     'solve_one',
+    'to_int_clauses',
     'tseitin_and',
     'Term',
     'Var',
+    'VarPool',
 )
 
+import array
 import collections 
+import itertools
 import sys
+import threading
 
 import solver
 
+# Stack of the pools which are current in each thread.
+_local = threading.local()
+
+class VarPool():
+    """
+    Assigns variable IDs to Vars as they are created.
+
+    IDs are dense and in order of creation: the first Var made from a pool has
+    ID 1, the next ID 2, and so on. Names are only needed for debugging, so
+    rather than a string a Var is usually given a key `(kind, *indices)` of
+    small ints. The kind is registered with `add_kind`, along with a format
+    string and a table for each index, and the pool packs the indices into a
+    single int. The name is only formatted when it is asked for.
+
+    A pool is used as a context manager, which makes it the current pool in
+    this thread until the block exits. Vars made while no pool is current
+    aren't recorded anywhere (see `Var`), so that long running processes
+    don't accumulate the names of Vars which are no longer used.
+
+    """
+
+    # Kinds in `_var_kinds` of Vars which don't have a key.
+    _ANONYMOUS = -1
+    _STRING = -2
+
+    def __init__(self, first_id=1):
+        """
+        Initialize the pool.
+
+        first_id: ID of the first Var made from the pool. Giving a pool a
+            later first ID lets Vars be made in another process, and their
+            IDs carried on from the Vars already made here.
+
+        """
+        self.first_id = first_id
+        self._kinds = []
+        self._var_kinds = array.array('i')
+        self._var_indices = array.array('q')
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._var_kinds)
+
+    def __enter__(self):
+        _pools().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        popped = _pools().pop()
+        assert popped is self
+
+    def add_kind(self, fmt, *tables):
+        """
+        Register a kind of variable.
+
+        fmt: Format string for the names of variables of this kind. It is
+            given one argument for each index in a key.
+        tables: For each index in a key, either a sequence, in which case the
+            index is formatted as the element at that index, or an int, in
+            which case the index itself is formatted, and must be less than
+            the int.
+
+        Returns:
+            The kind, for use as the first element of a key.
+
+        """
+        sizes = tuple(t if isinstance(t, int) else len(t) for t in tables)
+        self._kinds.append((fmt, tables, sizes))
+        return len(self._kinds) - 1
+
+    def new_id(self, name=None):
+        """
+        Allocate the next variable ID, recording its name.
+
+        name: None, a string, or a key `(kind, *indices)`.
+
+        """
+        if name is None:
+            kind, packed = self._ANONYMOUS, 0
+        elif isinstance(name, str):
+            kind, packed = self._STRING, 0
+            self._strings[len(self._var_kinds)] = name
+        else:
+            kind, *indices = name
+            packed = 0
+            for idx, size in zip(indices, self._kinds[kind][2]):
+                assert 0 <= idx < size
+                packed = packed * size + idx
+        self._var_kinds.append(kind)
+        self._var_indices.append(packed)
+        return self.first_id + len(self._var_kinds) - 1
+
+    def extend(self, other):
+        """
+        Take on the names of the Vars made from another pool.
+
+        The IDs which the other pool assigned are replaced with the next IDs
+        from this pool, in order.
+
+        """
+        kind_offset = len(self._kinds)
+        var_offset = len(self._var_kinds)
+        self._kinds.extend(other._kinds)
+        self._var_kinds.extend(array.array('i', (
+                               kind + kind_offset if kind >= 0 else kind
+                                   for kind in other._var_kinds)))
+        self._var_indices.extend(other._var_indices)
+        self._strings.update((idx + var_offset, name)
+                                 for idx, name in other._strings.items())
+
+    def name(self, var_id):
+        """
+        Get the name of the variable with a given ID.
+
+        Anonymous variables are named after their ID.
+
+        """
+        idx = var_id - self.first_id
+        kind = self._var_kinds[idx]
+        if kind == self._ANONYMOUS:
+            return "t{}".format(var_id)
+        if kind == self._STRING:
+            return self._strings[idx]
+
+        fmt, tables, sizes = self._kinds[kind]
+        packed = self._var_indices[idx]
+        indices = []
+        for size in reversed(sizes):
+            packed, index = divmod(packed, size)
+            indices.append(index)
+        return fmt.format(*(index if isinstance(table, int) else table[index]
+                                for table, index in zip(tables,
+                                                        reversed(indices))))
+
+# IDs of Vars made while no pool is current.
+_unpooled_ids = itertools.count(1)
+
+def _pools():
+    if not hasattr(_local, "pools"):
+        _local.pools = []
+    return _local.pools
+
+def current_pool():
+    """
+    Get the `VarPool` which Vars made in this thread are currently taken from,
+    or None if no pool is current.
+
+    """
+    pools = _pools()
+    return pools[-1] if pools else None
+
 class Var():
     """
     A propositional variable.
 
-    Can optionally have a name.
+    Can optionally have a name, which is either a string or a key
+    `(kind, *indices)` registered with the current pool's `add_kind`. Each
+    Var is given an ID by the current `VarPool` when it is made. If no pool is
+    current, the Var is given an ID which is unique in this process, and holds
+    its own name, which must then be a string.
 
     """
     def __init__(self, name=None):
-        if name is None:
-            name = "t{}".format(hash(self))
+        self.pool = current_pool()
+        if self.pool is not None:
+            self.id = self.pool.new_id(name)
+        else:
+            assert name is None or isinstance(name, str)
+            self.id = next(_unpooled_ids)
+            self._name = name
 
-        self.name = name
+    @property
+    def name(self):
+        if self.pool is not None:
+            return self.pool.name(self.id)
+        if self._name is None:
+            return "t{}".format(self.id)
+        return self._name
 
     def __repr__(self):
-        return "<Var(name={}, hash={})>".format(self.name, hash(self))
+        return "<Var(name={}, id={})>".format(self.name, self.id)
 
     def __str__(self):
         return self.name
@@ -91,7 +266,9 @@ class Clause():
 
     """
     def __init__(self, terms):
-        self.terms = frozenset(terms)
+        # Terms are kept in the order given, so that clauses are converted
+        # to the same lists of IDs on every run.
+        self.terms = tuple(dict.fromkeys(terms))
 
     def __repr__(self):
         return "Clause(terms={!r})".format(self.terms)
@@ -104,7 +281,7 @@ class Clause():
         return iter(self.terms)
 
     def __or__(self, other):
-        return Clause(self.terms | other.terms)
+        return Clause(self.terms + other.terms)
 
     def __len__(self):
         return len(self.terms)
@@ -117,7 +294,8 @@ class Expr():
 
     """
     def __init__(self, clauses=()):
-        self.clauses = frozenset(clauses)
+        # As for `Clause`, clauses are kept in the order given.
+        self.clauses = tuple(dict.fromkeys(clauses))
 
     def __repr__(self):
         return "Expr(clauses={!r})".format(self.clauses)
@@ -126,7 +304,7 @@ class Expr():
         return " ^ ".join("({})".format(c) for c in self.clauses)
 
     def __or__(self, other):
-        return Expr(self.clauses | other.clauses)
+        return Expr(self.clauses + other.clauses)
 
     def __iter__(self):
         return iter(self.clauses)
@@ -167,8 +345,8 @@ def _pairwise_at_most_one(pvars):
     """
     pvars = list(pvars)
 
-    return Expr(Clause({Term(pvars[i], negated=True),
-                       Term(pvars[j], negated=True)})
+    return Expr(Clause((Term(pvars[i], negated=True),
+                        Term(pvars[j], negated=True)))
                   for i in range(len(pvars)) for j in range(i + 1, len(pvars)))
                 
 
@@ -185,13 +363,13 @@ def _create_commander(pvars):
     """
     c = Var()
 
-    clauses = set()
+    clauses = []
 
     # If the commander is true, then at least one of the vars must be true.
-    clauses |= {Clause({Term(v) for v in pvars} | {Term(c, negated=True)})}
+    clauses.append(Clause([Term(v) for v in pvars] + [Term(c, negated=True)]))
 
     # If the commander is false, then none of the variables can be true.
-    clauses |= {Clause({Term(c), Term(p, negated=True)}) for p in pvars}
+    clauses.extend(Clause((Term(c), Term(p, negated=True))) for p in pvars)
 
     return c, Expr(clauses)
 
@@ -236,12 +414,38 @@ def at_most_one(pvars):
 
     return cnf
 
+def at_most_one_size(n):
+    """
+    Compute the size of the expression `at_most_one` returns for `n` vars,
+    without constructing it.
+
+    Returns:
+        A tuple `(clauses, literals, new_vars)` giving the number of clauses,
+        the total number of literals in those clauses, and the number of
+        commander variables introduced.
+
+    """
+    clauses = literals = new_vars = 0
+    while n >= 6:
+        groups = [3] * (n // 3) + ([n % 3] if n % 3 else [])
+        for g in groups:
+            # A commander clause, one clause per var to force the commander,
+            # and the pairwise clauses.
+            clauses += 1 + g + g * (g - 1) // 2
+            literals += (g + 1) + 2 * g + g * (g - 1)
+        new_vars += len(groups)
+        n = len(groups)
+    clauses += n * (n - 1) // 2
+    literals += n * (n - 1)
+
+    return clauses, literals, new_vars
+
 def at_least_one(pvars):
     """
     Return a CNF expression which is true iff at least one of `pvars` is true.
 
     """
-    return Expr({Clause(Term(v) for v in pvars)})
+    return Expr([Clause(Term(v) for v in pvars)])
 
 def exactly_one(pvars):
     """
@@ -257,7 +461,7 @@ def implies(pvar1, pvar2):
     Return a CNF expression which is true iff var1 implies var2.
 
     """
-    return Expr({Clause({Term(pvar1, negated=True), Term(pvar2)})})
+    return Expr([Clause((Term(pvar1, negated=True), Term(pvar2)))])
 
 def iff(pvar1, pvar2):
     """
@@ -273,37 +477,360 @@ def tseitin_and(pvars):
     Also return the CNF expression which enforces this relationship.
 
     """
+    pvars = list(pvars)
     out_var = Var()
-    expr = Expr({Clause({Term(pvar, negated=True) for pvar in pvars} |
-                        {Term(out_var)})} |
-                {Clause({Term(pvar), Term(out_var, negated=True)})
-                                                  for pvar in pvars})
+    expr = Expr([Clause([Term(pvar, negated=True) for pvar in pvars] +
+                        [Term(out_var)])] +
+                [Clause((Term(pvar), Term(out_var, negated=True)))
+                                                  for pvar in pvars])
 
     return out_var, expr
 
-def solve(cnf, slvr=None):
+def to_int_clauses(cnf, pool=None):
     """
-    Solve a CNF formula.
+    Convert a CNF formula into the representation used by the solver module.
 
-    """
+    pool: If given, every Var in the formula must have been made from this
+        `VarPool`, and the IDs it assigned are used as they are. Otherwise
+        the Vars are given new, dense IDs in order of creation.
 
-    if slvr is None:
-        slvr = solver.solvers["pycosat"]
+    Returns:
+        A list of lists of variable IDs, and a list of Vars such that the Var
+        with ID `i` is at index `i - 1`. If `pool` is given the list of Vars
+        is None: the pool names the variables instead.
+
+    """
+    if pool is not None:
+        return [[-term.var.id if term.negated else term.var.id
+                    for term in clause]
+                        for clause in cnf], None
 
     # Construct mappings between Vars and variable IDs. Variable IDs are
     # integers > 0 used by the solver module to identify variables.
     pvars = list(sorted({term.var for clause in cnf for term in clause},
-                        key=lambda v: v.name))
+                        key=lambda v: v.id))
     pvar_to_id = {pvar: idx + 1 for idx, pvar in enumerate(pvars)}
 
     # The solver module input is just a list of lists, mirroring the CNF/Clause
     # hierarchy. Terms are replaced by their variable IDs, (numerically)
     # negated if the term is (logically) negated.
-    cnf = [[pvar_to_id[term.var] * (-1 if term.negated else 1)
-                for term in clause]
-                    for clause in cnf]
+    clauses = [[pvar_to_id[term.var] * (-1 if term.negated else 1)
+                    for term in clause]
+                        for clause in cnf]
+
+    return clauses, pvars
+
+class Reconstruction():
+    """
+    Restores the variables removed from a formula by `preprocess`.
+
+    This is a stack of `(witness, clause)` entries, where `witness` is a
+    literal in `clause`. Working back from the last entry, each clause which
+    isn't satisfied by the model is satisfied by making its witness true.
+
+    """
+
+    def __init__(self):
+        self._lengths = array.array('I')
+        self._lits = array.array('i')
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def push(self, witness, clause):
+        """
+        Push an entry onto the stack.
+
+        """
+        self._lengths.append(len(clause))
+        self._lits.append(witness)
+        self._lits.extend(l for l in clause if l != witness)
+
+    def extend(self, sol, num_vars):
+        """
+        Extend a solution to the preprocessed formula to the original formula.
+
+        sol: Solution in the form returned by the solver module.
+        num_vars: Number of variables in the original formula.
+
+        Returns:
+            A solution which assigns every variable up to `num_vars`, and
+            satisfies the original formula.
+
+        """
+        num_vars = max(num_vars, len(sol))
+        values = bytearray(num_vars + 1)
+        for n in sol:
+            if n > 0:
+                values[n] = 1
+
+        end = len(self._lits)
+        for length in reversed(self._lengths):
+            start = end - length
+            witness = self._lits[start]
+            if not any(values[l] if l > 0 else not values[-l]
+                           for l in self._lits[start + 1:end]):
+                values[abs(witness)] = witness > 0
+            end = start
+
+        return [v if values[v] else -v for v in range(1, num_vars + 1)]
+
+class _Preprocessor():
+    """
+    State of a call to `preprocess`.
+
+    Clauses are held as frozensets of literals, indexed by the position at
+    which they were added. Removed clauses are replaced with None.
+
+    """
+
+    def __init__(self, frozen, max_occurrences, max_resolvent_length):
+        self.frozen = frozen
+        self.max_occurrences = max_occurrences
+        self.max_resolvent_length = max_resolvent_length
+
+        self.clauses = []
+        self.clause_idx = {}
+        self.occ = collections.defaultdict(set)
+        self.assigned = {}
+        self.units = []
+        self.touched = set()
+        self.reconstruction = Reconstruction()
+
+    def add(self, clause):
+        """
+        Add a clause, unless it is a tautology or a duplicate.
+
+        Raises:
+            solver.Unsatisfiable: If the clause is empty.
+
+        """
+        if not clause:
+            raise solver.Unsatisfiable
+        if any(-l in clause for l in clause) or clause in self.clause_idx:
+            return
+        idx = len(self.clauses)
+        self.clauses.append(clause)
+        self.clause_idx[clause] = idx
+        for l in clause:
+            self.occ[l].add(idx)
+        self.touched.update(abs(l) for l in clause)
+        if len(clause) == 1:
+            self.units.extend(clause)
+
+    def remove(self, idx):
+        clause = self.clauses[idx]
+        self.clauses[idx] = None
+        del self.clause_idx[clause]
+        for l in clause:
+            self.occ[l].discard(idx)
+        self.touched.update(abs(l) for l in clause)
+
+    def propagate(self):
+        """
+        Assign each unit literal, removing satisfied clauses and false
+        literals.
+
+        """
+        while self.units:
+            lit = self.units.pop()
+            var = abs(lit)
+            if var in self.assigned:
+                if self.assigned[var] != (lit > 0):
+                    raise solver.Unsatisfiable
+                continue
+            self.assigned[var] = lit > 0
+            if var not in self.frozen:
+                self.reconstruction.push(lit, (lit,))
+
+            for idx in list(self.occ[lit]):
+                self.remove(idx)
+            for idx in list(self.occ[-lit]):
+                clause = self.clauses[idx]
+                self.remove(idx)
+                self.add(clause - {-lit})
+
+    def subsume(self, idxs):
+        """
+        Remove clauses which are subsumed by any of the given clauses.
+
+        """
+        for idx in sorted(idxs, key=lambda idx: len(self.clauses[idx] or ())):
+            clause = self.clauses[idx]
+            if clause is None:
+                continue
+            # Any clause subsumed by this one contains its least frequent
+            # literal.
+            lit = min(clause, key=lambda l: len(self.occ[l]))
+            for other_idx in list(self.occ[lit]):
+                other = self.clauses[other_idx]
+                if (other_idx != idx and len(other) > len(clause) and
+                    clause <= other):
+                    self.remove(other_idx)
+
+    def eliminate_pure(self, var):
+        """
+        Try to remove a variable which only occurs with one polarity.
+
+        """
+        pos, neg = self.occ[var], self.occ[-var]
+        if pos and neg:
+            return False
+        lit = var if pos else -var
+        self.reconstruction.push(lit, (lit,))
+        for idx in list(self.occ[lit]):
+            self.remove(idx)
+        return True
+
+    def eliminate(self, var):
+        """
+        Try to replace the clauses containing a variable by their resolvents.
+
+        The variable is eliminated only if this doesn't increase the number of
+        clauses, and the resolvents aren't too long.
+
+        """
+        pos, neg = self.occ[var], self.occ[-var]
+        if (len(pos) > self.max_occurrences or
+            len(neg) > self.max_occurrences):
+            return False
+
+        pos_clauses = [self.clauses[idx] - {var} for idx in pos]
+        neg_clauses = [self.clauses[idx] - {-var} for idx in neg]
+        resolvents = set()
+        for p in pos_clauses:
+            for n in neg_clauses:
+                resolvent = p | n
+                if any(-l in resolvent for l in p):
+                    continue
+                if len(resolvent) > self.max_resolvent_length:
+                    return False
+                resolvents.add(resolvent)
+                if len(resolvents) > len(pos) + len(neg):
+                    return False
+
+        # Save the clauses of the less frequent polarity, so that the variable
+        # can be given a value which satisfies them. The other polarity is
+        # satisfied by default.
+        if len(pos) <= len(neg):
+            lit, saved = var, pos
+        else:
+            lit, saved = -var, neg
+        for idx in saved:
+            self.reconstruction.push(lit, self.clauses[idx])
+        self.reconstruction.push(-lit, (-lit,))
+
+        for idx in list(pos) + list(neg):
+            self.remove(idx)
+        first_new = len(self.clauses)
+        for resolvent in resolvents:
+            self.add(resolvent)
+        self.propagate()
+        self.subsume(idx for idx in range(first_new, len(self.clauses))
+                         if self.clauses[idx] is not None)
+        return True
+
+    def run(self):
+        self.propagate()
+        self.subsume(range(len(self.clauses)))
+
+        # Repeatedly try to eliminate the variables whose clauses have
+        # changed, cheapest first, until there are none left.
+        while self.touched:
+            candidates = sorted(
+                    (v for v in self.touched
+                         if v not in self.frozen and v not in self.assigned),
+                    key=lambda v: len(self.occ[v]) * len(self.occ[-v]))
+            self.touched = set()
+            for var in candidates:
+                if var in self.assigned or not (self.occ[var] or
+                                                self.occ[-var]):
+                    continue
+                if not self.eliminate_pure(var):
+                    self.eliminate(var)
+
+def preprocess(clauses, *, frozen=(), num_vars=None, max_occurrences=16,
+               max_resolvent_length=20):
+    """
+    Simplify a formula in the representation used by the solver module.
+
+    Units are propagated, duplicate, tautological and subsumed clauses are
+    removed, and variables are eliminated, either because they only occur
+    with one polarity, or by replacing their clauses with all of their
+    resolvents (as in SatELite) when this doesn't increase the number of
+    clauses.
+
+    Variables in `frozen` are never eliminated, and still appear in the
+    simplified formula. Restricted to the frozen variables, the simplified
+    formula has the same solutions as the original, even once further clauses
+    over frozen variables are added. Other variables which have been removed
+    are fixed by unit clauses, so they don't multiply the solutions found by
+    a solver's `itersolve`.
+
+    clauses: List of lists of variable IDs.
+    frozen: Iterable of variable IDs which must not be eliminated.
+    num_vars: Number of variables in the formula. Callers which add clauses
+        over new variables, numbered after these, must pass this so that the
+        variables in between are still fixed. Defaults to the highest
+        variable that occurs.
+    max_occurrences: Variables which occur with either polarity in more than
+        this many clauses are not eliminated by resolution.
+    max_resolvent_length: Variables are not eliminated by resolution if it
+        would add a clause longer than this.
+
+    Returns:
+        A pair `(clauses, reconstruction)`. The `Reconstruction` turns
+        solutions of the simplified clauses into solutions of the original
+        clauses. If the formula is found to be unsatisfiable, the simplified
+        clauses contain an empty clause.
+
+    """
+    frozen = set(frozen)
+    pre = _Preprocessor(frozen, max_occurrences, max_resolvent_length)
+
+    try:
+        for clause in clauses:
+            pre.add(frozenset(clause))
+        pre.run()
+    except solver.Unsatisfiable:
+        return [[]], Reconstruction()
+
+    out = [sorted(clause, key=abs) for clause in pre.clauses
+                                                      if clause is not None]
+
+    # Keep assigned frozen variables as units, and make sure that the solver
+    # still sees frozen variables which no longer occur, since other clauses
+    # may be added over them.
+    for var in sorted(frozen):
+        if var in pre.assigned:
+            out.append([var if pre.assigned[var] else -var])
+        elif not pre.occ[var] and not pre.occ[-var]:
+            out.append([var, -var])
+
+    # Solvers assign every variable up to the highest one that occurs, so
+    # other variables which no longer occur are fixed. Otherwise enumerating
+    # solutions would yield each one for every assignment of them.
+    max_var = max((abs(l) for clause in out for l in clause), default=0)
+    if num_vars is not None:
+        max_var = max(max_var, num_vars)
+    out.extend([-var] for var in range(1, max_var + 1)
+                   if var not in frozen and not pre.occ[var] and
+                      not pre.occ[-var])
+
+    return out, pre.reconstruction
+
+def solve(cnf, slvr=None):
+    """
+    Solve a CNF formula.
+
+    """
+
+    if slvr is None:
+        slvr = solver.make_solver()
+
+    clauses, pvars = to_int_clauses(cnf)
     
-    for sol in slvr.itersolve(cnf):
+    for sol in slvr.itersolve(clauses):
         yield {pvars[abs(n) - 1]: (n > 0) for n in sol}
 
 def solve_one(cnf, slvr=None):
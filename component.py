@@ -53,6 +53,12 @@ class Position():
         self.occupies = set(occupies)
         self.terminal_positions = dict(terminal_positions)
 
+    def __str__(self):
+        return "{{{}}}".format(", ".join(
+                    "{}: {}".format(t.label, h)
+                        for t, h in sorted(self.terminal_positions.items(),
+                                           key=lambda item: item[0].label)))
+
     def __add__(self, offset):
         """
         Return a position that is a translation of this position.
@@ -293,7 +299,8 @@ class DualInlinePackage(Component):
     def __init__(self, label, num_terminals, *, row_spacing=3,
                  color="#808080"):
         if num_terminals % 2 != 0:
-            raise ValueError
+            raise ValueError("A DIP package must have an even number of "
+                             "terminals, not {}".format(num_terminals))
         terminals = tuple(Terminal(i + 1) for i in range(num_terminals))
 
         self._row_spacing = row_spacing
@@ -0,0 +1,221 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Instrumentation of placement runs.
+
+`placer.place` reports what it is doing to a `Hooks` object: it brackets each
+phase of work with `Hooks.phase`, increments counters with `Hooks.count`, and
+reports the size of each family of constraints with `Hooks.family`. The base
+class ignores everything; `Stats` records it all so that it can be printed or
+written out as JSON. `CancellableHooks` allows a placement run to be abandoned
+from another thread.
+
+Phases reported by `place` (and by the other entry points in `placer`,
+such as `place_best`) are:
+
+    positions: Generating the positions of each component.
+    jumpers: Generating candidate jumpers.
+    restrict: Removing positions ruled out by pins and keep-out cells.
+    check: Testing for obvious infeasibility (see `placer.check`).
+    fingerprint: Computing the problem fingerprint.
+    cache_load, cache_store: Accessing the encoding and solution caches.
+    encode: Building the whole encoding. Overlaps with the phases below.
+    <family>: Building (and converting to CNF) one family of constraints.
+    build_families: Building every family in worker processes, when
+        `workers` is more than 1. Replaces the <family> and id_mapping phases.
+    id_mapping: Mapping CNF variables onto solver variable IDs.
+    preprocess: Simplifying the encoding with `cnf.preprocess`.
+    solve: Waiting for the solver to produce a solution.
+    decode: Mapping a solver solution back to a placement.
+    rank: Scoring placements by their quality (`placer.rank` and
+        `placer.place_best` only).
+
+"""
+
+__all__ = (
+    'Cancelled',
+    'CancellableHooks',
+    'Hooks',
+    'Stats',
+)
+
+import collections
+import contextlib
+import json
+import sys
+import time
+
+class Hooks():
+    """
+    Receiver of instrumentation events. All methods do nothing.
+
+    Subclass this and override the methods of interest to observe a placement
+    run.
+
+    """
+
+    def phase(self, name):
+        """
+        Return a context manager which brackets a phase of work.
+
+        A phase may be entered many times (eg. `solve` is entered once per
+        solution), and phases may nest.
+
+        """
+        return contextlib.nullcontext()
+
+    def count(self, name, n=1):
+        """
+        Increment the counter called `name` by `n`.
+
+        """
+        pass
+
+    def family(self, name, expr):
+        """
+        Report a family of constraints.
+
+        name: Name of the constraint family.
+        expr: The `cnf.Expr` holding the family's clauses. For a family
+            built by worker processes, this is only an object with the same
+            `stats` attribute, as measured by the workers.
+
+        """
+        pass
+
+class Cancelled(Exception):
+    """A placement run was cancelled through `CancellableHooks`."""
+    pass
+
+class CancellableHooks(Hooks):
+    """
+    Hooks which pass events on to other hooks, and abandon the placement run
+    once cancelled.
+
+    Once `cancelled` is set, `Cancelled` is raised at the start of the next
+    phase, so a run stops between constraint families or solutions, but not
+    during a call to the solver.
+
+    """
+
+    def __init__(self, cancelled, hooks=None):
+        """
+        Initialize the hooks.
+
+        cancelled: A `threading.Event` which is set to cancel the run.
+        hooks: Hooks to pass events on to.
+
+        """
+        self.cancelled = cancelled
+        self._hooks = hooks if hooks is not None else Hooks()
+
+    def phase(self, name):
+        if self.cancelled.is_set():
+            raise Cancelled
+        return self._hooks.phase(name)
+
+    def count(self, name, n=1):
+        self._hooks.count(name, n)
+
+    def family(self, name, expr):
+        self._hooks.family(name, expr)
+
+class _Timer():
+    def __init__(self):
+        self.seconds = 0.
+        self.calls = 0
+
+class Stats(Hooks):
+    """
+    Hooks which record timers, counters and constraint family sizes.
+
+    Attributes:
+        timers: Ordered dict mapping phase names to objects with `seconds`
+            (total time spent in the phase) and `calls` (number of times the
+            phase was entered) attributes.
+        counters: Counter of events.
+        families: Ordered dict mapping constraint family names to `(vars,
+            clauses, literals)` tuples.
+
+    """
+
+    def __init__(self):
+        self.timers = collections.OrderedDict()
+        self.counters = collections.Counter()
+        self.families = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if name not in self.timers:
+            self.timers[name] = _Timer()
+        timer = self.timers[name]
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer.seconds += time.perf_counter() - start
+            timer.calls += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def family(self, name, expr):
+        stats = expr.stats
+        self.families[name] = (stats.vars, stats.clauses, stats.terms)
+
+    def as_dict(self):
+        """
+        Return the recorded statistics as a dict, suitable for conversion to
+        JSON.
+
+        """
+        return {
+            'phases': collections.OrderedDict(
+                (name, {'seconds': t.seconds, 'calls': t.calls})
+                    for name, t in self.timers.items()),
+            'counters': dict(self.counters),
+            'families': collections.OrderedDict(
+                (name, {'vars': v, 'clauses': c, 'literals': l})
+                    for name, (v, c, l) in self.families.items()),
+        }
+
+    def print_json(self, file=sys.stdout):
+        json.dump(self.as_dict(), file, indent=2)
+        file.write("\n")
+
+    def print_text(self, file=sys.stdout):
+        print("{:24} {:>10} {:>8}".format("Phase", "Seconds", "Calls"),
+              file=file)
+        for name, t in self.timers.items():
+            print("{:24} {:10.4f} {:8}".format(name, t.seconds, t.calls),
+                  file=file)
+        print(file=file)
+        print("{:24} {:>10} {:>10} {:>10}".format(
+                  "Family", "Vars", "Clauses", "Literals"),
+              file=file)
+        for name, (v, c, l) in self.families.items():
+            print("{:24} {:10} {:10} {:10}".format(name, v, c, l), file=file)
+        if self.counters:
+            print(file=file)
+            for name, n in sorted(self.counters.items()):
+                print("{:24} {:10}".format(name, n), file=file)
@@ -0,0 +1,259 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Placement problems described in JSON.
+
+A problem is a JSON object like the following:
+
+    {
+        "board": {"size": [5, 2]},
+        "components": [
+            {"label": "IC1", "type": "dip", "num_terminals": 4,
+             "row_spacing": 2},
+            {"label": "R1", "type": "resistor", "max_length": 1},
+            {"label": "R2", "type": "resistor", "max_length": 1}
+        ],
+        "nets": [
+            ["IC1.1", "R1.1"],
+            ["IC1.2", "R1.2"],
+            ["IC1.3", "R2.1"],
+            ["IC1.4", "R2.2"]
+        ]
+    }
+
+`board` is either a strip board given by its `size`, or has explicit lists of
+`holes`, `spaces` (defaulting to the holes) and `traces` (pairs of holes).
+Coordinates are `[x, y]` pairs.
+
+Each component has a `label`, a `type` (one of the keys of `COMPONENT_TYPES`)
+and the keyword arguments of that type's constructor, such as `max_length` for
+a resistor or `num_terminals` for a DIP package.
+
+Each net is a list of terminals, written as the component's label and the
+terminal's label separated by a dot. Every terminal must be in exactly one
+net.
+
+The optional keys `pins` (mapping component labels to objects which map
+terminal labels to holes), `keep_out` (a list of cells) and
+`component_keep_out` (mapping component labels to lists of cells) correspond
+with the arguments of the same names to `placer.place`.
+
+"""
+
+__all__ = (
+    'COMPONENT_TYPES',
+    'from_json',
+    'load',
+    'loads',
+    'Problem',
+)
+
+import collections
+import json
+
+import component
+
+# Component classes, keyed by the names used for them in problem files.
+COMPONENT_TYPES = {
+    'capacitor': component.Capacitor,
+    'dip': component.DualInlinePackage,
+    'resistor': component.Resistor,
+}
+
+# Types of the keyword arguments of each component class's constructor.
+_LEADED_PARAMETERS = {
+    'max_length': int,
+    'allow_vertical': bool,
+    'allow_horizontal': bool,
+    'color': str,
+}
+_PARAMETER_TYPES = {
+    'capacitor': _LEADED_PARAMETERS,
+    'dip': {
+        'num_terminals': int,
+        'row_spacing': int,
+        'color': str,
+    },
+    'resistor': _LEADED_PARAMETERS,
+}
+
+class Problem(collections.namedtuple('_ProblemBase',
+                                     ('board', 'components', 'nets', 'pins',
+                                      'keep_out', 'component_keep_out'))):
+    """
+    A placement problem read from a file.
+
+    The attributes correspond with the arguments of `placer.place`. `pins`,
+    `keep_out` and `component_keep_out` are None if they are not given.
+
+    """
+
+    def restrictions(self):
+        """
+        Return the optional arguments of `placer.place` as a dict.
+
+        """
+        return {
+            'pins': self.pins,
+            'keep_out': self.keep_out,
+            'component_keep_out': self.component_keep_out,
+        }
+
+def _coords(l):
+    return [tuple(c) for c in l]
+
+def _make_board(obj):
+    if 'size' in obj:
+        return component.StripBoard(tuple(obj['size']))
+    holes = _coords(obj['holes'])
+    spaces = _coords(obj['spaces']) if 'spaces' in obj else holes
+    traces = [tuple(_coords(t)) for t in obj.get('traces', [])]
+    try:
+        return component.Board(holes, spaces, traces)
+    except ValueError:
+        raise ValueError("Board has traces between holes which are not in "
+                         "the board")
+
+def _make_component(obj):
+    params = dict(obj)
+    try:
+        label = params.pop('label')
+        type_name = params.pop('type')
+    except KeyError as e:
+        raise ValueError("Component {} has no {!r}".format(obj, e.args[0]))
+    if type_name not in COMPONENT_TYPES:
+        raise ValueError("Component {} has unknown type {!r}".format(
+                                                            label, type_name))
+
+    # JSON booleans are Python `bool`s, which are also `int`s.
+    param_types = _PARAMETER_TYPES[type_name]
+    for name, value in params.items():
+        expected = param_types.get(name)
+        if expected is not None and (
+                not isinstance(value, expected) or
+                (expected is not bool and isinstance(value, bool))):
+            raise ValueError("Parameter {!r} of component {} must be of type "
+                             "{}, not {!r}".format(name, label,
+                                                   expected.__name__, value))
+
+    try:
+        return COMPONENT_TYPES[type_name](label, **params)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid parameters for component {}: {}".format(
+                                                                    label, e))
+
+def from_json(obj):
+    """
+    Make a problem from its JSON representation, already parsed into Python
+    objects.
+
+    Raises:
+        ValueError: If the problem is not valid.
+
+    Returns:
+        A `Problem`.
+
+    """
+    try:
+        return _from_json(obj)
+    except KeyError as e:
+        raise ValueError("Missing key {!r}".format(e.args[0]))
+    except (AttributeError, TypeError) as e:
+        raise ValueError("Malformed problem: {}".format(e))
+
+def _from_json(obj):
+    board = _make_board(obj['board'])
+    components = [_make_component(c) for c in obj['components']]
+
+    by_label = {c.label: c for c in components}
+    if len(by_label) != len(components):
+        raise ValueError("Component labels are not unique")
+    terminals = {(c.label, t.label): t for c in components
+                                            for t in c.terminals}
+
+    def get_component(label):
+        if label not in by_label:
+            raise ValueError("Unknown component {!r}".format(label))
+        return by_label[label]
+
+    def get_terminal(ref):
+        comp_label, _, terminal_label = ref.rpartition(".")
+        if (comp_label, terminal_label) not in terminals:
+            raise ValueError("Unknown terminal {!r}".format(ref))
+        return terminals[comp_label, terminal_label]
+
+    nets = [[get_terminal(ref) for ref in net] for net in obj['nets']]
+
+    # Placement requires each terminal to be in exactly one net.
+    num_nets = collections.Counter(t for net in nets for t in net)
+    for c in components:
+        for t in c.terminals:
+            ref = "{}.{}".format(c.label, t.label)
+            if num_nets[t] == 0:
+                raise ValueError("Terminal {} is not in any net".format(ref))
+            if num_nets[t] > 1:
+                raise ValueError("Terminal {} appears more than once in the "
+                                 "nets".format(ref))
+
+    pins = None
+    if 'pins' in obj:
+        pins = {}
+        for label, comp_pins in obj['pins'].items():
+            get_component(label)
+            pins[by_label[label]] = {
+                get_terminal("{}.{}".format(label, t)): tuple(h)
+                                         for t, h in comp_pins.items()}
+
+    keep_out = _coords(obj['keep_out']) if 'keep_out' in obj else None
+
+    component_keep_out = None
+    if 'component_keep_out' in obj:
+        component_keep_out = {get_component(label): _coords(cells)
+                    for label, cells in obj['component_keep_out'].items()}
+
+    return Problem(board, components, nets, pins, keep_out,
+                   component_keep_out)
+
+def loads(s):
+    """
+    Read a problem from a string.
+
+    Raises:
+        ValueError: If the problem is not valid.
+
+    Returns:
+        A `Problem`.
+
+    """
+    return from_json(json.loads(s))
+
+def load(f):
+    """
+    Read a problem from a file object.
+
+    Raises:
+        ValueError: If the problem is not valid.
+
+    Returns:
+        A `Problem`.
+
+    """
+    return loads(f.read())
@@ -25,16 +25,62 @@ board.
 """
 
 __all__ = (
+    'aplace',
+    'Bounds',
+    'check',
+    'eco',
+    'ENCODING_VERSION',
+    'estimate',
+    'Estimate',
+    'fingerprint',
+    'get_jumpers',
+    'get_positions',
+    'Infeasible',
+    'pareto_front',
     'place',
+    'place_best',
+    'place_prepared',
+    'place_smallest',
     'Placement',
+    'position_key',
+    'prepare',
+    'Quality',
+    'QUALITY_METRICS',
+    'quality',
+    'rank',
+    'Ranked',
+    'SIZE_ORDERS',
+    'sweep',
+    'SweepPoint',
 )
 
+import array
+import asyncio
 import collections.abc
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import multiprocessing
+import operator
+import os
+import sys
+import threading
 
 import cnf
+import component
+import instrument
+import solver
 import wff
 
-_DEBUG = False
+# Version of the encoding produced by `place`. Must be incremented whenever the
+# encoding changes, so that cached encodings are invalidated.
+ENCODING_VERSION = 6
+
+# Orders in which `place_smallest` tries board sizes.
+SIZE_ORDERS = ('area', 'rows')
 
 def _at_most(pvars, k, var_prefix=""):
     """
@@ -49,7 +95,9 @@ def _at_most(pvars, k, var_prefix=""):
     solutions may be returned.
 
     """
-    s = {(i, j): wff.Var("{} s[{},{}]".format(var_prefix, i, j))
+    kind = cnf.current_pool().add_kind(var_prefix + " s[{},{}]",
+                                       len(pvars), k + 1)
+    s = {(i, j): wff.Var((kind, i, j))
                         for i in range(1, len(pvars)) for j in range(1, k + 1)}
     n = len(pvars)
 
@@ -64,11 +112,24 @@ def _at_most(pvars, k, var_prefix=""):
         expr &= pvars[i - 1] >> ~s[i - 1, k]
     expr &= pvars[-1] >> ~s[n - 1, k]
 
-    cnf = wff.to_cnf(expr)
+    out = wff.to_cnf(expr)
+
+    assert len(out) == _at_most_size(n, k)[0]
 
-    assert len(cnf) == 2 * n * k + n - 3 * k - 1
+    return out
+
+def _at_most_size(n, k):
+    """
+    Compute the size of the expression `_at_most` returns for `n` vars, without
+    constructing it.
 
-    return cnf
+    Returns:
+        A tuple `(clauses, literals, new_vars)`.
+
+    """
+    return (2 * n * k + n - 3 * k - 1,
+            k + 3 + (n - 2) * (5 * k + 1),
+            (n - 1) * k)
 
 class Placement(collections.abc.Mapping):
     """
@@ -76,25 +137,69 @@ class Placement(collections.abc.Mapping):
 
     This is a mapping of components to positions, with some utility methods.
 
+    Attributes:
+        board: The board the components are placed on.
+        drilled_holes: Set of holes which are drilled out.
+        jumpers: Set of `(h1, h2)` pairs, one for each jumper.
+
     """
 
     def __init__(self, board, mapping, drilled_holes, jumpers):
         self.board = board
         self._mapping = mapping
-        self.drilled_holes = drilled_holes
-        self.jumpers = jumpers
+        self._drilled_holes = drilled_holes
+        self._jumpers = jumpers
+
+        # Problem and decoded solution from which the above are built, for
+        # placements made by `_from_solution`.
+        self._problem = None
+        self._sol = None
+
+    @classmethod
+    def _from_solution(cls, problem, sol):
+        placement = cls(problem.placement_board, None, None, None)
+        placement._problem = problem
+        placement._sol = sol
+        return placement
+
+    def _get_mapping(self):
+        if self._mapping is None:
+            positions = self._problem.positions
+            self._mapping = {comp: positions[comp][idx]
+                                 for comp, idx in zip(self._problem.components,
+                                                      self._sol[0])}
+        return self._mapping
+
+    @property
+    def drilled_holes(self):
+        if self._drilled_holes is None:
+            holes = self._problem.holes
+            self._drilled_holes = {holes[i] for i in _bits(self._sol[1])}
+        return self._drilled_holes
+
+    @property
+    def jumpers(self):
+        if self._jumpers is None:
+            jumpers = self._problem.jumpers
+            self._jumpers = {(jumpers[i].h1, jumpers[i].h2)
+                                 for i in _bits(self._sol[2])}
+        return self._jumpers
 
     def __getitem__(self, key):
-        return self._mapping[key]
+        return self._get_mapping()[key]
 
     def __iter__(self):
+        if self._mapping is None:
+            return iter(self._problem.components)
         return iter(self._mapping)
 
     def __len__(self):
+        if self._mapping is None:
+            return len(self._problem.components)
         return len(self._mapping)
 
     def print_solution(self):
-        comps = list(sorted(self._mapping.keys(),
+        comps = list(sorted(self._get_mapping().keys(),
                             key=(lambda comp: comp.label)))
         for comp in comps:
             pos = self[comp]
@@ -153,7 +258,6 @@ class _Jumper():
             the case of a horizontal link) or above (in the case of a vertical
             link) the second hole.
         h2: The coordinates of the second hole.
-        pres_var: Variable indicating whether the jumper is present.
 
     """
 
@@ -163,7 +267,6 @@ class _Jumper():
 
         self.h1 = h1
         self.h2 = h2
-        self.pres_var = wff.Var("{}->{} jumper".format(h1, h2))
         self.occupies = self._get_occupies()
 
     def _get_occupies(self):
@@ -246,10 +349,1401 @@ class _Jumper():
         return (cls(h1, h2) for h1, h2 in gen_all()
                              if h2 in board.holes and not is_redundant(h1, h2))
 
+class _Encoding():
+    """
+    A placement problem, encoded into the form accepted by the solver module.
+
+    Variable IDs are assigned densely, in order of creation, by the
+    `cnf.VarPool` used while encoding.
+
+    The clauses have been simplified by `cnf.preprocess`, with the `comp_pos`,
+    `drilled` and `jumpers` variables frozen. Clauses over those variables
+    may therefore be added, but other variables may have been eliminated.
+
+    Attributes:
+        clauses: List of lists of variable IDs, as described in the `solver`
+            module.
+        num_vars: Number of variables in the encoding, including any that
+            have been eliminated. Further variables may be given IDs above
+            this.
+        comp_pos: For each component, an array of IDs of the variables which
+            indicate whether the component is in each of its positions.
+        drilled: For each hole in `sorted(board.holes)`, the ID of the
+            variable which indicates whether the hole is drilled.
+        jumpers: For each candidate jumper, the ID of the variable which
+            indicates whether the jumper is present.
+        names: `cnf.VarPool` which names each variable, or None if the
+            encoding was loaded from a cache.
+        reconstruction: `cnf.Reconstruction` which restores the eliminated
+            variables in a solution.
+        decoder: `_Decoder` for solutions to the encoding, made when the first
+            solution is decoded.
+
+    """
+
+    def __init__(self, clauses, num_vars, comp_pos, drilled, jumpers, *,
+                 reconstruction=None, names=None):
+        self.clauses = clauses
+        self.num_vars = num_vars
+        self.comp_pos = comp_pos
+        self.drilled = drilled
+        self.jumpers = jumpers
+        self.reconstruction = (reconstruction if reconstruction is not None
+                                              else cnf.Reconstruction())
+        self.names = names
+        self.decoder = None
+
+    def __getstate__(self):
+        # Flatten the clauses into a pair of arrays, to keep pickles compact.
+        # Vars are not preserved.
+        lengths = array.array('I', (len(clause) for clause in self.clauses))
+        lits = array.array('i', itertools.chain.from_iterable(self.clauses))
+        return (lengths, lits, self.num_vars,
+                self.comp_pos, self.drilled, self.jumpers,
+                self.reconstruction)
+
+    def __setstate__(self, state):
+        (lengths, lits, self.num_vars,
+         self.comp_pos, self.drilled, self.jumpers,
+         self.reconstruction) = state
+
+        lits = lits.tolist()
+        offsets = [0] + list(itertools.accumulate(lengths))
+        self.clauses = [lits[start:end]
+                            for start, end in zip(offsets, offsets[1:])]
+        self.names = None
+        self.decoder = None
+
+def get_positions(comp, board):
+    """
+    Get the positions of a component on a board, in a canonical order.
+
+    Positions in placements yielded by `place` are drawn from this list.
+
+    """
+    return sorted(comp.get_positions(board),
+                  key=lambda pos: ([pos.terminal_positions[t]
+                                                    for t in comp.terminals],
+                                   sorted(pos.occupies)))
+
+def _get_jumpers(board, max_jumper_length):
+    """
+    Get the candidate jumpers for a board, in a canonical order.
+
+    """
+    return sorted(_Jumper.gen_jumpers(board, max_jumper_length),
+                  key=lambda j: (j.h1, j.h2))
+
+def get_jumpers(board, max_jumper_length):
+    """
+    Get the jumpers which may appear in placements on a board.
+
+    Returns:
+        A list of `(h1, h2)` pairs, in a canonical order.
+
+    """
+    return [(j.h1, j.h2) for j in _get_jumpers(board, max_jumper_length)]
+
+def _restrict(board, components, positions, jumpers, *,
+              pins=None, keep_out=None, component_keep_out=None):
+    """
+    Remove positions and jumpers which are ruled out by pins and keep-out
+    cells.
+
+    Arguments are as for `place`.
+
+    Raises:
+        Infeasible: If a component is left with no positions.
+
+    Returns:
+        A tuple `(board, positions, jumpers)`. `board` is `board` with the
+        keep-out cells removed from its spaces.
+
+    """
+    if not (pins or keep_out or component_keep_out):
+        return board, positions, jumpers
+
+    keep_out = frozenset(keep_out or ())
+    pins = pins or {}
+    component_keep_out = component_keep_out or {}
+
+    if keep_out:
+        board = component.Board(board.holes, board.spaces - keep_out,
+                                board.traces)
+        jumpers = [j for j in jumpers if not (j.occupies & keep_out)]
+
+    def allowed(c, pos):
+        excluded = keep_out | frozenset(component_keep_out.get(c, ()))
+        return (all(pos.terminal_positions[t] == h
+                                       for t, h in pins.get(c, {}).items()) and
+                not (pos.occupies & excluded) and
+                not (set(pos.terminal_positions.values()) & excluded))
+
+    positions = {c: [pos for pos in positions[c] if allowed(c, pos)]
+                    for c in components}
+    for c in components:
+        if not positions[c]:
+            raise Infeasible("{} has no positions which respect its pins and "
+                             "keep-out cells".format(c))
+
+    return board, positions, jumpers
+
+def _fingerprint(board, components, nets, positions, jumpers, *,
+                 max_drilled, max_jumpers):
+    """
+    Implementation of `fingerprint`.
+
+    Works on positions and jumpers that have already been generated.
+
+    """
+    comp_idx = {c: i for i, c in enumerate(components)}
+
+    problem = {
+        'version': ENCODING_VERSION,
+        'holes': sorted(board.holes),
+        'spaces': sorted(board.spaces),
+        'traces': sorted(board.traces),
+        'positions': [[([pos.terminal_positions[t] for t in c.terminals],
+                        sorted(pos.occupies))
+                                for pos in positions[c]]
+                            for c in components],
+        'nets': [[(comp_idx[t.component], t.component.terminals.index(t))
+                        for t in net]
+                    for net in nets],
+        'jumpers': [(j.h1, j.h2) for j in jumpers],
+        'max_drilled': max_drilled,
+        'max_jumpers': max_jumpers,
+    }
+
+    problem_json = json.dumps(problem, sort_keys=True)
+    return hashlib.sha256(problem_json.encode("ascii")).hexdigest()
+
+def fingerprint(board, components, nets, *,
+                max_jumper_length=0, max_drilled=None, max_jumpers=None,
+                pins=None, keep_out=None, component_keep_out=None):
+    """
+    Compute a fingerprint of a placement problem.
+
+    The fingerprint is a hex string which depends only on the board geometry,
+    the positions available to each component, the nets and the limits. Two
+    problems with the same fingerprint have the same encoding, so it is
+    suitable for use as a cache key.
+
+    Arguments are as for `place`.
+
+    """
+    nets = [list(net) for net in nets]
+    components = list(components)
+
+    if max_jumpers == 0:
+        max_jumper_length = 0
+    positions = {c: get_positions(c, board) for c in components}
+    jumpers = _get_jumpers(board, max_jumper_length)
+    board, positions, jumpers = _restrict(
+                                    board, components, positions, jumpers,
+                                    pins=pins, keep_out=keep_out,
+                                    component_keep_out=component_keep_out)
+
+    return _fingerprint(board, components, nets, positions, jumpers,
+                        max_drilled=max_drilled, max_jumpers=max_jumpers)
+
+class _Families():
+    """
+    The families of constraints which make up an encoding.
+
+    A family is added as one or more parts, each a callable which builds a
+    `cnf.Expr`. Variables which are shared between parts must be made before
+    the parts are added. Variables made while building a part are private to
+    it, so parts can be built in any order, or in other processes.
+
+    Attributes:
+        parts: List of `(family name, build)` pairs, in the order they were
+            added.
+
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def add(self, name, *builds):
+        self.parts.extend((name, build) for build in builds)
+
+    def build(self, hooks=None):
+        """
+        Build each family in this process, reporting it to `hooks`.
+
+        Returns:
+            A `cnf.Expr` of all of the constraints.
+
+        """
+        if hooks is None:
+            hooks = instrument.Hooks()
+
+        exprs = []
+        for name, parts in itertools.groupby(self.parts, key=lambda p: p[0]):
+            with hooks.phase(name):
+                expr = cnf.Expr.all(build() for _, build in parts)
+            hooks.family(name, expr)
+            exprs.append(expr)
+        return cnf.Expr.all(exprs)
+
+# Sizes of a family built by worker processes, as measured by the workers, in
+# the form `instrument.Hooks` expects.
+_FamilyStats = collections.namedtuple('_FamilyStats',
+                                      ('clauses', 'terms', 'vars'))
+_FamilyClauses = collections.namedtuple('_FamilyClauses', ('stats',))
+
+# Families being built by worker processes, and the ID of the first variable
+# private to each part.
+_family_state = None
+
+def _can_fork():
+    # The parts of a family are closures, which can't be pickled, so they are
+    # only built by worker processes which inherit them by forking. A process
+    # with other threads (eg. a call to `aplace`) isn't forked, since the
+    # child would inherit locks which those threads may be holding.
+    return ("fork" in multiprocessing.get_all_start_methods() and
+            threading.active_count() == 1)
+
+def _build_family_part(idx):
+    families, first_id = _family_state
+    _, build = families.parts[idx]
+    with cnf.VarPool(first_id) as part_pool:
+        expr = build()
+    clauses, _ = cnf.to_int_clauses(expr, part_pool)
+
+    # Measure the part as a serial build would measure its family. Variables
+    # shared with other parts are returned, so that they're only counted once
+    # for the family.
+    stats = expr.stats
+    shared = array.array('i', sorted({term.var.id for clause in expr
+                                                   for term in clause
+                                                   if term.var.id < first_id}))
+
+    # Pass the clauses back as two flat arrays, rather than pickling a list
+    # for each clause.
+    lengths = array.array('I', map(len, clauses))
+    lits = array.array('i', itertools.chain.from_iterable(clauses))
+    return (lengths.tobytes(), lits.tobytes(), part_pool,
+            _FamilyStats(stats.clauses, stats.terms, stats.vars - len(shared)),
+            shared.tobytes())
+
+def _build_families_in_parallel(families, pool, workers, hooks):
+    """
+    Build each part of each family in a pool of worker processes.
+
+    Variables made while building a part are numbered from the end of `pool`
+    by the worker, and renumbered here so that the variables of each part
+    follow those of the parts before it.
+
+    Returns:
+        The clauses of all of the families, as lists of variable IDs. These
+        are the same, in the same order, as the clauses of a serial build.
+
+    """
+    global _family_state
+
+    num_shared = len(pool)
+    _family_state = families, num_shared + 1
+    try:
+        with hooks.phase("build_families"), \
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("fork")) \
+                as executor:
+            results = executor.map(_build_family_part,
+                                   range(len(families.parts)))
+
+            clauses = []
+            family_stats = collections.OrderedDict()
+            for (name, _), (lengths_bytes, lits_bytes, part_pool,
+                            part_stats, shared_bytes) in \
+                    zip(families.parts, results):
+                lengths = array.array('I')
+                lengths.frombytes(lengths_bytes)
+                lits = array.array('i')
+                lits.frombytes(lits_bytes)
+
+                # Move the part's private variables after those of the parts
+                # before it.
+                offset = len(pool) - num_shared
+                if offset:
+                    lits = array.array('i', (
+                        l + offset if l > num_shared else
+                        l - offset if l < -num_shared else l
+                            for l in lits))
+                pool.extend(part_pool)
+
+                pos = 0
+                for length in lengths:
+                    clauses.append(lits[pos:pos + length].tolist())
+                    pos += length
+
+                shared = array.array('i')
+                shared.frombytes(shared_bytes)
+                stats = family_stats.setdefault(name, [0, 0, 0, set()])
+                stats[0] += part_stats.clauses
+                stats[1] += part_stats.terms
+                stats[2] += part_stats.vars
+                stats[3].update(shared)
+    finally:
+        _family_state = None
+
+    for name, (num_clauses, num_terms, num_private, shared) in \
+            family_stats.items():
+        hooks.family(name, _FamilyClauses(
+                           _FamilyStats(num_clauses, num_terms,
+                                        num_private + len(shared))))
+
+    return clauses
+
+def _comp_pos_constraints(components, positions, comp_pos, families):
+    """
+    Add constraints on the `comp_pos` variables such that a component must be
+    in exactly one position.
+
+    """
+    families.add("comp_pos", lambda:
+                cnf.Expr.all(cnf.exactly_one(comp_pos[comp, pos]
+                                                   for pos in positions[comp])
+                             for comp in components))
+
+def _physical_constraints(board, components, positions, comp_pos, jumpers,
+                          jumper_vars, families):
+    """
+    Add constraints to enforce physical constraints.
+
+    Ie. There must not be multiple components that occupy a given space.
+
+    """
+
+    # Make internal variables to determine whether a given component is in
+    # a particular space.
+    spaces = list(board.spaces)
+    kind = cnf.current_pool().add_kind("{} occ {}", components, spaces)
+    occ = {(c, s): wff.Var((kind, c_idx, s_idx))
+           for s_idx, s in enumerate(spaces)
+           for c_idx, c in enumerate(components)}
+
+    # Generate constraints to enforce the definition of `occ`. occ[s, c] is
+    # true iff there is a position `p` for `c` which covers `s` such that
+    # comp_pos[c, p] is true. The first line handles the forward
+    # implication, and the second the converse.
+    positions_which_occupy = {(c, s): [p for p in positions[c]
+                                                        if s in p.occupies]
+                              for c in components
+                              for s in board.spaces}
+    families.add("occ", lambda: wff.to_cnf(
+            wff.for_all(occ[c, s].iff(wff.exists(comp_pos[c, p]
+                                    for p in positions_which_occupy[c, s]))
+                for c in components
+                for s in board.spaces)))
+
+    # Enforce that at most one component/jumper can occupy a space. The vars
+    # are listed in a fixed order, since `at_most_one` groups them by
+    # position in the list.
+    jumpers_that_occupy_space = {s:
+                                   [j for j in jumpers if s in j.occupies]
+                                 for s in board.spaces}
+
+    families.add("one_per_space", lambda:
+        cnf.Expr.all(
+             cnf.at_most_one(
+                        [occ[c, s] for c in components] +
+                        [jumper_vars[j] for j in jumpers_that_occupy_space[s]])
+                for s in board.spaces))
+
+def _continuity_constraints(board, components, nets, positions, comp_pos,
+                            links, families):
+    """
+    Add constraints to enforce electrical continuity constraints.
+
+    Ie. continuity between terminals that are in a common net, and
+    discontinuity between terminals that are in different nets.
+
+    """
+    # Produce a dict which maps a terminal `t` and a hole `h` to a list of
+    # positions of t.component which have `t` in `h`. Used a couple of
+    # times in this function.
+    positions_which_have_term_in = {
+        (t, h): [p for p in positions[c] if p.terminal_positions[t] == h]
+                for c in components
+                for t in c.terminals
+                for h in board.holes}
+
+    # Produce an adjacency dict for the electrical continuity graph implied
+    # by links. Include the variable that must be true for said neighbour
+    # to be present.
+    neighbours = {h: [(l.get_other(h), l.pres_var) 
+                         for l in links if h in l.holes]
+                     for h in board.holes} 
+
+    # Make internal variables to indicate whether a hole is connected to a
+    # particular terminal. Defined for all holes, and the first terminal in
+    # each net. (This is sufficient for validating (dis)continuity
+    # constraints.
+    holes = list(board.holes)
+    pool = cnf.current_pool()
+    kind = pool.add_kind("{} conn {}", [n[0] for n in nets], holes)
+    term_conn = {(n[0], h): wff.Var((kind, n_idx, h_idx))
+                    for n_idx, n in enumerate(nets)
+                    for h_idx, h in enumerate(holes)}
+
+    # Also make internal variables to indicate the minimum distance of each
+    # hole to the nearest terminal. term_dist[h, i] is true iff there is no
+    # path of length `i` or less from hole `h` to a head terminal. (A head
+    # terminal is a terminal that is at the start of its net.)
+    #
+    # In other words, term_dist[h, *] is a unary encoding of the distance
+    # to the nearest head terminal. Holes which are not connected to a
+    # terminal will take the maximum value len(board.holes). Conversely,
+    # holes which are connected will take a value < len(board.holes).
+    kind = pool.add_kind("{} dist {}", holes, len(holes))
+    term_dist = {(h, i): wff.Var((kind, h_idx, i))
+                    for h_idx, h in enumerate(holes)
+                    for i in range(len(holes))}
+
+    # Generate constraints to enforce the definition of `term_conn`. A hole
+    # is connected to a particular terminal iff one of its neighbours is
+    # connected to the terminal or the terminal is in this hole. The first
+    # expression handles the forward implication, whereas the second
+    # expression handles the converse. Each net's constraints are a separate
+    # part, so that they can be built in parallel.
+    def term_conn_part(net):
+        return lambda: wff.to_cnf(
+            wff.for_all(
+                term_conn[net[0], h].iff(
+                    wff.exists(
+                              wff.add_var(term_conn[net[0], n] & link_pres)
+                                       for n, link_pres in neighbours[h]) |
+                    wff.exists(comp_pos[net[0].component, p]
+                         for p in positions_which_have_term_in[net[0], h]))
+                for h in board.holes))
+    families.add("term_conn", *(term_conn_part(net) for net in nets))
+
+    # Add constraints to enforce the definition of `term_dist[h, 0]`, for
+    # all holes `h`. term_hist[h, 0] is false iff a component is positioned
+    # such that a head terminal is in hole `h`. The first statement
+    # expresses the forward implication, and the second statement expresses
+    # the converse.
+    families.add("zero_term_dist", lambda:
+        wff.to_cnf(
+            wff.for_all(
+                (~term_dist[h, 0]).iff(
+                    wff.exists(comp_pos[net[0].component, p]
+                         for net in nets
+                         for p in positions_which_have_term_in[net[0], h]))
+                for h in board.holes)))
+
+    # Add constraints to enforce the definition of `term_dist[h, i]`, for
+    # 0 < 1 < |holes|. term_dist[h, i] is true iff for each neighbour `n`
+    # term_dist[n, i - 1] is true. The first statement expresses the
+    # forward implication, and the second statement expresses the converse.
+    families.add("term_dist", lambda:
+        wff.to_cnf(
+            wff.for_all(
+                term_dist[h, i].iff(
+                    wff.for_all(
+                        wff.add_var(term_dist[n, i - 1] | ~link_pres)
+                                       for n, link_pres in neighbours[h]) &
+                    term_dist[h, i - 1])
+                for h in board.holes
+                for i in range(1, len(board.holes)))))
+
+    # Add constraints which ensure any terminals are connected to the
+    # terminal that's at the head of its net.
+    def term_to_net(t):
+        l = [net for net in nets if t in net]
+        assert len(l) == 1, "Terminal is not in exactly one net"
+        return l[0]
+    head_term = {t: term_to_net(t)[0]
+                        for c in components
+                        for t in c.terminals}
+    families.add("net_continuity", lambda:
+        wff.to_cnf(
+            wff.for_all(comp_pos[c, p] >> term_conn[head_term[t], h]
+                              for h in board.holes
+                              for c in components
+                              for t in c.terminals
+                              for p in positions_which_have_term_in[t, h])))
+
+    # Add constraints which ensure that no hole is part of more than one
+    # net, and if its disconnected from all nets, then it can be part of no
+    # net.
+    families.add("net_discontinuity",
+        lambda: cnf.Expr.all(
+                      cnf.at_most_one(
+                          [term_conn[net[0], h] for net in nets] +
+                          [term_dist[h, len(board.holes) - 1]])
+                for h in board.holes))
+
+def _drilled_constraints(board, trace_links, drilled, max_drilled, families):
+    """
+    Add constraints to enforce the effect of drilled holes.
+
+    Ie. traces connected to drilled holes do not conduct, and there are no more
+    than `max_drilled` drilled holes.
+
+    """
+
+    # Add a constraint to enforce the following: A trace link is present iff
+    # neither of the holes it is connected to are drilled.
+    families.add("drilled_links", lambda:
+        wff.to_cnf(
+            wff.for_all(l.pres_var.iff(~drilled[l.h1] & ~drilled[l.h2])
+                                                        for l in trace_links)))
+
+    # Enforce cardinality constraints on drilled holes.
+    if max_drilled == 0:
+        families.add("max_drilled", lambda:
+            wff.to_cnf(wff.for_all(~drilled[h] for h in board.holes)))
+    elif max_drilled is not None:
+        families.add("max_drilled", lambda:
+            _at_most([drilled[h] for h in board.holes], max_drilled,
+                     var_prefix="max drilled"))
+
+def _jumper_constraints(jumpers, jumper_vars, max_jumpers, families):
+    """
+    Add constraints to enforce the limit on the number of jumpers.
+
+    """
+    if max_jumpers is not None and max_jumpers > 0 and len(jumpers) > 1:
+        families.add("max_jumpers", lambda:
+            _at_most([jumper_vars[j] for j in jumpers], max_jumpers,
+                     var_prefix="max jumper"))
+
+def _encode(board, components, nets, positions, jumpers, *,
+            max_drilled, max_jumpers, workers=1, hooks=None):
+    """
+    Encode a placement problem as a CNF formula.
+
+    workers: Number of worker processes to build the constraints with.
+
+    Returns:
+        An `_Encoding`.
+
+    """
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    # All variables are made from a fresh pool, so that they're numbered
+    # densely, in the same order on every run. Variables are named by their
+    # indices into tables of the objects they refer to (see
+    # `cnf.VarPool.add_kind`), and not by the objects themselves.
+    with cnf.VarPool() as pool:
+        # Make variables to indicate whether a component is in a particular
+        # position. Assignments for these variables will be used to produce
+        # placements.
+        kind = pool.add_kind("comp {} in pos {}", components,
+                             max(map(len, positions.values()), default=0))
+        comp_pos = {(comp, pos): wff.Var((kind, c_idx, p_idx))
+                        for c_idx, comp in enumerate(components)
+                        for p_idx, pos in enumerate(positions[comp])}
+
+        # Make variables to indicate whether each jumper is present, and
+        # links for each jumper.
+        kind = pool.add_kind("{0.h1}->{0.h2} jumper", jumpers)
+        jumper_vars = {j: wff.Var((kind, j_idx))
+                           for j_idx, j in enumerate(jumpers)}
+        jumper_links = [_Link(j.h1, j.h2, jumper_vars[j]) for j in jumpers]
+
+        # Make links for each trace.
+        traces = list(board.traces)
+        kind = pool.add_kind("trace {} link", traces)
+        trace_links = [_Link(h1, h2, wff.Var((kind, t_idx)))
+                           for t_idx, (h1, h2) in enumerate(traces)]
+
+        # Make variables to indicate holes which have been drilled out.
+        holes = list(board.holes)
+        kind = pool.add_kind("{} drilled", holes)
+        drilled = {h: wff.Var((kind, h_idx))
+                       for h_idx, h in enumerate(holes)}
+
+        links = jumper_links + trace_links
+
+        # Collect the families of constraints. All of the variables which are
+        # shared between families are made here, and each part builds its
+        # clauses in a fixed order, so the clauses are the same list however
+        # the families are built.
+        families = _Families()
+        _comp_pos_constraints(components, positions, comp_pos, families)
+        _drilled_constraints(board, trace_links, drilled, max_drilled,
+                             families)
+        _jumper_constraints(jumpers, jumper_vars, max_jumpers, families)
+        _physical_constraints(board, components, positions, comp_pos,
+                              jumpers, jumper_vars, families)
+        _continuity_constraints(board, components, nets, positions,
+                                comp_pos, links, families)
+
+        if workers > 1 and _can_fork():
+            clauses = _build_families_in_parallel(families, pool, workers,
+                                                  hooks)
+        else:
+            expr = families.build(hooks)
+
+            # Convert to the solver module's representation. Variable IDs are
+            # those assigned by the pool, so no remapping is needed.
+            with hooks.phase("id_mapping"):
+                clauses, _ = cnf.to_int_clauses(expr, pool)
+
+    comp_pos_ids = [array.array('i', (comp_pos[comp, pos].id
+                                          for pos in positions[comp]))
+                        for comp in components]
+    drilled_ids = array.array('i', (drilled[h].id
+                                        for h in sorted(board.holes)))
+    jumper_ids = array.array('i', (jumper_vars[j].id for j in jumpers))
+
+    # Simplify the clauses. The variables which make up a placement are kept,
+    # since solutions are decoded from them, and callers add clauses over
+    # them.
+    with hooks.phase("preprocess"):
+        clauses, reconstruction = cnf.preprocess(
+                clauses, num_vars=len(pool),
+                frozen=itertools.chain(itertools.chain.from_iterable(
+                                                               comp_pos_ids),
+                                       drilled_ids, jumper_ids))
+
+    return _Encoding(clauses, len(pool), comp_pos_ids, drilled_ids,
+                     jumper_ids, reconstruction=reconstruction, names=pool)
+
+class Size(collections.namedtuple('_SizeBase',
+                                  ('vars', 'clauses', 'literals'))):
+    """
+    The size of a CNF expression.
+
+    """
+    pass
+
+class Estimate(collections.namedtuple('_EstimateBase',
+                                      ('families', 'total'))):
+    """
+    The predicted size of a placement problem's encoding, as returned by
+    `estimate`.
+
+    Attributes:
+        families: Ordered dict mapping the name of each constraint family to
+            the `Size` of its clauses. Variables shared between families are
+            counted in each of them.
+        total: `Size` of the whole encoding.
+
+    """
+
+    def as_dict(self):
+        return {
+            'families': collections.OrderedDict(
+                            (name, size._asdict())
+                                for name, size in self.families.items()),
+            'total': self.total._asdict(),
+        }
+
+    def print_text(self, file=sys.stdout):
+        print("{:24} {:>10} {:>10} {:>10}".format(
+                  "Family", "Vars", "Clauses", "Literals"),
+              file=file)
+        for name, size in itertools.chain(self.families.items(),
+                                          [("total", self.total)]):
+            print("{:24} {:10} {:10} {:10}".format(name, *size), file=file)
+
+def _estimate(board, components, nets, positions, jumpers, *,
+              max_drilled, max_jumpers):
+    """
+    Implementation of `estimate`.
+
+    Works on positions and jumpers that have already been generated. This
+    mirrors `_encode`, and must be kept in sync with it.
+
+    """
+    holes = board.holes
+    spaces = board.spaces
+    num_holes = len(holes)
+    heads = [net[0] for net in nets]
+    trace_holes = {h for t in board.traces for h in t}
+    num_links = len(board.traces) + len(jumpers)
+
+    families = collections.OrderedDict()
+
+    # Number of variables which are introduced by the encodings of particular
+    # constraints (eg. commander variables).
+    new_vars = 0
+
+    # Each component's `comp_pos` vars: exactly one.
+    clauses = literals = num_vars = 0
+    for c in components:
+        n = len(positions[c])
+        amo_clauses, amo_literals, amo_vars = cnf.at_most_one_size(n)
+        clauses += 1 + amo_clauses
+        literals += n + amo_literals
+        num_vars += n + amo_vars
+        new_vars += amo_vars
+    families['comp_pos'] = Size(num_vars, clauses, literals)
+
+    # Trace links conduct iff neither hole is drilled: 3 clauses (7 literals)
+    # per trace.
+    families['drilled_links'] = Size(len(board.traces) + len(trace_holes),
+                                     3 * len(board.traces),
+                                     7 * len(board.traces))
+    drilled_vars = trace_holes
+    if max_drilled == 0:
+        families['max_drilled'] = Size(num_holes, num_holes, num_holes)
+        drilled_vars = holes
+    elif max_drilled is not None:
+        clauses, literals, seq_vars = _at_most_size(num_holes, max_drilled)
+        families['max_drilled'] = Size(num_holes + seq_vars, clauses,
+                                       literals)
+        new_vars += seq_vars
+        drilled_vars = holes
+
+    # Jumpers that appear in some clause. They all appear in the continuity
+    # constraints, unless those are trivial.
+    present_jumpers = (set(jumpers) if nets or num_holes > 1 else set())
+    if max_jumpers is not None and max_jumpers > 0 and len(jumpers) > 1:
+        clauses, literals, seq_vars = _at_most_size(len(jumpers), max_jumpers)
+        families['max_jumpers'] = Size(len(jumpers) + seq_vars, clauses,
+                                       literals)
+        new_vars += seq_vars
+        present_jumpers = set(jumpers)
+
+    # occ[c, s] iff some position of `c` covering `s` is chosen: a clause of
+    # k + 1 literals, plus k binary clauses, where k is the number of such
+    # positions.
+    occupied = sum(len(p.occupies) for c in components for p in positions[c])
+    families['occ'] = Size(
+        len(components) * len(spaces) +
+            sum(1 for c in components for p in positions[c] if p.occupies),
+        len(components) * len(spaces) + occupied,
+        len(components) * len(spaces) + 3 * occupied)
+
+    # At most one component or jumper in each space.
+    jumpers_in_space = collections.Counter(s for j in jumpers
+                                                     for s in j.occupies)
+    clauses = literals = num_vars = 0
+    space_jumpers = set()
+    for s in spaces:
+        n = len(components) + jumpers_in_space[s]
+        amo_clauses, amo_literals, amo_vars = cnf.at_most_one_size(n)
+        clauses += amo_clauses
+        literals += amo_literals
+        num_vars += amo_vars
+        new_vars += amo_vars
+        if n >= 2:
+            num_vars += len(components)
+            space_jumpers.update(j for j in jumpers if s in j.occupies)
+    families['one_per_space'] = Size(num_vars + len(space_jumpers), clauses,
+                                     literals)
+    present_jumpers |= space_jumpers
+
+    # Sizes of the continuity constraints are in terms of the number of links
+    # incident to each hole, which sums to twice the number of links, and the
+    # number of positions of each head terminal's component.
+    head_comps = {t.component for t in heads}
+    head_positions = sum(len(positions[t.component]) for t in heads)
+    head_comp_positions = sum(len(positions[c]) for c in head_comps)
+
+    # term_conn[t, h]: one clause of 1 + d + k literals, d + k binary clauses,
+    # and an intermediate var (with 3 clauses, 7 literals) per incident link.
+    if heads:
+        families['term_conn'] = Size(
+            len(heads) * num_holes + 2 * num_links * len(heads) + num_links +
+                                                        head_comp_positions,
+            len(heads) * num_holes + 8 * num_links * len(heads) +
+                                                        head_positions,
+            len(heads) * num_holes + 20 * num_links * len(heads) +
+                                                        3 * head_positions)
+        new_vars += 2 * num_links * len(heads)
+    else:
+        families['term_conn'] = Size(0, 0, 0)
+
+    # term_dist[h, 0]: a clause of 1 + k literals and k binary clauses.
+    families['zero_term_dist'] = Size(
+        num_holes + head_comp_positions,
+        num_holes + head_positions,
+        num_holes + 3 * head_positions)
+
+    # term_dist[h, i] for i > 0: 4d + 2 clauses, 10d + 4 literals.
+    if num_holes > 1:
+        families['term_dist'] = Size(
+            num_holes * num_holes + 2 * num_links * (num_holes - 1) +
+                                                                   num_links,
+            (num_holes - 1) * (8 * num_links + 2 * num_holes),
+            (num_holes - 1) * (20 * num_links + 4 * num_holes))
+        new_vars += 2 * num_links * (num_holes - 1)
+    else:
+        families['term_dist'] = Size(0, 0, 0)
+
+    # A binary clause for each terminal of each position.
+    head_of = {t: net[0] for net in nets for t in net}
+    conn_vars = {(head_of[t], p.terminal_positions[t])
+                    for c in components
+                    for p in positions[c]
+                    for t in c.terminals}
+    families['net_continuity'] = Size(
+        sum(len(positions[c]) for c in components if c.terminals) +
+                                                                len(conn_vars),
+        sum(len(positions[c]) * len(c.terminals) for c in components),
+        2 * sum(len(positions[c]) * len(c.terminals) for c in components))
+
+    # At most one net (or being disconnected) for each hole.
+    n = len(heads) + 1
+    clauses, literals, amo_vars = cnf.at_most_one_size(n)
+    families['net_discontinuity'] = Size(
+                    num_holes * (amo_vars + (n if n >= 2 else 0)),
+                    num_holes * clauses,
+                    num_holes * literals)
+    new_vars += num_holes * amo_vars
+
+    total_vars = (sum(len(positions[c]) for c in components) +
+                  len(components) * len(spaces) +
+                  len(board.traces) +
+                  len(present_jumpers) +
+                  len(drilled_vars) +
+                  len(heads) * num_holes +
+                  num_holes * num_holes +
+                  new_vars)
+    total = Size(total_vars,
+                 sum(size.clauses for size in families.values()),
+                 sum(size.literals for size in families.values()))
+
+    return Estimate(families, total)
+
+def estimate(board, components, nets, *,
+             max_jumper_length=0, max_drilled=None, max_jumpers=None,
+             pins=None, keep_out=None, component_keep_out=None):
+    """
+    Predict the size of the encoding of a placement problem, without encoding
+    it.
+
+    Only the positions of each component need to be generated, so this is
+    much cheaper than encoding the problem. Arguments are as for `place`.
+
+    Returns:
+        An `Estimate`.
+
+    """
+    nets = [list(net) for net in nets]
+    components = list(components)
+
+    if max_jumpers == 0:
+        max_jumper_length = 0
+    positions = {c: get_positions(c, board) for c in components}
+    jumpers = _get_jumpers(board, max_jumper_length)
+    board, positions, jumpers = _restrict(
+                                    board, components, positions, jumpers,
+                                    pins=pins, keep_out=keep_out,
+                                    component_keep_out=component_keep_out)
+
+    return _estimate(board, components, nets, positions, jumpers,
+                     max_drilled=max_drilled, max_jumpers=max_jumpers)
+
+class Infeasible(solver.Unsatisfiable):
+    """
+    A placement problem was found to have no solutions, without solving it.
+
+    Attributes:
+        reason: Human readable explanation of why there are no solutions.
+
+    """
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class Bounds(collections.namedtuple('_BoundsBase',
+                                    ('min_drilled', 'min_jumpers'))):
+    """
+    Lower bounds on the number of drilled holes and jumpers in any solution
+    to a placement problem, as returned by `check`.
+
+    """
+    pass
+
+def _get_strips(board):
+    """
+    Group the holes of a board into strips: sets of holes which are connected
+    by traces.
+
+    Returns:
+        A dict mapping each hole to the index of its strip, and the number of
+        strips.
+
+    """
+    neighbours = collections.defaultdict(list)
+    for h1, h2 in board.traces:
+        neighbours[h1].append(h2)
+        neighbours[h2].append(h1)
+
+    strip_of = {}
+    num_strips = 0
+    for hole in sorted(board.holes):
+        if hole in strip_of:
+            continue
+        stack = [hole]
+        strip_of[hole] = num_strips
+        while stack:
+            for n in neighbours[stack.pop()]:
+                if n not in strip_of:
+                    strip_of[n] = num_strips
+                    stack.append(n)
+        num_strips += 1
+
+    return strip_of, num_strips
+
+def _check(board, components, nets, positions, jumpers, *,
+           max_drilled, max_jumpers):
+    """
+    Implementation of `check`.
+
+    Works on positions and jumpers that have already been generated.
+
+    """
+    # Every component needs somewhere to go.
+    for c in components:
+        if not positions[c]:
+            raise Infeasible("{} does not fit anywhere on the board".format(c))
+
+    # Components cannot share spaces.
+    min_area = sum(min(len(p.occupies) for p in positions[c])
+                                                          for c in components)
+    if min_area > len(board.spaces):
+        raise Infeasible("The components occupy at least {} spaces, but the "
+                         "board only has {}".format(min_area,
+                                                    len(board.spaces)))
+
+    # Each net needs a strip (or part of a strip) of its own. Drilling a hole
+    # with `d` traces splits its strip into at most `d + 1` parts.
+    strip_of, num_strips = _get_strips(board)
+    degree = collections.Counter(h for t in board.traces for h in t)
+    max_degree = max(degree.values(), default=0)
+    shortfall = len(nets) - num_strips
+    if shortfall <= 0:
+        min_drilled = 0
+    elif max_degree == 0:
+        raise Infeasible("There are {} nets, but only {} holes".format(
+                                                   len(nets), num_strips))
+    else:
+        min_drilled = -(-shortfall // max_degree)
+    if max_drilled is not None and min_drilled > max_drilled:
+        raise Infeasible("There are {} nets, but only {} strips. At least {} "
+                         "holes must be drilled to separate them, but only "
+                         "{} may be".format(len(nets), num_strips,
+                                            min_drilled, max_drilled))
+
+    # Drilling only breaks strips, so a net needs a jumper if it has a pair
+    # of terminals which can never be on the same strip. A jumper can only
+    # serve one net.
+    def can_share_strip(t1, t2):
+        if t1.component is t2.component:
+            return any(strip_of[p.terminal_positions[t1]] ==
+                            strip_of[p.terminal_positions[t2]]
+                                for p in positions[t1.component])
+        strips1 = {strip_of[p.terminal_positions[t1]]
+                                              for p in positions[t1.component]}
+        return any(strip_of[p.terminal_positions[t2]] in strips1
+                                              for p in positions[t2.component])
+
+    needs_jumper = [net for net in nets
+                        if not all(can_share_strip(t1, t2)
+                                       for t1, t2 in
+                                             itertools.combinations(net, 2))]
+    min_jumpers = len(needs_jumper)
+    if min_jumpers > 0:
+        if not jumpers:
+            limit = 0
+        elif max_jumpers is not None:
+            limit = max_jumpers
+        else:
+            limit = None
+        if limit is not None and min_jumpers > limit:
+            raise Infeasible("Nets {} cannot be connected by traces alone, "
+                             "so at least {} jumpers are needed, but only {} "
+                             "are allowed".format(
+                                 ", ".join("({})".format(
+                                             ", ".join(_terminal_name(t)
+                                                           for t in net))
+                                              for net in needs_jumper),
+                                 min_jumpers, limit))
+
+    return Bounds(min_drilled, min_jumpers)
+
+def _terminal_name(terminal):
+    return "{}:{}".format(terminal.component, terminal.label)
+
+def check(board, components, nets, *,
+          max_jumper_length=0, max_drilled=None, max_jumpers=None,
+          pins=None, keep_out=None, component_keep_out=None):
+    """
+    Run cheap tests for conditions that make a placement problem infeasible.
+
+    `place` runs these tests itself before encoding a problem. Passing them
+    does not imply that the problem has a solution. Arguments are as for
+    `place`.
+
+    Raises:
+        Infeasible: If the problem definitely has no solutions.
+
+    Returns:
+        The `Bounds` implied by the tests.
+
+    """
+    nets = [list(net) for net in nets]
+    components = list(components)
+
+    if max_jumpers == 0:
+        max_jumper_length = 0
+    positions = {c: get_positions(c, board) for c in components}
+    jumpers = _get_jumpers(board, max_jumper_length)
+    board, positions, jumpers = _restrict(
+                                    board, components, positions, jumpers,
+                                    pins=pins, keep_out=keep_out,
+                                    component_keep_out=component_keep_out)
+
+    return _check(board, components, nets, positions, jumpers,
+                  max_drilled=max_drilled, max_jumpers=max_jumpers)
+
+class _SolutionLog():
+    """
+    A compact record of the solutions to a problem, as stored in a cache.
+
+    Each solution is a tuple `(pos_idxs, drilled_mask, jumper_mask)`, where
+    `pos_idxs` gives the index of each component's position, and the masks are
+    integers whose bits indicate which holes are drilled and which jumpers are
+    present.
+
+    Attributes:
+        complete: True if the log contains every solution to the problem.
+
+    """
+
+    def __init__(self, num_components):
+        self._num_components = num_components
+        self._pos_idxs = array.array('I')
+        self._drilled_masks = []
+        self._jumper_masks = []
+        self.complete = False
+
+    def __len__(self):
+        return len(self._drilled_masks)
+
+    def __iter__(self):
+        n = self._num_components
+        for i, (drilled_mask, jumper_mask) in enumerate(
+                            zip(self._drilled_masks, self._jumper_masks)):
+            yield (tuple(self._pos_idxs[i * n:(i + 1) * n]),
+                   drilled_mask, jumper_mask)
+
+    def copy(self):
+        """
+        Return a copy of the log, which can be appended to without affecting
+        this one.
+
+        """
+        log = _SolutionLog(self._num_components)
+        log._pos_idxs = array.array('I', self._pos_idxs)
+        log._drilled_masks = list(self._drilled_masks)
+        log._jumper_masks = list(self._jumper_masks)
+        log.complete = self.complete
+        return log
+
+    def append(self, sol):
+        pos_idxs, drilled_mask, jumper_mask = sol
+        self._pos_idxs.extend(pos_idxs)
+        self._drilled_masks.append(drilled_mask)
+        self._jumper_masks.append(jumper_mask)
+
+def _index_getter(idxs):
+    """
+    Make a callable which returns a tuple of the items at `idxs` in a list.
+
+    """
+    if len(idxs) == 1:
+        idx, = idxs
+        return lambda seq: (seq[idx],)
+    if not idxs:
+        return lambda seq: ()
+    return operator.itemgetter(*idxs)
+
+def _bits(mask):
+    """
+    Yield the index of each set bit in a bitmask, lowest first.
+
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class _Decoder():
+    """
+    Extracts the placement variables from solutions to an encoding.
+
+    The IDs of the variables are gathered into index arrays up front, so that
+    decoding a solution only looks at the variables which determine the
+    placement. The selection is done by `itemgetter`, `map` and `compress`,
+    rather than by a Python loop over the variables.
+
+    """
+
+    def __init__(self, encoding):
+        self._pos_idxs, self._get_pos = self._gather(encoding.comp_pos)
+        self._drilled_bits, self._get_drilled = self._gather(
+                                                           [encoding.drilled])
+        self._jumper_bits, self._get_jumpers = self._gather(
+                                                           [encoding.jumpers])
+
+    @staticmethod
+    def _gather(id_arrays):
+        idxs = []
+        sol_idxs = []
+        for ids in id_arrays:
+            for idx, var_id in enumerate(ids):
+                idxs.append(idx)
+                sol_idxs.append(var_id - 1)
+        return idxs, _index_getter(sol_idxs)
+
+    def decode(self, sol):
+        pos_idxs = tuple(itertools.compress(
+                          self._pos_idxs, map(_is_true, self._get_pos(sol))))
+        drilled_mask = sum(1 << i for i in itertools.compress(
+                  self._drilled_bits, map(_is_true, self._get_drilled(sol))))
+        jumper_mask = sum(1 << i for i in itertools.compress(
+                  self._jumper_bits, map(_is_true, self._get_jumpers(sol))))
+        return pos_idxs, drilled_mask, jumper_mask
+
+# Indicate whether a literal in a solution is true.
+_is_true = (0).__lt__
+
+def _decode(encoding, sol, log=None):
+    """
+    Map a solution from the solver module back to a placement.
+
+    If `log` is given, the value of each named variable is written to it.
+
+    Returns:
+        A tuple `(pos_idxs, drilled_mask, jumper_mask)`, as described in
+        `_SolutionLog`.
+
+    """
+    # The value of variable `i` is at `sol[i - 1]`. Solutions may include
+    # variables added after encoding, which are ignored, and may omit
+    # variables which were eliminated, which are only needed for the log.
+    assert abs(sol[-1]) == len(sol)
+
+    if log is not None and encoding.names is not None:
+        sol = encoding.reconstruction.extend(sol, encoding.num_vars)
+        for var_id in range(1, encoding.num_vars + 1):
+            log.write("{} {}\n".format(" " if sol[var_id - 1] > 0 else "~",
+                                       encoding.names.name(var_id)))
+
+    if encoding.decoder is None:
+        encoding.decoder = _Decoder(encoding)
+    pos_idxs, drilled_mask, jumper_mask = encoding.decoder.decode(sol)
+
+    # If this fails the "exactly one position" constraint has been violated.
+    assert len(pos_idxs) == len(encoding.comp_pos)
+
+    return pos_idxs, drilled_mask, jumper_mask
+
+def _blocking_clause(encoding, sol):
+    """
+    Make a clause which excludes a decoded solution.
+
+    Only the variables which determine the placement are constrained, so any
+    solution differing only in internal variables is also excluded.
+
+    """
+    pos_idxs, drilled_mask, jumper_mask = sol
+
+    clause = [-ids[idx] for ids, idx in zip(encoding.comp_pos, pos_idxs)]
+    for mask, ids in ((drilled_mask, encoding.drilled),
+                      (jumper_mask, encoding.jumpers)):
+        clause.extend(-var_id if mask >> i & 1 else var_id
+                            for i, var_id in enumerate(ids))
+    return clause
+
+def _solve(encoding, slvr, extra_clauses=(), hooks=None):
+    """
+    Find all solutions to an encoding.
+
+    Yields:
+        Decoded solutions, as returned by `_decode`.
+
+    """
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    # Time spent by the caller between solutions is not attributed to either
+    # phase.
+    sols = iter(slvr.itersolve(encoding.clauses + list(extra_clauses)))
+    while True:
+        with hooks.phase("solve"):
+            sol = next(sols, None)
+        if sol is None:
+            break
+        with hooks.phase("decode"):
+            decoded = _decode(encoding, sol, slvr.log)
+        hooks.count("solutions")
+        yield decoded
+
+class _Problem():
+    """
+    A placement problem, prepared for encoding.
+
+    Attributes:
+        board: The board, with any keep-out cells removed.
+        placement_board: The board passed in by the caller, which placements
+            refer to.
+        components: List of components to place.
+        nets: List of nets, each a list of terminals.
+        positions: Dict mapping each component to its list of allowed
+            positions.
+        jumpers: List of allowed `_Jumper`s.
+        holes: The board's holes, sorted.
+        key: The problem's fingerprint.
+        bounds: `Bounds` found by the pre-checks.
+
+    """
+
+    def __init__(self, board, placement_board, components, nets, positions,
+                 jumpers, key, bounds, *, max_drilled, max_jumpers):
+        self.board = board
+        self.placement_board = placement_board
+        self.components = components
+        self.nets = nets
+        self.positions = positions
+        self.jumpers = jumpers
+        self.holes = sorted(board.holes)
+        self.key = key
+        self.bounds = bounds
+        self._max_drilled = max_drilled
+        self._max_jumpers = max_jumpers
+        self._quality_table = None
+        self._encoding = None
+
+        # A long running process (see `server`) may share a problem between
+        # threads. These ensure the encoding and quality table are built once.
+        self._encoding_lock = threading.Lock()
+        self._quality_table_lock = threading.Lock()
+
+    def encode(self, encoding_cache=None, hooks=None, workers=1):
+        """
+        Fetch the encoding from the cache if possible, otherwise generate it.
+
+        The encoding is kept, and returned by later calls. Concurrent calls
+        wait for the first to finish.
+
+        workers: Number of worker processes to generate the encoding with.
+            None implies the number of CPUs.
+
+        """
+        if hooks is None:
+            hooks = instrument.Hooks()
+        with self._encoding_lock:
+            if self._encoding is not None:
+                return self._encoding
+            if workers is None:
+                workers = os.cpu_count() or 1
+            encoding = None
+            if encoding_cache is not None:
+                with hooks.phase("cache_load"):
+                    encoding = encoding_cache.load(self.key)
+                hooks.count("encoding_cache_hits" if encoding is not None
+                                                  else "encoding_cache_misses")
+            if encoding is None:
+                with hooks.phase("encode"):
+                    encoding = _encode(self.board, self.components, self.nets,
+                                       self.positions, self.jumpers,
+                                       max_drilled=self._max_drilled,
+                                       max_jumpers=self._max_jumpers,
+                                       workers=workers, hooks=hooks)
+                if encoding_cache is not None:
+                    with hooks.phase("cache_store"):
+                        encoding_cache.store(self.key, encoding)
+            hooks.count("vars", encoding.num_vars)
+            hooks.count("clauses", len(encoding.clauses))
+            hooks.count("literals", sum(len(c) for c in encoding.clauses))
+            self._encoding = encoding
+            return encoding
+
+    def make_placement(self, sol):
+        """
+        Make a `Placement` from a decoded solution.
+
+        The placement's mapping, drilled holes and jumpers are only built when
+        they are first used.
+
+        """
+        return Placement._from_solution(self, sol)
+
+    def get_quality_table(self):
+        with self._quality_table_lock:
+            if self._quality_table is None:
+                self._quality_table = _QualityTable(self.components,
+                                                    self.positions, self.nets,
+                                                    self.jumpers)
+            return self._quality_table
+
+def _prepare(board, components, nets, *, max_jumper_length, max_drilled,
+             max_jumpers, pins, keep_out, component_keep_out, hooks):
+    """
+    Generate positions and jumpers for a problem, apply restrictions, check
+    the problem is not obviously infeasible, and fingerprint it.
+
+    Returns:
+        A `_Problem`.
+
+    """
+
+    # Unpack arguments in case the caller provided a generator (or other
+    # one-time iterable), so they can be re-iterated and subscripted in this
+    # function.
+    nets = [list(net) for net in nets]
+    components = list(components)
+
+    # Position objects that represent the same position may have different
+    # hashes (their hash function is the default id based implementation).
+    # 
+    # Allow the positions to be hashed correctly by using only one Position for
+    # each component position within this function.
+    with hooks.phase("positions"):
+        positions = {c: get_positions(c, board) for c in components}
+
+    # Make jumpers.
+    if max_jumpers == 0:
+        max_jumper_length = 0
+    with hooks.phase("jumpers"):
+        jumpers = _get_jumpers(board, max_jumper_length)
+
+    # Prune positions and jumpers which are ruled out by pins and keep-out
+    # cells. The original board is kept for the placements.
+    placement_board = board
+    with hooks.phase("restrict"):
+        board, positions, jumpers = _restrict(
+                                    board, components, positions, jumpers,
+                                    pins=pins, keep_out=keep_out,
+                                    component_keep_out=component_keep_out)
+    hooks.count("positions", sum(len(p) for p in positions.values()))
+    hooks.count("jumpers", len(jumpers))
+
+    # Fail fast if the problem is obviously infeasible.
+    with hooks.phase("check"):
+        bounds = _check(board, components, nets, positions, jumpers,
+                        max_drilled=max_drilled, max_jumpers=max_jumpers)
+    hooks.count("min_drilled", bounds.min_drilled)
+    hooks.count("min_jumpers", bounds.min_jumpers)
+
+    with hooks.phase("fingerprint"):
+        key = _fingerprint(board, components, nets, positions, jumpers,
+                           max_drilled=max_drilled, max_jumpers=max_jumpers)
+
+    return _Problem(board, placement_board, components, nets, positions,
+                    jumpers, key, bounds, max_drilled=max_drilled,
+                    max_jumpers=max_jumpers)
+
 def place(board, components, nets, *,
           allow_drilled=False, max_jumper_length=0,
           max_drilled=None, max_jumpers=None,
-          slvr=None):
+          pins=None, keep_out=None, component_keep_out=None,
+          slvr=None, encoding_cache=None, solution_cache=None, workers=1,
+          hooks=None):
     """
     Place components on a board, according to a net list.
 
@@ -265,276 +1759,1213 @@ def place(board, components, nets, *,
         unbounded.
     max_jumpers: Maximum number of jumpers in the solution. None implies
         unbounded.
-    slvr: Solver to use to solve the placement.
+    pins: Optional mapping of components to dicts, which map some of the
+        component's terminals to the holes they must be in. Only positions
+        which agree are considered.
+    keep_out: Optional iterable of cells which no component or jumper may
+        occupy.
+    component_keep_out: Optional mapping of components to iterables of cells
+        which the component may not occupy.
+    slvr: Solver to use to solve the placement. Defaults to a new solver
+        made by `solver.make_solver`. If the solver has a log, the value of
+        each named variable in each solution is also written to it.
+    encoding_cache: Optional `cache.Cache` in which encodings are stored,
+        keyed by the problem's fingerprint. If the problem has been encoded
+        before the encoding step is skipped.
+    solution_cache: Optional `cache.Cache` in which solutions are stored,
+        keyed by the problem's fingerprint and the solver version. Solutions
+        found by earlier runs are yielded without invoking the solver, and if
+        an earlier run stopped early the search resumes where it left off.
+    workers: Number of worker processes used to build the encoding. The
+        families of constraints are built in parallel if this is more than
+        one, on platforms which can fork, when no other threads are running.
+        None implies the number of CPUs.
+    hooks: Optional `instrument.Hooks` which is told about each phase of the
+        placement as it runs, and the size of each family of constraints.
+
+    Raises:
+        Infeasible: If cheap tests show that there are no solutions. This is
+            raised before anything is encoded. See `check`.
 
     Yields:
         Placements which satify the input constraints.
 
     """
 
-    # Unpack arguments in case the caller provided a generator (or other
-    # one-time iterable), so they can be re-iterated and subscripted in this
-    # function.
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    problem = _prepare(board, components, nets,
+                       max_jumper_length=max_jumper_length,
+                       max_drilled=max_drilled, max_jumpers=max_jumpers,
+                       pins=pins, keep_out=keep_out,
+                       component_keep_out=component_keep_out, hooks=hooks)
+
+    yield from place_prepared(problem, slvr=slvr,
+                              encoding_cache=encoding_cache,
+                              solution_cache=solution_cache,
+                              workers=workers, hooks=hooks)
+
+def prepare(board, components, nets, *, max_jumper_length=0,
+            max_drilled=None, max_jumpers=None, pins=None, keep_out=None,
+            component_keep_out=None, hooks=None):
+    """
+    Do the work of `place` which comes before encoding: generate positions
+    and jumpers, apply restrictions, check the problem, and fingerprint it.
+
+    The arguments are as for `place`.
+
+    Raises:
+        Infeasible: If cheap tests show that there are no solutions.
+
+    Returns:
+        A prepared problem, to be passed to `place_prepared`. It keeps its
+        encoding once it has been built, so a long running process can hold
+        on to it to place the same problem again without repeating any of
+        this work.
+
+    """
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    return _prepare(board, components, nets,
+                    max_jumper_length=max_jumper_length,
+                    max_drilled=max_drilled, max_jumpers=max_jumpers,
+                    pins=pins, keep_out=keep_out,
+                    component_keep_out=component_keep_out, hooks=hooks)
+
+def place_prepared(problem, *, slvr=None, encoding_cache=None,
+                   solution_cache=None, workers=1, hooks=None):
+    """
+    Place a problem returned by `prepare`.
+
+    Placements refer to the components and board which were passed to
+    `prepare`. The other arguments are as for `place`.
+
+    Yields:
+        Placements which satify the input constraints.
+
+    """
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    if slvr is None:
+        slvr = solver.make_solver()
+
+    if solution_cache is None:
+        encoding = problem.encode(encoding_cache, hooks, workers)
+        for sol in _solve(encoding, slvr, hooks=hooks):
+            yield problem.make_placement(sol)
+        return
+
+    # Replay any solutions found by a previous run, and then resume the search
+    # if that run did not enumerate all of them. Solutions found so far are
+    # written back to the cache when the caller stops iterating.
+    #
+    # The cached log is copied before it is extended, since a cache may hand
+    # the same object to concurrent runs (see `cache.MemoryCache`).
+    sol_key = hashlib.sha256("{}-{}".format(problem.key, slvr.version)
+                                             .encode("utf-8")).hexdigest()
+    with hooks.phase("cache_load"):
+        log = solution_cache.load(sol_key)
+    if log is None:
+        log = _SolutionLog(len(problem.components))
+    else:
+        log = log.copy()
+    num_cached, was_complete = len(log), log.complete
+
+    try:
+        for sol in log:
+            hooks.count("cached_solutions")
+            yield problem.make_placement(sol)
+
+        if not log.complete:
+            encoding = problem.encode(encoding_cache, hooks, workers)
+            blocking_clauses = [_blocking_clause(encoding, sol)
+                                                             for sol in log]
+            for sol in _solve(encoding, slvr, blocking_clauses, hooks):
+                log.append(sol)
+                yield problem.make_placement(sol)
+            log.complete = True
+    finally:
+        if len(log) != num_cached or log.complete != was_complete:
+            with hooks.phase("cache_store"):
+                solution_cache.store(sol_key, log)
+
+async def aplace(board, components, nets, *, max_queued=16, executor=None,
+                 hooks=None, **kwargs):
+    """
+    Asynchronous version of `place`.
+
+    Placement runs on a separate thread (or on `executor`, if given), and
+    placements are yielded as the solver produces them. At most `max_queued`
+    placements are held waiting for the consumer; once that many are waiting
+    the solver pauses until the consumer catches up.
+
+    If the consumer stops iterating (or is cancelled), placement is abandoned
+    at the start of its next phase. See `instrument.CancellableHooks`.
+
+    max_queued: Maximum number of placements found but not yet yielded.
+    executor: Optional `concurrent.futures.Executor` to run placement on. It
+        must run tasks in this process, eg. a `ThreadPoolExecutor`.
+    hooks: As for `place`.
+
+    Other keyword arguments are passed to `place`.
+
+    Raises:
+        Infeasible: As for `place`.
+
+    Yields:
+        Placements which satisfy the input constraints.
+
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.BoundedSemaphore(max_queued)
+    cancelled = threading.Event()
+    cancellable_hooks = instrument.CancellableHooks(cancelled, hooks)
+
+    def post(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The event loop has closed.
+            cancelled.set()
+
+    def produce():
+        # Each item posted is a `(placement, exception)` pair. A pair of
+        # Nones marks the end of the placements.
+        try:
+            for placement in place(board, components, nets,
+                                   hooks=cancellable_hooks, **kwargs):
+                while not slots.acquire(timeout=0.1):
+                    if cancelled.is_set():
+                        return
+                post((placement, None))
+        except instrument.Cancelled:
+            return
+        except BaseException as e:
+            post((None, e))
+            return
+        post((None, None))
+
+    if executor is None:
+        threading.Thread(target=produce, daemon=True).start()
+    else:
+        executor.submit(produce)
+
+    try:
+        while True:
+            placement, exc = await queue.get()
+            if placement is None:
+                if exc is not None:
+                    raise exc
+                break
+            slots.release()
+            yield placement
+    finally:
+        cancelled.set()
+
+def _counter_ids(lits, k, first_id, exact=False):
+    """
+    Make a sequential counter over `lits`, in the solver module's
+    representation.
+
+    This is the register part of `_at_most`'s encoding, built directly from
+    variable IDs so that it can be added to an existing encoding. The clauses
+    which prevent the count exceeding a limit are left out. Instead the
+    counter's outputs are returned, so that different limits can be imposed
+    by adding a single unit clause: at most `d` of `lits` are true iff
+    `outputs[d]` is false.
+
+    exact: If set, the counter's variables are also forced false when fewer
+        than the number they count are true, so that they are determined by
+        `lits`. Without this, enumerating solutions would yield each
+        assignment of `lits` once for each assignment of the counter.
+
+    Returns:
+        A tuple `(clauses, outputs, next_id)`. `outputs[j - 1]` is forced
+        true if at least `j` of `lits` are true, for `j` up to `k`.
+
+    """
+    n = len(lits)
+    k = min(k, n)
+    if k == 0:
+        return [], [], first_id
+
+    def s(i, j):
+        return first_id + (i - 1) * k + (j - 1)
+
+    clauses = [[-lits[0], s(1, 1)]]
+    clauses.extend([-s(1, j)] for j in range(2, k + 1))
+    for i in range(2, n + 1):
+        clauses.append([-lits[i - 1], s(i, 1)])
+        clauses.append([-s(i - 1, 1), s(i, 1)])
+        for j in range(2, k + 1):
+            clauses.append([-lits[i - 1], -s(i - 1, j - 1), s(i, j)])
+            clauses.append([-s(i - 1, j), s(i, j)])
+
+    if exact:
+        clauses.append([-s(1, 1), lits[0]])
+        for i in range(2, n + 1):
+            clauses.append([-s(i, 1), s(i - 1, 1), lits[i - 1]])
+            for j in range(2, k + 1):
+                clauses.append([-s(i, j), s(i - 1, j), lits[i - 1]])
+                clauses.append([-s(i, j), s(i - 1, j), s(i - 1, j - 1)])
+
+    return clauses, [s(n, j) for j in range(1, k + 1)], first_id + n * k
+
+def position_key(comp, pos):
+    """
+    Get a hashable key which identifies a position of a component.
+
+    Two positions have the same key if they put each terminal in the same hole
+    and occupy the same spaces, even if they are different objects, or belong
+    to different (but equivalent) components.
+
+    """
+    return (tuple(pos.terminal_positions[t] for t in comp.terminals),
+            frozenset(pos.occupies))
+
+def _previous_positions(previous, problem):
+    """
+    Find where each component of a problem was in a previous placement.
+
+    Components are matched by identity or, failing that, by label if the
+    label is unique in both the placement and the problem.
+
+    Returns:
+        A list giving, for each component of the problem, the index of its
+        previous position in `problem.positions`. The entry is None if the
+        component is new, or if its previous position is no longer allowed.
+
+    """
+    prev_by_label = collections.Counter(c.label for c in previous)
+    labels = collections.Counter(c.label for c in problem.components)
+    prev_comps = {c.label: c for c in previous
+                                        if prev_by_label[c.label] == 1}
+
+    idxs = []
+    for comp in problem.components:
+        if comp in previous:
+            prev_comp = comp
+        elif labels[comp.label] == 1:
+            prev_comp = prev_comps.get(comp.label)
+        else:
+            prev_comp = None
+
+        idx = None
+        if (prev_comp is not None and
+                len(prev_comp.terminals) == len(comp.terminals)):
+            prev_pos = previous[prev_comp]
+            key = position_key(prev_comp, prev_pos)
+            idx = next((i for i, pos in enumerate(problem.positions[comp])
+                                        if position_key(comp, pos) == key),
+                       None)
+        idxs.append(idx)
+
+    return idxs
+
+def eco(previous, board, components, nets, *, max_moves=None,
+        allow_drilled=False, max_jumper_length=0,
+        max_drilled=None, max_jumpers=None,
+        pins=None, keep_out=None, component_keep_out=None,
+        slvr=None, encoding_cache=None, workers=1, hooks=None):
+    """
+    Place components on a board after an engineering change, keeping as many
+    components as possible where they were in a previous placement.
+
+    The components and nets given describe the problem after the change; for
+    example, with a component added or a net altered. Components are
+    identified with those in `previous` as described in `_previous_positions`.
+
+    Placements are yielded in order of the number of components moved from
+    their previous positions, beginning with those where no components move
+    (other than new components, and those whose previous position is no longer
+    allowed). The first solution is found with the unmoved components fixed
+    in place, so it is typically found much faster than by `place`.
+
+    previous: A `Placement` of the problem before the change.
+    max_moves: Maximum number of components which may be moved, in addition
+        to those which must move. None implies unbounded.
+
+    The remaining arguments are as for `place`. The changed problem is
+    encoded afresh, rather than by reusing parts of the previous problem's
+    encoding, but passing an `encoding_cache` avoids re-encoding it on
+    subsequent calls.
+
+    Raises:
+        Infeasible: If cheap tests show that there are no solutions.
+
+    Yields:
+        Placements which satisfy the input constraints.
+
+    """
+    if hooks is None:
+        hooks = instrument.Hooks()
+
+    problem = _prepare(board, components, nets,
+                       max_jumper_length=max_jumper_length,
+                       max_drilled=max_drilled, max_jumpers=max_jumpers,
+                       pins=pins, keep_out=keep_out,
+                       component_keep_out=component_keep_out, hooks=hooks)
+    encoding = problem.encode(encoding_cache, hooks, workers)
+
+    if slvr is None:
+        slvr = solver.make_solver()
+
+    # A component stays put iff the variable for its previous position is
+    # true.
+    stay_ids = [ids[idx]
+                   for ids, idx in zip(encoding.comp_pos,
+                                       _previous_positions(previous, problem))
+                   if idx is not None]
+    move_lits = [-var_id for var_id in stay_ids]
+    if max_moves is None or max_moves > len(move_lits):
+        max_moves = len(move_lits)
+
+    # Count the moved components once. Each level then differs from the last
+    # only in the unit clauses on the counter's outputs which fix the count,
+    # so every level is enumerated from the same clauses, and restricting a
+    # level to placements with exactly `k` moves needs no blocking clauses.
+    #
+    # The moves counter is exact, but the encoding's own limits (eg. on
+    # drilled holes) may still give one placement several solutions, so
+    # placements already yielded in a level are skipped.
+    counter_clauses, outputs, _ = _counter_ids(
+                       move_lits, max_moves + 1, encoding.num_vars + 1,
+                       exact=True)
+    for k in range(max_moves + 1):
+        bound_clauses = []
+        if k > 0:
+            bound_clauses.append([outputs[k - 1]])
+        if k < len(outputs):
+            bound_clauses.append([-outputs[k]])
+        seen = set()
+        for sol in _solve(encoding, slvr, counter_clauses + bound_clauses,
+                          hooks):
+            key = (tuple(sol[0]),) + sol[1:]
+            if key not in seen:
+                seen.add(key)
+                yield problem.make_placement(sol)
+
+def _sub_problem_clauses(problem, encoding, sub_problem):
+    """
+    Make unit clauses which restrict an encoded problem to a smaller problem.
+
+    The smaller problem must have the same components, nets and limits, on a
+    board contained in the larger problem's board. The extra holes of the
+    larger board must only be connected to the smaller board by dead ends, so
+    that they cannot form a conductive path between two of the smaller board's
+    holes. Each position and jumper of the smaller problem must also be
+    allowed in the larger problem.
+
+    Returns:
+        A list of clauses, or None if the conditions above are not met.
+
+    """
+    board, sub_board = problem.board, sub_problem.board
+    if not (sub_board.holes <= board.holes and
+            sub_board.spaces <= board.spaces):
+        return None
+    if sub_board.traces != {t for t in board.traces
+                                   if t[0] in sub_board.holes and
+                                      t[1] in sub_board.holes}:
+        return None
+
+    # Group the extra holes into connected pieces, and check that each piece
+    # is joined to the smaller board by at most one trace.
+    piece = {h: h for h in board.holes - sub_board.holes}
+    def find(h):
+        while piece[h] != h:
+            piece[h] = piece[piece[h]]
+            h = piece[h]
+        return h
+    crossings = []
+    for h1, h2 in board.traces:
+        if h1 in piece and h2 in piece:
+            piece[find(h1)] = find(h2)
+        elif h1 in piece or h2 in piece:
+            crossings.append(h1 if h1 in piece else h2)
+    if max(collections.Counter(find(h) for h in crossings).values(),
+           default=0) > 1:
+        return None
+
+    clauses = []
+    for comp, ids in zip(problem.components, encoding.comp_pos):
+        sub_keys = {position_key(comp, pos)
+                                       for pos in sub_problem.positions[comp]}
+        keys = [position_key(comp, pos) for pos in problem.positions[comp]]
+        if not sub_keys <= set(keys):
+            return None
+        clauses.extend([-var_id] for key, var_id in zip(keys, ids)
+                                           if key not in sub_keys)
+
+    sub_jumpers = {(j.h1, j.h2) for j in sub_problem.jumpers}
+    if not sub_jumpers <= {(j.h1, j.h2) for j in problem.jumpers}:
+        return None
+    clauses.extend([-var_id]
+                      for j, var_id in zip(problem.jumpers, encoding.jumpers)
+                      if (j.h1, j.h2) not in sub_jumpers)
+
+    clauses.extend([-var_id]
+                      for h, var_id in zip(problem.holes, encoding.drilled)
+                      if h not in sub_board.holes)
+
+    return clauses
+
+def place_smallest(components, nets, max_size, *,
+                   order='area', make_board=component.StripBoard,
+                   max_jumper_length=0, max_drilled=None, max_jumpers=None,
+                   pins=None, keep_out=None, component_keep_out=None,
+                   slvr=None, encoding_cache=None, workers=1, hooks=None):
+    """
+    Find the smallest board on which components can be placed.
+
+    Board sizes up to `max_size` are tried in turn. Sizes which fail the tests
+    described in `check` are skipped without being encoded. The board of size
+    `max_size` is encoded once, and smaller sizes are solved by disabling the
+    positions, jumpers and holes which lie outside of them. Where the boards
+    made by `make_board` do not allow this, the smaller board is encoded
+    separately.
+
+    components: Iterable of components to place.
+    nets: Iterable of nets.
+    max_size: Pair `(width, height)` giving the largest board size to try.
+    order: Either 'area', to try sizes in order of increasing area, or
+        'rows', to try sizes in order of increasing height and then width.
+    make_board: Callable which returns a board, given its size.
+
+    The remaining arguments are as for `place`.
+
+    Raises:
+        Infeasible: If there is no placement on any board up to `max_size`.
+
+    Returns:
+        A tuple `(size, placement)`, where `size` is the first size tried which
+        has a placement, and `placement` is one such placement.
+
+    """
+    components = list(components)
     nets = [list(net) for net in nets]
+
+    if hooks is None:
+        hooks = instrument.Hooks()
+    if slvr is None:
+        slvr = solver.make_solver()
+
+    if order == 'area':
+        sort_key = lambda size: (size[0] * size[1], size[1], size[0])
+    elif order == 'rows':
+        sort_key = lambda size: (size[1], size[0])
+    else:
+        raise ValueError("Unknown size order {!r}".format(order))
+    sizes = sorted(itertools.product(range(1, max_size[0] + 1),
+                                     range(1, max_size[1] + 1)),
+                   key=sort_key)
+
+    def prepare(size):
+        return _prepare(make_board(size), components, nets,
+                        max_jumper_length=max_jumper_length,
+                        max_drilled=max_drilled, max_jumpers=max_jumpers,
+                        pins=pins, keep_out=keep_out,
+                        component_keep_out=component_keep_out, hooks=hooks)
+
+    largest = largest_encoding = None
+    for size in sizes:
+        try:
+            problem = prepare(size)
+        except Infeasible:
+            hooks.count("sizes_ruled_out")
+            continue
+        hooks.count("sizes_solved")
+
+        if largest is None:
+            largest = prepare(max_size)
+            largest_encoding = largest.encode(encoding_cache, hooks,
+                                              workers)
+
+        clauses = _sub_problem_clauses(largest, largest_encoding, problem)
+        if clauses is None:
+            sol = next(_solve(problem.encode(encoding_cache, hooks,
+                                             workers),
+                              slvr, hooks=hooks),
+                       None)
+            if sol is not None:
+                return size, problem.make_placement(sol)
+            continue
+
+        with hooks.phase("solve"):
+            try:
+                sol = slvr.solve(largest_encoding.clauses + clauses)
+            except solver.Unsatisfiable:
+                continue
+        with hooks.phase("decode"):
+            decoded = _decode(largest_encoding, sol)
+        hooks.count("solutions")
+        placement = largest.make_placement(decoded)
+        return size, Placement(problem.placement_board, dict(placement),
+                               placement.drilled_holes, placement.jumpers)
+
+    raise Infeasible("there is no placement on a board of size {}x{} or "
+                     "smaller".format(*max_size))
+
+class SweepPoint(collections.namedtuple('_SweepPointBase',
+                                        ('max_jumper_length', 'max_drilled',
+                                         'max_jumpers', 'placement'))):
+    """
+    The outcome at one point of a `sweep`.
+
+    Attributes:
+        max_jumper_length: Maximum jumper length at this point.
+        max_drilled: Maximum number of drilled holes at this point.
+        max_jumpers: Maximum number of jumpers at this point.
+        placement: A placement within these limits, or None if there is none.
+
+    """
+
+    @property
+    def feasible(self):
+        return self.placement is not None
+
+    @property
+    def limits(self):
+        return self.max_jumper_length, self.max_drilled, self.max_jumpers
+
+# Clauses and encoding solved by a sweep worker process, and its solver.
+_sweep_state = None
+
+def _sweep_init(encoding, counter_clauses, slvr):
+    global _sweep_state
+    _sweep_state = encoding.clauses + counter_clauses, encoding, slvr
+
+def _sweep_solve(limit_clauses, state=None):
+    clauses, encoding, slvr = state if state is not None else _sweep_state
+    try:
+        sol = slvr.solve(clauses + limit_clauses)
+    except solver.Unsatisfiable:
+        return None
+    return _decode(encoding, sol)
+
+class _InProcessExecutor():
+    """
+    Runs each call when it is submitted, in this process.
+
+    Stands in for the `concurrent.futures.Executor` used by `sweep` when
+    worker processes can't be forked.
+
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+def sweep(board, components, nets, *,
+          drilled=(0,), jumpers=(0,), jumper_lengths=(0,),
+          pins=None, keep_out=None, component_keep_out=None,
+          slvr=None, encoding_cache=None, workers=None, hooks=None):
+    """
+    Find which combinations of limits on the number of drilled holes, the
+    number of jumpers and the jumper length allow a placement.
+
+    Each combination of values from `drilled`, `jumpers` and `jumper_lengths`
+    is a point of the sweep. The problem is encoded once for each jumper
+    length, without limits on the number of drilled holes or jumpers, along
+    with counters of the drilled holes and jumpers. The limits at each point
+    are then imposed by a unit clause on each counter's outputs, and points
+    are solved in parallel by a pool of worker processes. Points are solved
+    one at a time in this process if `workers` is 1, or if this process can't
+    be forked (eg. because other threads are running).
+
+    Points are only solved if their outcome does not follow from others: if
+    there is no placement at a point there is none at any point with lower
+    limits, and a placement found at one point is within the limits of every
+    point with limits at least as high as its counts. Points ruled out by the
+    bounds found by `check` are not solved either.
+
+    drilled: Iterable of values of `max_drilled` to try.
+    jumpers: Iterable of values of `max_jumpers` to try.
+    jumper_lengths: Iterable of values of `max_jumper_length` to try.
+    workers: Number of worker processes, used to build each encoding and to
+        solve points. Defaults to the number of CPUs.
+
+    The remaining arguments are as for `place`.
+
+    Returns:
+        A list of `SweepPoint`s, one for each point, in order of jumper
+        length, number of drilled holes and then number of jumpers.
+
+    """
     components = list(components)
+    nets = [list(net) for net in nets]
+    drilled = sorted(set(drilled))
+    jumpers = sorted(set(jumpers))
+    jumper_lengths = sorted(set(jumper_lengths))
+
+    if hooks is None:
+        hooks = instrument.Hooks()
+    if slvr is None:
+        slvr = solver.make_solver()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Placements found so far, each with the jumper length, number of drilled
+    # holes and number of jumpers it uses, and points with no placement.
+    witnesses = []
+    infeasible = []
+
+    def outcome(point):
+        # Return `(decided, placement)` for a point, based on the results so
+        # far.
+        for limits, placement in witnesses:
+            if all(a <= b for a, b in zip(limits, point)):
+                return True, placement
+        for limits in infeasible:
+            if all(a <= b for a, b in zip(point, limits)):
+                return True, None
+        return False, None
+
+    for length in jumper_lengths:
+        points = [(length, d, j) for d in drilled for j in jumpers]
+        hooks.count("sweep_points", len(points))
+
+        try:
+            problem = _prepare(board, components, nets,
+                               max_jumper_length=length,
+                               max_drilled=None, max_jumpers=None,
+                               pins=pins, keep_out=keep_out,
+                               component_keep_out=component_keep_out,
+                               hooks=hooks)
+        except Infeasible:
+            infeasible.append((length, drilled[-1], jumpers[-1]))
+            continue
+
+        for point in points:
+            _, d, j = point
+            if (d < problem.bounds.min_drilled or
+                    j < problem.bounds.min_jumpers):
+                infeasible.append(point)
+
+        undecided = [p for p in points if not outcome(p)[0]]
+        if not undecided:
+            continue
+
+        encoding = problem.encode(encoding_cache, hooks, workers)
+        next_id = encoding.num_vars + 1
+        drilled_clauses, drilled_outputs, next_id = _counter_ids(
+                                  list(encoding.drilled), drilled[-1] + 1,
+                                  next_id)
+        jumper_clauses, jumper_outputs, next_id = _counter_ids(
+                                  list(encoding.jumpers), jumpers[-1] + 1,
+                                  next_id)
+
+        def limit_clauses(point):
+            _, d, j = point
+            clauses = []
+            if d < len(drilled_outputs):
+                clauses.append([-drilled_outputs[d]])
+            if j < len(jumper_outputs):
+                clauses.append([-jumper_outputs[j]])
+            return clauses
+
+        if workers > 1 and _can_fork():
+            # The encoding is passed to each worker once, rather than with
+            # each point.
+            executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_sweep_init,
+                    initargs=(encoding, drilled_clauses + jumper_clauses,
+                              slvr))
+            state = None
+            in_flight = workers
+        else:
+            executor = _InProcessExecutor()
+            state = (encoding.clauses + drilled_clauses + jumper_clauses,
+                     encoding, slvr)
+            in_flight = 1
+
+        with executor:
+            running = {}
+            while undecided or running:
+                # Only keep as many points in flight as there are workers, so
+                # that each point submitted benefits from all results so far.
+                # Pick the point whose outcome decides the most other points
+                # in the worst case, as in a binary search.
+                undecided = [p for p in undecided if not outcome(p)[0]]
+                while undecided and len(running) < in_flight:
+                    point = max(undecided, key=lambda p: min(
+                        sum(all(a <= b for a, b in zip(q, p))
+                                                        for q in undecided),
+                        sum(all(a >= b for a, b in zip(q, p))
+                                                        for q in undecided)))
+                    undecided.remove(point)
+                    future = executor.submit(_sweep_solve,
+                                             limit_clauses(point), state)
+                    running[future] = point
+                if not running:
+                    break
+
+                with hooks.phase("solve"):
+                    done, _ = concurrent.futures.wait(
+                               running,
+                               return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    point = running.pop(future)
+                    decoded = future.result()
+                    hooks.count("sweep_solved")
+                    if decoded is None:
+                        infeasible.append(point)
+                        continue
+                    placement = problem.make_placement(decoded)
+                    used_length = max((h2[0] - h1[0] + h2[1] - h1[1]
+                                           for h1, h2 in placement.jumpers),
+                                      default=0)
+                    witnesses.append(((used_length,
+                                       len(placement.drilled_holes),
+                                       len(placement.jumpers)),
+                                      placement))
+
+    return [SweepPoint(length, d, j, outcome((length, d, j))[1])
+                for length in jumper_lengths
+                for d in drilled
+                for j in jumpers]
+
+def pareto_front(points):
+    """
+    Select the feasible points of a sweep which are not dominated.
 
-    # Position objects that represent the same position may have different
-    # hashes (their hash function is the default id based implementation).
-    # 
-    # Allow the positions to be hashed correctly by using only one Position for
-    # each component position within this function.
-    positions = {c: list(c.get_positions(board)) for c in components}
+    A point is dominated if another feasible point has limits that are no
+    higher, and at least one limit that is lower.
+
+    Returns:
+        A list of `SweepPoint`s, in the order they appear in `points`.
+
+    """
+    feasible = [p for p in points if p.feasible]
+    return [p for p in feasible
+              if not any(q.limits != p.limits and
+                         all(a <= b for a, b in zip(q.limits, p.limits))
+                              for q in feasible)]
+
+# Metrics by which placements are ranked, in the order of `Quality`'s fields.
+QUALITY_METRICS = ('lead_length', 'area', 'drilled', 'jumpers',
+                   'net_length')
+
+class Quality(collections.namedtuple('_QualityBase', QUALITY_METRICS)):
+    """
+    Measures of how good a placement is. Lower is better for each.
+
+    Attributes:
+        lead_length: Sum over the components of the Manhattan distance spanned
+            by the component's terminals.
+        area: Area of the bounding box of the cells occupied by components,
+            and the holes joined by jumpers.
+        drilled: Number of drilled holes.
+        jumpers: Number of jumpers.
+        net_length: Sum over the nets of the Manhattan distance spanned by the
+            net's terminals (the half-perimeter of their bounding box).
+
+    """
 
-    def physical_constraints():
+    def cost(self, weights=None):
         """
-        Produce a CNF expression to enforce physical constraints.
+        Combine the metrics into a single cost.
 
-        Ie. There must not be multiple components that occupy a given space.
+        weights: Optional dict mapping metric names to weights. Metrics which
+            are not given a weight have a weight of 1.
+
+        Raises:
+            ValueError: If a weight is given for a name which isn't in
+                `QUALITY_METRICS`.
 
         """
+        if weights is None:
+            return sum(self)
+        _check_weights(weights)
+        return sum(weights.get(name, 1) * value
+                       for name, value in zip(self._fields, self))
+
+def _check_weights(weights):
+    unknown = set(weights) - set(QUALITY_METRICS)
+    if unknown:
+        raise ValueError("Unknown metrics {}; choose from {}".format(
+                             ", ".join(sorted(map(repr, unknown))),
+                             ", ".join(QUALITY_METRICS)))
+
+class Ranked(collections.namedtuple('_RankedBase',
+                                    ('cost', 'quality', 'placement'))):
+    """
+    A placement chosen by `rank` or `place_best`, along with its `Quality`
+    and cost.
 
-        # Make internal variables to determine whether a given component is in
-        # a particular space.
-        occ = {(c, s): wff.Var("{} occ {}".format(c, s))
-               for s in board.spaces for c in components}
-
-        # Generate constraints to enforce the definition of `occ`. occ[s, c] is
-        # true iff there is a position `p` for `c` which covers `s` such that
-        # comp_pos[c, p] is true. The first line handles the forward
-        # implication, and the second the converse.
-        positions_which_occupy = {(c, s): [p for p in positions[c]
-                                                            if s in p.occupies]
-                                  for c in components
-                                  for s in board.spaces}
-        occ_constraints = wff.to_cnf(
-                wff.for_all(occ[c, s].iff(wff.exists(comp_pos[c, p]
-                                        for p in positions_which_occupy[c, s]))
-                    for c in components
-                    for s in board.spaces))
+    """
+    pass
+
+def _span(points):
+    xs = [x for x, y in points]
+    ys = [y for x, y in points]
+    return max(xs) - min(xs) + max(ys) - min(ys)
+
+def _position_record(comp, pos):
+    """
+    Measure a position of a component.
 
-        # Enforce that at most one component/jumper can occupy a space.
-        jumpers_that_occupy_space = {s:
-                                       [j for j in jumpers if s in j.occupies]
-                                     for s in board.spaces}
+    Returns:
+        A tuple `(lead_length, min_x, min_y, max_x, max_y, holes)`, where the
+        middle elements give the bounding box of the cells the position
+        occupies, and `holes` is a tuple of the hole of each terminal, in the
+        order of `comp.terminals`.
+
+    """
+    holes = tuple(pos.terminal_positions[t] for t in comp.terminals)
+    xs = [x for x, y in pos.occupies]
+    ys = [y for x, y in pos.occupies]
+    return (_span(holes), min(xs), min(ys), max(xs), max(ys), holes)
+
+def _quality(records, net_refs, num_drilled, jumper_holes):
+    """
+    Measure a placement, given the `_position_record` of each component.
+
+    net_refs: For each net, a list of `(record index, terminal index)` pairs.
+    jumper_holes: List of `(h1, h2)` pairs, one for each jumper.
+
+    """
+    corners = [(r[1], r[2]) for r in records]
+    corners.extend((r[3], r[4]) for r in records)
+    corners.extend(itertools.chain.from_iterable(jumper_holes))
+    if corners:
+        xs = [x for x, y in corners]
+        ys = [y for x, y in corners]
+        area = (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+    else:
+        area = 0
+
+    return Quality(
+        lead_length=sum(r[0] for r in records),
+        area=area,
+        drilled=num_drilled,
+        jumpers=len(jumper_holes),
+        net_length=sum(_span([records[i][5][t] for i, t in refs])
+                           for refs in net_refs if refs))
+
+def _net_refs(components, nets):
+    comp_idx = {comp: i for i, comp in enumerate(components)}
+    return [[(comp_idx[t.component], t.component.terminals.index(t))
+                 for t in net]
+                for net in nets]
+
+class _QualityTable():
+    """
+    Measures placements of a prepared problem from their decoded solutions.
 
-        one_component_per_space = cnf.Expr.all(
-                 cnf.at_most_one(
-                            {occ[c, s] for c in components} |
-                            {j.pres_var for j in jumpers_that_occupy_space[s]})
-                    for s in board.spaces)
+    Each position of each component is measured up front, so that measuring a
+    placement only looks up the records at its position indices, rather than
+    building the placement's mapping and positions.
 
-        # Return all of the above.
-        return occ_constraints | one_component_per_space
+    """
 
-    def continuity_constraints():
+    def __init__(self, components, positions, nets, jumpers):
+        self._records = [[_position_record(comp, pos)
+                              for pos in positions[comp]]
+                             for comp in components]
+        self._net_refs = _net_refs(components, nets)
+        self._jumper_holes = [(j.h1, j.h2) for j in jumpers]
+
+        # Lower bounds on the lead length and area of any placement, for
+        # `place_best`.
+        self.min_lead_length = sum(min(r[0] for r in recs)
+                                       for recs in self._records)
+        self.min_area = max((min((r[3] - r[1] + 1) * (r[4] - r[2] + 1)
+                                     for r in recs)
+                                 for recs in self._records), default=0)
+
+    def position_costs(self, weights):
         """
-        Produce a CNF expression to enforce electrical continuity constraints.
+        Find how much each position adds to the lowest possible cost of a
+        placement, from its lead length and area.
 
-        Ie. continuity between terminals that are in a common net, and
-        discontinuity between terminals that are in different nets.
+        Returns:
+            For each component, a list of the cost added by each position.
 
         """
-        # Produce a dict which maps a terminal `t` and a hole `h` to a list of
-        # positions of t.component which have `t` in `h`. Used a couple of
-        # times in this function.
-        positions_which_have_term_in = {
-            (t, h): [p for p in positions[c] if p.terminal_positions[t] == h]
-                    for c in components
-                    for t in c.terminals
-                    for h in board.holes}
-
-        # Produce an adjacency dict for the electrical continuity graph implied
-        # by links. Include the variable that must be true for said neighbour
-        # to be present.
-        neighbours = {h: [(l.get_other(h), l.pres_var) 
-                             for l in links if h in l.holes]
-                         for h in board.holes} 
-
-        # Make internal variables to indicate whether a hole is connected to a
-        # particular terminal. Defined for all holes, and the first terminal in
-        # each net. (This is sufficient for validating (dis)continuity
-        # constraints.
-        term_conn = {(n[0], h): wff.Var("{} conn {}".format(n[0], h))
-                        for n in nets
-                        for h in board.holes}
-
-        # Also make internal variables to indicate the minimum distance of each
-        # hole to the nearest terminal. term_dist[h, i] is true iff there is no
-        # path of length `i` or less from hole `h` to a head terminal. (A head
-        # terminal is a terminal that is at the start of its net.)
-        #
-        # In other words, term_dist[h, *] is a unary encoding of the distance
-        # to the nearest head terminal. Holes which are not connected to a
-        # terminal will take the maximum value len(board.holes). Conversely,
-        # holes which are connected will take a value < len(board.holes).
-        term_dist = {(h, i): wff.Var("{} dist {}".format(h, i))
-                        for h in board.holes
-                        for i in range(len(board.holes))}
-
-        # Generate constraints to enforce the definition of `term_conn`. A hole
-        # is connected to a particular terminal iff one of its neighbours is
-        # connected to the terminal or the terminal is in this hole. The first
-        # expression handles the forward implication, whereas the second
-        # expression handles the converse.
-        term_conn_constraints = wff.to_cnf(
-            wff.for_all(
-                    term_conn[net[0], h].iff(
-                        wff.exists(
-                                  wff.add_var(term_conn[net[0], n] & link_pres)
-                                           for n, link_pres in neighbours[h]) |
-                        wff.exists(comp_pos[net[0].component, p]
-                             for p in positions_which_have_term_in[net[0], h]))
-                    for net in nets
-                    for h in board.holes))
-        if _DEBUG:
-            print("Term conn constraints: {}".format(
-                      term_conn_constraints.stats))
-
-        # Add constraints to enforce the definition of `term_dist[h, 0]`, for
-        # all holes `h`. term_hist[h, 0] is false iff a component is positioned
-        # such that a head terminal is in hole `h`. The first statement
-        # expresses the forward implication, and the second statement expresses
-        # the converse.
-        zero_term_dist_constraints = wff.to_cnf(
-                wff.for_all(
-                    (~term_dist[h, 0]).iff(
-                        wff.exists(comp_pos[net[0].component, p]
-                             for net in nets
-                             for p in positions_which_have_term_in[net[0], h]))
-                    for h in board.holes))
-        if _DEBUG:
-            print("Zero term dist constraints: {}".format(
-                      zero_term_dist_constraints.stats))
-
-        # Add constraints to enforce the definition of `term_dist[h, i]`, for
-        # 0 < 1 < |holes|. term_dist[h, i] is true iff for each neighbour `n`
-        # term_dist[n, i - 1] is true. The first statement expresses the
-        # forward implication, and the second statement expresses the converse.
-        non_zero_term_dist_constraints = wff.to_cnf(
-                wff.for_all(
-                    term_dist[h, i].iff(
-                        wff.for_all(
-                            wff.add_var(term_dist[n, i - 1] | ~link_pres)
-                                           for n, link_pres in neighbours[h]) &
-                        term_dist[h, i - 1])
-                    for h in board.holes
-                    for i in range(1, len(board.holes))))
-        if _DEBUG:
-            print("Non-zero term dist contraints: {}".format(
-                      non_zero_term_dist_constraints.stats))
-
-        # Add constraints which ensure any terminals are connected to the
-        # terminal that's at the head of its net.
-        def term_to_net(t):
-            l = [net for net in nets if t in net]
-            assert len(l) == 1, "Terminal is not in exactly one net"
-            return l[0]
-        head_term = {t: term_to_net(t)[0]
-                            for c in components
-                            for t in c.terminals}
-        net_continuity_constraints = wff.to_cnf(
-            wff.for_all(comp_pos[c, p] >> term_conn[head_term[t], h]
-                                  for h in board.holes
-                                  for c in components
-                                  for t in c.terminals
-                                  for p in positions_which_have_term_in[t, h]))
-        if _DEBUG:
-            print("Net continuity constraints: {}".format(
-                      net_continuity_constraints.stats))
-
-        # Add constraints which ensure that no hole is part of more than one
-        # net, and if its disconnected from all nets, then it can be part of no
-        # net.
-        net_discontinuity_constraints = cnf.Expr.all(
-                          cnf.at_most_one(
-                              {term_conn[net[0], h] for net in nets} |
-                              {term_dist[h, len(board.holes) - 1]})
-                    for h in board.holes)
-        if _DEBUG:
-            print("Net discontinuity constraints: {}".format(
-                      net_discontinuity_constraints.stats))
-
-        # Return all of the above.
-        return (term_conn_constraints |
-                zero_term_dist_constraints |
-                non_zero_term_dist_constraints |
-                net_discontinuity_constraints |
-                net_continuity_constraints)
-
-    # Make variables to indicate whether a component is in a particular
-    # position. Assignments for these variables will be used to produce
-    # placements.
-    comp_pos = {(comp, pos): wff.Var("comp {} in pos {}".format(comp, pos))
-                    for comp in components
-                    for pos in positions[comp]}
-
-    # Constrain the `comp_pos` variables such that a component must be in
-    # exactly one position.
-    one_pos_per_comp = cnf.Expr.all(cnf.exactly_one(comp_pos[comp, pos]
-                                               for pos in positions[comp])
-                                    for comp in components)
-
-    # Make jumpers, and their associated links.
-    if max_jumpers == 0:
-        max_jumper_length = 0
-    jumpers = [j for j in _Jumper.gen_jumpers(board, max_jumper_length)]
-    jumper_links = [_Link(j.h1, j.h2, j.pres_var) for j in jumpers]
+        w_lead = weights.get('lead_length', 1)
+        w_area = weights.get('area', 1)
+        costs = []
+        for recs in self._records:
+            min_lead = min(r[0] for r in recs)
+            costs.append([w_lead * (r[0] - min_lead) +
+                          w_area * max(0, (r[3] - r[1] + 1) *
+                                          (r[4] - r[2] + 1) - self.min_area)
+                              for r in recs])
+        return costs
+
+    def quality(self, sol):
+        pos_idxs, drilled_mask, jumper_mask = sol
+        records = list(map(list.__getitem__, self._records, pos_idxs))
+        return _quality(records, self._net_refs, bin(drilled_mask).count("1"),
+                        [self._jumper_holes[i] for i in _bits(jumper_mask)])
+
+def quality(placement, nets):
+    """
+    Measure the `Quality` of a placement.
 
-    # Make links for each trace.
-    trace_links = [_Link(h1, h2, wff.Var("trace {} link".format((h1, h2))))
-                                                    for h1, h2 in board.traces]
+    nets: The nets of the problem which was placed.
 
-    # Make variables to indicate holes which have been drilled out.
-    drilled = {h: wff.Var("{} drilled".format(h)) for h in board.holes}
+    """
+    if placement._problem is not None:
+        return placement._problem.get_quality_table().quality(
+                                                             placement._sol)
+    components = list(placement)
+    records = [_position_record(comp, placement[comp])
+                   for comp in components]
+    return _quality(records, _net_refs(components, nets),
+                    len(placement.drilled_holes), list(placement.jumpers))
+
+def _placement_key(placement):
+    if placement._problem is not None:
+        return placement._sol
+    return (frozenset((comp, frozenset(pos.terminal_positions.items()))
+                          for comp, pos in placement.items()),
+            frozenset(placement.drilled_holes), frozenset(placement.jumpers))
+
+class _TopK():
+    """
+    The `k` lowest cost placements seen so far.
 
-    # Add a constraint to enforce the following: A trace link is present iff
-    # neither of the holes it is connected to are drilled.
-    drilled_link_constraints = wff.to_cnf(
-        wff.for_all(l.pres_var.iff(~drilled[l.h1] & ~drilled[l.h2])
-                                                         for l in trace_links))
+    Placements of equal cost are ranked in the order they were seen. A
+    placement which is already kept is not kept again. A repeat of one which
+    has been dropped costs too much to be kept anyway, so only the keys of
+    the placements kept need to be remembered.
 
-    links = jumper_links + trace_links
+    """
 
-    # Enforce cardinality constraints on drilled holes.
-    if max_drilled == 0:
-        drilled_link_constraints |= wff.to_cnf(
-                                wff.for_all(~drilled[h] for h in board.holes))
-    elif max_drilled is not None:
-        drilled_link_constraints |= _at_most(
-                                            [drilled[h] for h in board.holes],
-                                            max_drilled,
-                                            var_prefix="max drilled")
+    def __init__(self, k):
+        self.k = k
+        # Max-heap of `(-cost, -seq, key, Ranked)` entries, so the worst
+        # placement kept is at the top.
+        self._heap = []
+        self._keys = set()
+        self._seq = 0
 
-    # Enforce cardinality constraints on jumpers.
-    if max_jumpers is not None and max_jumpers > 0 and len(jumpers) > 1:
-        drilled_link_constraints |= _at_most([j.pres_var for j in jumpers],
-                                             max_jumpers,
-                                             var_prefix="max jumper")
-
-    # Combine all the constraints into a single expression.
-    expr = (one_pos_per_comp | 
-            drilled_link_constraints |
-            physical_constraints() |
-            continuity_constraints())
-
-    if _DEBUG:
-        print(expr.stats)
-        print("Solving!")
-
-    # Find solutions and map each one back to a Placement.
-    for sol in cnf.solve(expr, slvr=slvr):
-        if _DEBUG:
-            print("Done")
-            for var, val in sol.items():
-                print("{} {}".format("~" if not val else " ", var))
-        mapping = {comp: pos
-                     for (comp, pos), var in comp_pos.items() if sol[var]}
-        drilled_holes = {h for h in board.holes if sol[drilled[h]]}
-        jumpers = {(l.h1, l.h2) for l in jumper_links if sol[l.pres_var]}
-
-        # If this fails the "exactly one position" constraint has been
-        # violated.
-        assert len(mapping) == len(components)
-        yield Placement(board, mapping, drilled_holes, jumpers)
+    @property
+    def full(self):
+        return len(self._heap) >= self.k
+
+    @property
+    def worst_cost(self):
+        return -self._heap[0][0]
+
+    def push(self, ranked):
+        key = _placement_key(ranked.placement)
+        if key in self._keys:
+            return
+        self._seq += 1
+        entry = (-ranked.cost, -self._seq, key, ranked)
+        if not self.full:
+            heapq.heappush(self._heap, entry)
+        elif self._heap and ranked.cost < self.worst_cost:
+            self._keys.remove(heapq.heapreplace(self._heap, entry)[2])
+        else:
+            return
+        self._keys.add(key)
 
+    def best(self):
+        return [entry[3] for entry in sorted(self._heap, key=lambda e: e[:2],
+                                             reverse=True)]
 
+def rank(placements, nets, k, *, weights=None, hooks=None):
+    """
+    Select the `k` best placements from a stream of placements.
+
+    placements: Iterable of placements, such as that returned by `place`.
+        It is consumed entirely, but only `k` placements are kept at a time.
+    nets: The nets of the problem which was placed.
+    k: Number of placements to return.
+    weights: Optional dict mapping names in `QUALITY_METRICS` to weights, as
+        for `Quality.cost`.
+    hooks: Optional `instrument.Hooks`.
+
+    Raises:
+        ValueError: If a weight is given for an unknown metric.
+
+    Returns:
+        A list of up to `k` `Ranked` placements, lowest cost first.
+
+    """
+    if weights is not None:
+        _check_weights(weights)
+    if hooks is None:
+        hooks = instrument.Hooks()
+    nets = [list(net) for net in nets]
+
+    top = _TopK(k)
+    for placement in placements:
+        with hooks.phase("rank"):
+            q = quality(placement, nets)
+            top.push(Ranked(q.cost(weights), q, placement))
+    return top.best()
+
+def _cost_bound_clauses(budget, weights, drilled_outputs, jumper_outputs):
+    """
+    Make clauses which rule out placements whose cost from drilled holes and
+    jumpers alone is at least `budget`.
+
+    drilled_outputs, jumper_outputs: Outputs of counters over the drilled
+        hole and jumper variables, as returned by `_counter_ids`.
+
+    """
+    w_drilled = weights.get('drilled', 1)
+    w_jumpers = weights.get('jumpers', 1)
+
+    clauses = []
+    for d in range(len(drilled_outputs) + 1):
+        rest = budget - w_drilled * d
+        at_least_d = [-drilled_outputs[d - 1]] if d > 0 else []
+        if rest <= 0:
+            clauses.append(at_least_d)
+            break
+        if w_jumpers > 0:
+            j = math.ceil(rest / w_jumpers)
+            if j <= len(jumper_outputs):
+                clauses.append(at_least_d + [-jumper_outputs[j - 1]])
+    return clauses
+
+def _budget_counter(ids, budget, weight, first_id):
+    # Count the true variables in `ids`, as far as is needed to tell whether
+    # they cost at least `budget`.
+    limit = math.ceil(budget / weight) if weight > 0 else 0
+    return _counter_ids(list(ids), limit, first_id, exact=True)
+
+def place_best(board, components, nets, k, *, weights=None, prune=False,
+               allow_drilled=False, max_jumper_length=0,
+               max_drilled=None, max_jumpers=None,
+               pins=None, keep_out=None, component_keep_out=None,
+               slvr=None, encoding_cache=None, workers=1, hooks=None):
+    """
+    Find the `k` best placements, by the cost described in `Quality`.
+
+    k: Number of placements to return.
+    weights: Optional dict mapping names in `QUALITY_METRICS` to weights, as
+        for `Quality.cost`. With `prune`, weights must not be negative.
+    prune: If set, once `k` placements have been found the solver is told to
+        skip positions, and numbers of drilled holes and jumpers, which cost
+        too much to beat the worst of them, given lower bounds on the other
+        metrics. The solver is restarted each time the bounds tighten.
+
+    The remaining arguments are as for `place`.
+
+    Raises:
+        Infeasible: If cheap tests show that there are no solutions.
+        ValueError: If a weight is given for an unknown metric.
+
+    Returns:
+        A list of up to `k` `Ranked` placements, lowest cost first.
+
+    """
+    if weights is not None:
+        _check_weights(weights)
+    if not prune:
+        return rank(place(board, components, nets,
+                          allow_drilled=allow_drilled,
+                          max_jumper_length=max_jumper_length,
+                          max_drilled=max_drilled, max_jumpers=max_jumpers,
+                          pins=pins, keep_out=keep_out,
+                          component_keep_out=component_keep_out,
+                          slvr=slvr, encoding_cache=encoding_cache,
+                          workers=workers, hooks=hooks),
+                    nets, k, weights=weights, hooks=hooks)
+
+    weights = dict(weights or {})
+    if k < 1:
+        return []
+    if any(w < 0 for w in weights.values()):
+        raise ValueError("Weights must not be negative when pruning")
+    if hooks is None:
+        hooks = instrument.Hooks()
+    if slvr is None:
+        slvr = solver.make_solver()
+
+    problem = _prepare(board, components, nets,
+                       max_jumper_length=max_jumper_length,
+                       max_drilled=max_drilled, max_jumpers=max_jumpers,
+                       pins=pins, keep_out=keep_out,
+                       component_keep_out=component_keep_out, hooks=hooks)
+    encoding = problem.encode(encoding_cache, hooks, workers)
+    table = problem.get_quality_table()
+
+    # The drilled holes and jumpers of a placement cost no less than the
+    # placement's cost, less the lowest possible cost of its other metrics.
+    other_cost = (weights.get('lead_length', 1) * table.min_lead_length +
+                  weights.get('area', 1) * table.min_area)
+
+    # Each position of a component adds to that cost, by at least as much as
+    # it exceeds the component's cheapest position.
+    position_costs = [(var_id, cost)
+                          for ids, costs in zip(encoding.comp_pos,
+                                                table.position_costs(weights))
+                          for var_id, cost in zip(ids, costs)
+                          if cost > 0]
+
+    # Solutions are enumerated until a placement which tightens the bounds is
+    # found, and then enumeration restarts with the new bounds, excluding the
+    # placements found so far.
+    top = _TopK(k)
+    found = set()
+    blocking_clauses = []
+    counter_clauses = []
+    bound_clauses = []
+    restart = True
+    while restart:
+        restart = False
+        for sol in _solve(encoding, slvr,
+                          counter_clauses + bound_clauses + blocking_clauses,
+                          hooks):
+            if sol in found:
+                continue
+            found.add(sol)
+            blocking_clauses.append(_blocking_clause(encoding, sol))
+
+            with hooks.phase("rank"):
+                q = table.quality(sol)
+                top.push(Ranked(q.cost(weights), q,
+                                problem.make_placement(sol)))
+            if not top.full:
+                continue
+
+            budget = top.worst_cost - other_cost
+            if budget <= 0:
+                return top.best()
+            if not counter_clauses:
+                # The budget only falls from here on, so the counters need
+                # only count as far as the first budget allows.
+                drilled_clauses, drilled_outputs, next_id = _budget_counter(
+                                       encoding.drilled, budget,
+                                       weights.get('drilled', 1),
+                                       encoding.num_vars + 1)
+                jumper_clauses, jumper_outputs, next_id = _budget_counter(
+                                       encoding.jumpers, budget,
+                                       weights.get('jumpers', 1), next_id)
+                counter_clauses = drilled_clauses + jumper_clauses
+            new_bound_clauses = _cost_bound_clauses(budget, weights,
+                                                    drilled_outputs,
+                                                    jumper_outputs)
+            new_bound_clauses.extend([-var_id]
+                                         for var_id, cost in position_costs
+                                         if cost >= budget)
+            if new_bound_clauses != bound_clauses:
+                bound_clauses = new_bound_clauses
+                restart = True
+                break
+
+    return top.best()
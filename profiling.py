@@ -0,0 +1,302 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Per-phase CPU and memory profiling of placement runs.
+
+A `Profiler` is an `instrument.Hooks` which profiles each phase reported by
+`placer.place` separately:
+
+    with profiling.Profiler("cpu") as prof:
+        for placement in placer.place(board, components, nets, hooks=prof):
+            ...
+    prof.write("profile-output")
+    prof.print_summary()
+
+In "cpu" mode each phase gets its own `cProfile.Profile`, which is written
+out as a pstats file. In "mem" mode allocations are traced with tracemalloc,
+the peak allocation within each phase is recorded, and the memory allocated
+(and not freed) during each phase is written out as a collapsed-stack file,
+suitable for flamegraph.pl and similar tools. Frames are named after the
+function they are in, eg. `_Op._distribute_ors (wff.py:123)`, and
+allocations made by the profiler itself are left out.
+
+When phases nest, CPU time and allocation stacks are attributed to the
+innermost phase, whereas the peak allocation of a phase includes that of the
+phases nested within it. Memory profiling clears tracemalloc's traces at each
+phase boundary.
+
+"""
+
+__all__ = (
+    'MODES',
+    'Profiler',
+)
+
+import collections
+import cProfile
+import dis
+import linecache
+import os
+import pstats
+import sys
+import tracemalloc
+import types
+
+import instrument
+
+MODES = ('cpu', 'mem')
+
+# Number of frames recorded by tracemalloc for each allocation. Formula
+# rewriting is deeply recursive, so stacks are truncated to their innermost
+# frames.
+_TRACE_FRAMES = 64
+
+# Allocations made by the profiler, rather than by the code being profiled.
+_OWN_ALLOCATIONS = (
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, instrument.__file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+class Profiler(instrument.Stats):
+    """
+    Hooks which profile each phase of a placement run.
+
+    Also records everything `instrument.Stats` does.
+
+    Attributes:
+        mode: Either "cpu" or "mem".
+        profiles: In "cpu" mode, dict mapping phase names to
+            `cProfile.Profile` objects.
+        peaks: In "mem" mode, dict mapping phase names to the peak number of
+            bytes allocated within the phase, relative to the start of the
+            phase.
+        allocations: In "mem" mode, dict mapping phase names to Counters
+            which map allocation stacks (tuples of frame names, outermost
+            first) to the number of bytes allocated by the phase and not
+            freed before the next phase boundary. Frames are named
+            `qualname (file:line)`.
+
+    """
+
+    def __init__(self, mode):
+        if mode not in MODES:
+            raise ValueError("Unknown profile mode {!r}".format(mode))
+        super().__init__()
+        self.mode = mode
+        self.profiles = {}
+        self.peaks = {}
+        self.allocations = collections.OrderedDict()
+
+        self._stack = []
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.mode == "mem" and not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACE_FRAMES)
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def phase(self, name):
+        timer = super().phase(name)
+        if self.mode == "cpu":
+            return _CpuPhase(self, name, timer)
+        else:
+            return _MemPhase(self, name, timer)
+
+    def write(self, directory):
+        """
+        Write a profile of each phase to a directory.
+
+        Files are named after the phase, with a `.pstats` extension in "cpu"
+        mode, and a `.collapsed` extension in "mem" mode.
+
+        """
+        os.makedirs(directory, exist_ok=True)
+        if self.mode == "cpu":
+            for name, prof in self.profiles.items():
+                prof.dump_stats(os.path.join(directory, name + ".pstats"))
+        else:
+            for name, counter in self.allocations.items():
+                with open(os.path.join(directory, name + ".collapsed"),
+                          "w") as f:
+                    for stack, size in sorted(counter.items()):
+                        f.write("{} {}\n".format(";".join(stack), size))
+
+    def print_summary(self, file=sys.stdout, limit=5):
+        """
+        Print a summary of each phase.
+
+        In "cpu" mode the `limit` functions with the highest internal time are
+        listed for each phase. In "mem" mode the peak allocation of each phase
+        is listed.
+
+        """
+        if self.mode == "cpu":
+            for name, prof in self.profiles.items():
+                print("Phase {} ({:.4f}s)".format(
+                          name, self.timers[name].seconds),
+                      file=file)
+                stats = pstats.Stats(prof, stream=file)
+                stats.sort_stats("tottime").print_stats(limit)
+        else:
+            print("{:24} {:>10} {:>14}".format(
+                      "Phase", "Seconds", "Peak KiB"),
+                  file=file)
+            for name, peak in self.peaks.items():
+                print("{:24} {:10.4f} {:14.1f}".format(
+                          name, self.timers[name].seconds, peak / 1024),
+                      file=file)
+
+# Dict mapping file names to dicts, which map line numbers to the qualified
+# name of the function containing the line.
+_function_names = {}
+
+def _read_function_names(filename):
+    names = {}
+    try:
+        code = compile("".join(linecache.getlines(filename)), filename,
+                       "exec")
+    except (SyntaxError, ValueError):
+        return names
+
+    # Functions are visited before the functions nested within them, so that
+    # each line ends up with the innermost function's name.
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        name = getattr(code, "co_qualname", code.co_name)
+        for _, lineno in dis.findlinestarts(code):
+            if lineno is not None:
+                names[lineno] = name
+        codes.extend(c for c in code.co_consts
+                                           if isinstance(c, types.CodeType))
+    return names
+
+def _frame_name(frame):
+    location = "{}:{}".format(os.path.basename(frame.filename), frame.lineno)
+
+    if frame.filename not in _function_names:
+        _function_names[frame.filename] = _read_function_names(frame.filename)
+    name = _function_names[frame.filename].get(frame.lineno)
+    if name is None:
+        return location
+    return "{} ({})".format(name, location)
+
+class _CpuPhase():
+    """
+    Context manager which profiles a phase with cProfile.
+
+    Only one profiler may be enabled at a time, so the enclosing phase's
+    profiler is suspended while a nested phase runs.
+
+    """
+
+    def __init__(self, profiler, name, timer):
+        self._profiler = profiler
+        self._name = name
+        self._timer = timer
+
+    def __enter__(self):
+        p = self._profiler
+        if p._stack:
+            p.profiles[p._stack[-1]].disable()
+        if self._name not in p.profiles:
+            p.profiles[self._name] = cProfile.Profile()
+        p._stack.append(self._name)
+        self._timer.__enter__()
+        p.profiles[self._name].enable()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        p = self._profiler
+        p.profiles[self._name].disable()
+        self._timer.__exit__(exc_type, exc_value, traceback)
+        p._stack.pop()
+        if p._stack:
+            p.profiles[p._stack[-1]].enable()
+
+class _MemPhase():
+    """
+    Context manager which traces allocations made during a phase.
+
+    Traces are cleared at each phase boundary, so that each snapshot only
+    holds allocations made since the previous boundary. This keeps snapshots
+    cheap, but it means that memory allocated before a boundary, and freed
+    after it, is still counted towards a phase's peak.
+
+    """
+
+    def __init__(self, profiler, name, timer):
+        self._profiler = profiler
+        self._name = name
+        self._timer = timer
+
+        # Bytes allocated in this phase and not (known to be) freed, and the
+        # maximum this has reached.
+        self._live = 0
+        self._peak = 0
+
+    def _end_segment(self):
+        # Account for the allocations made by this phase since the last
+        # boundary, and then clear them.
+        current, peak = tracemalloc.get_traced_memory()
+        self._peak = max(self._peak, self._live + peak)
+        self._live += current
+
+        allocations = self._profiler.allocations.setdefault(
+                                        self._name, collections.Counter())
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+                                                            _OWN_ALLOCATIONS)
+        for stat in snapshot.statistics("traceback"):
+            stack = tuple(_frame_name(f) for f in stat.traceback)
+            allocations[stack] += stat.size
+        tracemalloc.clear_traces()
+
+    def __enter__(self):
+        p = self._profiler
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory profiling requires the Profiler to be "
+                               "used as a context manager")
+
+        if p._stack:
+            p._stack[-1]._end_segment()
+        else:
+            tracemalloc.clear_traces()
+        p._stack.append(self)
+        self._timer.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        p = self._profiler
+        self._timer.__exit__(exc_type, exc_value, traceback)
+        self._end_segment()
+        p._stack.pop()
+
+        p.peaks[self._name] = max(p.peaks.get(self._name, 0), self._peak)
+        if p._stack:
+            parent = p._stack[-1]
+            parent._peak = max(parent._peak, parent._live + self._peak)
+            parent._live += self._live
@@ -0,0 +1,334 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+A long running placement server.
+
+Clients connect to a Unix socket or a localhost TCP port, and send requests
+as JSON objects, one per line. Each request looks like:
+
+    {
+        "id": 1,
+        "session": "editor",
+        "problem": {...},
+        "max_drilled": 2,
+        "max_jumpers": 0,
+        "max_jumper_length": 0,
+        "max_solutions": 10
+    }
+
+`problem` is in the format described in the `netlist` module. The limits
+default to 0, as they do for `cli.main`, and null means unbounded.
+`max_solutions` defaults to 1. `id` and `session` are optional.
+
+Responses are also JSON lines, each carrying the `id` of the request it
+belongs to. Each placement is sent as soon as it is found:
+
+    {"id": 1, "placement": {"components": {"R1": {"1": [0, 0], ...}, ...},
+                            "drilled": [[2, 0], ...],
+                            "jumpers": [[[4, 0], [4, 1]], ...]}}
+
+and each request ends with exactly one of:
+
+    {"id": 1, "done": true, "solutions": 3}
+    {"id": 1, "infeasible": "reason"}
+    {"id": 1, "cancelled": true}
+    {"id": 1, "error": "message"}
+
+Requests on a connection are handled concurrently, up to a limit on the number
+of problems being solved at once across all connections. A connection may have
+at most 16 requests outstanding; further requests get an `error` response
+until one finishes. A request cancels any earlier request with the same
+`session` which is still running, so that an editor only pays for its latest
+edit. A request `{"session": "editor", "cancel": true}` just cancels.
+Cancellation takes effect between phases of placement, and between solutions.
+
+Modules are imported once, and prepared problems (with their positions,
+jumpers and fingerprint) and encodings are kept in memory between requests, so
+repeat requests for an unchanged problem skip straight to solving. Solvers
+keep no state between calls, so there is no solver to keep warm.
+
+"""
+
+__all__ = (
+    'serve',
+    'Server',
+)
+
+import hashlib
+import itertools
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+import cache
+import instrument
+import netlist
+import placer
+
+# Maximum number of requests which may be outstanding on one connection.
+# Further requests are refused with an error, rather than each starting a
+# thread.
+_MAX_PENDING = 16
+
+def _placement_json(placement):
+    return {
+        'components': {
+            comp.label: {t.label: placement[comp].terminal_positions[t]
+                                                     for t in comp.terminals}
+                for comp in placement},
+        'drilled': sorted(placement.drilled_holes),
+        'jumpers': sorted(placement.jumpers),
+    }
+
+class Server():
+    """
+    Solves placement requests, keeping caches warm between them.
+
+    """
+
+    def __init__(self, *, max_jobs=1, encoding_cache=None, slvr=None,
+                 max_problems=16):
+        """
+        Initialize the server.
+
+        max_jobs: Maximum number of problems to solve at once. Further
+            requests wait for a problem to finish.
+        encoding_cache: Cache for encodings. Defaults to a
+            `cache.MemoryCache`.
+        slvr: Solver to use.
+        max_problems: Maximum number of prepared problems to keep in memory.
+
+        """
+        if encoding_cache is None:
+            encoding_cache = cache.MemoryCache()
+
+        self._slots = threading.BoundedSemaphore(max_jobs)
+        self._encoding_cache = encoding_cache
+        self._problems = cache.MemoryCache(max_entries=max_problems)
+        self._slvr = slvr
+
+        # Maps each session to the cancellation event of its latest request.
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def _begin(self, session):
+        cancelled = threading.Event()
+        if session is not None:
+            with self._sessions_lock:
+                previous = self._sessions.get(session)
+                if previous is not None:
+                    previous.set()
+                self._sessions[session] = cancelled
+        return cancelled
+
+    def _end(self, session, cancelled):
+        if session is not None:
+            with self._sessions_lock:
+                if self._sessions.get(session) is cancelled:
+                    del self._sessions[session]
+
+    def _acquire_slot(self, cancelled):
+        while not self._slots.acquire(timeout=0.1):
+            if cancelled.is_set():
+                raise instrument.Cancelled
+
+    def _prepare(self, request, limits, hooks):
+        """
+        Get the prepared problem for a request, preparing it if it isn't in
+        memory already.
+
+        Requests are matched on the problem description and limits, so an
+        unchanged problem reuses the components, positions and encoding of
+        the earlier request.
+
+        """
+        key = hashlib.sha256(json.dumps([request['problem'], limits],
+                                        sort_keys=True).encode("utf-8")
+                                                          ).hexdigest()
+        prepared = self._problems.load(key)
+        if prepared is None:
+            problem = netlist.from_json(request['problem'])
+            prepared = placer.prepare(problem.board, problem.components,
+                                      problem.nets, hooks=hooks,
+                                      **limits, **problem.restrictions())
+            self._problems.store(key, prepared)
+        return prepared
+
+    def handle(self, request, send):
+        """
+        Handle a request, as described in the module docstring.
+
+        request: The request, parsed into Python objects.
+        send: Callable which is passed each response object in turn.
+
+        """
+        request_id = request.get('id')
+        session = request.get('session')
+
+        def reply(**kwargs):
+            send(dict(id=request_id, **kwargs))
+
+        cancelled = self._begin(session)
+        try:
+            if request.get('cancel'):
+                reply(done=True, solutions=0)
+                return
+
+            max_solutions = request.get('max_solutions', 1)
+            limits = {
+                'max_drilled': request.get('max_drilled', 0),
+                'max_jumpers': request.get('max_jumpers', 0),
+                'max_jumper_length': request.get('max_jumper_length', 0),
+            }
+
+            self._acquire_slot(cancelled)
+            try:
+                hooks = instrument.CancellableHooks(cancelled)
+                try:
+                    prepared = self._prepare(request, limits, hooks)
+                except (KeyError, ValueError) as e:
+                    reply(error="Invalid request: {}".format(e))
+                    return
+                placements = placer.place_prepared(
+                                  prepared,
+                                  slvr=self._slvr,
+                                  encoding_cache=self._encoding_cache,
+                                  hooks=hooks)
+                count = 0
+                for placement in itertools.islice(placements, max_solutions):
+                    if cancelled.is_set():
+                        raise instrument.Cancelled
+                    reply(placement=_placement_json(placement))
+                    count += 1
+            finally:
+                self._slots.release()
+            reply(done=True, solutions=count)
+        except instrument.Cancelled:
+            reply(cancelled=True)
+        except placer.Infeasible as e:
+            reply(infeasible=e.reason)
+        except Exception as e:
+            reply(error="{}: {}".format(type(e).__name__, e))
+        finally:
+            self._end(session, cancelled)
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def send(obj):
+            data = (json.dumps(obj) + "\n").encode("utf-8")
+            with write_lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError:
+                    # The client has gone away.
+                    pass
+
+        placement_server = self.server.placement_server
+        pending = threading.BoundedSemaphore(_MAX_PENDING)
+
+        def run(request):
+            try:
+                placement_server.handle(request, send)
+            finally:
+                pending.release()
+
+        threads = []
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if not isinstance(request, dict):
+                    raise ValueError("Request is not an object")
+            except ValueError as e:
+                send({'id': None, 'error': "Invalid request: {}".format(e)})
+                continue
+
+            # Cancelling is quick, and frees up outstanding requests, so it
+            # is done here and never refused.
+            if request.get('cancel'):
+                placement_server.handle(request, send)
+                continue
+
+            if not pending.acquire(blocking=False):
+                send({'id': request.get('id'),
+                      'error': "Too many outstanding requests"})
+                continue
+            thread = threading.Thread(target=run, args=(request,),
+                                      daemon=True)
+            try:
+                thread.start()
+            except RuntimeError as e:
+                pending.release()
+                send({'id': request.get('id'),
+                      'error': "{}: {}".format(type(e).__name__, e)})
+                continue
+            threads = [t for t in threads if t.is_alive()]
+            threads.append(thread)
+
+        # Let requests that are still running finish, in case the client has
+        # only closed its end for writing.
+        for thread in threads:
+            thread.join()
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(server, *, socket_path=None, host="127.0.0.1", port=None):
+    """
+    Serve requests until interrupted.
+
+    server: The `Server` which handles the requests.
+    socket_path: Path of a Unix socket to listen on.
+    host, port: Address to listen on, if `socket_path` is not given.
+
+    """
+    # Converting deeply nested formulae to CNF requires a lot of recursion.
+    sys.setrecursionlimit(100000)
+
+    if socket_path is not None:
+        transport = _UnixServer(socket_path, _Handler)
+    else:
+        transport = _TCPServer((host, port), _Handler)
+    transport.placement_server = server
+
+    # Shut down cleanly when terminated, so that the socket is removed.
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+
+    try:
+        with transport:
+            transport.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        if socket_path is not None:
+            os.unlink(socket_path)
@@ -29,13 +29,20 @@ to DIMACS: Each number represents a variable, negated if it's negative. Each
 inner list represents a clause in the CNF formula.
 
 Solutions are represented as a list of numbers; there is a number for each
-variable in the input formula. If the number is negative the corresponding
-variable is false, otherwise the variable is true.
+variable in the input formula, in order, so that the number for variable `i`
+is at index `i - 1`. If the number is negative the corresponding variable is
+false, otherwise the variable is true.
+
+Solvers are made by calling `make_solver`, or one of the classes in `solvers`,
+with any options. A solver keeps no state between calls to its methods, so one
+instance may be used from several threads at once.
 
 """
 
 __all__ = (
+    'DEFAULT_SOLVER',
     'LingelingSolver',
+    'make_solver',
     'PycosatSolver',
     'Unknown',
     'Unsatisfiable',
@@ -43,17 +50,17 @@ __all__ = (
 
 import abc
 import os
+import random
 import subprocess
-import sys
 import tempfile
 
 import pycosat
 
-_DEBUG = True
-
-# Dictionary mapping solver names to solver instances.
+# Dictionary mapping solver names to solver classes.
 solvers = {}
 
+DEFAULT_SOLVER = "pycosat"
+
 class Unsatisfiable(Exception):
     """The formula has no solutions."""
     pass
@@ -69,18 +76,62 @@ def _solver_class(name):
     """
     Class decorator for solvers.
 
-    Adds an instance of the class to the `solvers` dict.
+    Adds the class to the `solvers` dict.
 
     """
     def decorator(cls):
-        solvers[name] = cls()
+        solvers[name] = cls
         return cls
 
     return decorator
 
+def make_solver(name=DEFAULT_SOLVER, **kwargs):
+    """
+    Make a new solver.
+
+    name: Name of the solver, as in the `solvers` dict.
+
+    Other keyword arguments are passed to the solver's class.
+
+    """
+    return solvers[name](**kwargs)
+
 class _BaseSolver(metaclass=abc.ABCMeta):
     """Abstract base class from which all solvers are derived."""
 
+    def __init__(self, *, seed=None, log=None):
+        """
+        Initialize the solver.
+
+        seed: Seed which determines the order in which the solver searches,
+            and therefore the order in which solutions are found. None means
+            the solver's default order.
+        log: File-like object to which the solver's progress is written.
+            None means no logging.
+
+        """
+        self.seed = seed
+        self.log = log
+
+    def _write_log(self, s):
+        if self.log is not None:
+            self.log.write(s)
+
+    def _shuffle(self, cnf):
+        """
+        Shuffle the clauses of a CNF problem according to the seed.
+
+        The shuffled clauses are equivalent to the original, but a solver
+        which has no seed of its own explores them in a different order.
+
+        """
+        if self.seed is None:
+            return cnf
+        rng = random.Random(self.seed)
+        cnf = [rng.sample(clause, len(clause)) for clause in cnf]
+        rng.shuffle(cnf)
+        return cnf
+
     @abc.abstractmethod
     def solve(self, cnf):
         """
@@ -91,6 +142,34 @@ class _BaseSolver(metaclass=abc.ABCMeta):
         """
         raise NotImplemented
 
+    def _options(self):
+        """
+        Return `(name, value)` pairs for the options which can change the
+        solutions found, or the order in which they're found.
+
+        """
+        if self.seed is None:
+            return []
+        return [("seed", self.seed)]
+
+    def _describe(self, name):
+        options = self._options()
+        if not options:
+            return name
+        return "{} ({})".format(name, ", ".join("{}={!r}".format(k, v)
+                                                  for k, v in options))
+
+    @property
+    def version(self):
+        """
+        A string identifying the solver, and its version where known, along
+        with any options which change its results.
+
+        Cached solutions are only reused if this matches.
+
+        """
+        return self._describe(type(self).__name__)
+
     def itersolve(self, cnf):
         """Find all solutions to a CNF problem."""
 
@@ -110,11 +189,50 @@ class _BaseSolver(metaclass=abc.ABCMeta):
 class PycosatSolver(_BaseSolver):
     """Solver that uses pycosat."""
 
+    def __init__(self, *, prop_limit=0, **kwargs):
+        """
+        Initialize the solver.
+
+        prop_limit: Maximum number of propagations for each call to the
+            solver, after which `Unknown` is raised. 0 means no limit.
+
+        Other keyword arguments are as for `_BaseSolver`.
+
+        """
+        super().__init__(**kwargs)
+        self.prop_limit = prop_limit
+
+    def _options(self):
+        options = super()._options()
+        if self.prop_limit:
+            options.append(("prop_limit", self.prop_limit))
+        return options
+
+    @property
+    def version(self):
+        return self._describe("pycosat {}".format(pycosat.__version__))
+
     def solve(self, cnf):
-        return pycosat.solve(cnf)
+        sol = pycosat.solve(self._shuffle(cnf), prop_limit=self.prop_limit)
+        self._write_log("pycosat: {} clauses: {}\n".format(
+                            len(cnf), sol if isinstance(sol, str) else "SAT"))
+        if sol == "UNSAT":
+            raise Unsatisfiable
+        if sol == "UNKNOWN":
+            raise Unknown
+        return sol
 
     def itersolve(self, cnf):
-        return pycosat.itersolve(cnf)
+        # `pycosat.itersolve` stops without saying so when it reaches the
+        # propagation limit, so with a limit solutions are found one at a
+        # time, in order to raise `Unknown` rather than end early.
+        if self.prop_limit:
+            yield from super().itersolve(cnf)
+            return
+
+        self._write_log("pycosat: enumerating {} clauses\n".format(len(cnf)))
+        for sol in pycosat.itersolve(self._shuffle(cnf)):
+            yield sol
 
 class _DimacsSolver(_BaseSolver):
     """
@@ -125,15 +243,50 @@ class _DimacsSolver(_BaseSolver):
     """
     _ENCODING = "ascii"
 
+    def __init__(self, *, cmd=None, args=(), **kwargs):
+        """
+        Initialize the solver.
+
+        cmd: Solver executable. Defaults to the class's default.
+        args: Extra command line arguments to pass to the solver.
+
+        Other keyword arguments are as for `_BaseSolver`.
+
+        """
+        super().__init__(**kwargs)
+        self.cmd = cmd
+        self.args = tuple(args)
+
     @abc.abstractmethod
     def _get_cmd(self):
         return NotImplemented
 
+    def _get_args(self):
+        """Command line arguments, including any that implement the seed."""
+        return self.args
+
+    def _options(self):
+        options = super()._options()
+        if self.args:
+            options.append(("args", self.args))
+        return options
+
+    @property
+    def version(self):
+        return self._describe("{} {}".format(type(self).__name__,
+                                             self._get_cmd()))
+
     def solve(self, cnf):
+        # An empty clause (as produced by `cnf.preprocess` when it proves the
+        # problem unsatisfiable) can't be written in DIMACS format, since its
+        # terminating 0 would be read as the end of the following clause.
+        if any(not clause for clause in cnf):
+            raise Unsatisfiable
+
         num_clauses = len(cnf)
-        num_vars = max(abs(t) for c in cnf for t in c)
+        num_vars = max((abs(t) for c in cnf for t in c), default=0)
 
-        with subprocess.Popen(self._get_cmd(),
+        with subprocess.Popen([self._get_cmd(), *self._get_args()],
                               stdin=subprocess.PIPE,
                               stdout=subprocess.PIPE) as proc:
 
@@ -150,8 +303,7 @@ class _DimacsSolver(_BaseSolver):
             for line in proc.stdout.readlines():
                 line = line.decode(self._ENCODING)
 
-                if _DEBUG:
-                    sys.stdout.write(line)
+                self._write_log(line)
 
                 if line.startswith("s UNSATISFIABLE"):
                     raise Unsatisfiable 
@@ -159,7 +311,7 @@ class _DimacsSolver(_BaseSolver):
                 if line.startswith("v "):
                     sol += [int(x) for x in line.split()[1:]]
                     if sol[-1] == 0:
-                        return sol[:-1]
+                        return sorted(sol[:-1], key=abs)
 
             raise Unknown
 
@@ -171,8 +323,15 @@ class LingelingSolver(_DimacsSolver):
     _DEFAULT = "lingeling"
 
     def _get_cmd(self):
-        if self._ENV_VAR in os.environ:
+        if self.cmd is not None:
+            return self.cmd
+        elif self._ENV_VAR in os.environ:
             return os.environ[self._ENV_VAR]
         else:
             return self._DEFAULT
 
+    def _get_args(self):
+        if self.seed is None:
+            return self.args
+        return ("--seed={}".format(self.seed),) + self.args
+
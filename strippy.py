@@ -0,0 +1,110 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Entry point for `python -m strippy`.
+
+    python -m strippy place problem.json [options]
+
+reads a problem in the format described in the `netlist` module, and solves it
+as `cli.main` would. Options are as for `cli.main`.
+
+    python -m strippy serve (--socket PATH | --port PORT)
+
+runs a placement server, as described in the `server` module.
+
+"""
+
+__all__ = (
+    'main',
+)
+
+import argparse
+import os
+import sys
+
+import cache
+import cli
+import netlist
+import server
+import solver
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="strippy",
+                                     description='Strip board placement.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    place_parser = subparsers.add_parser(
+                         'place', help="Find placements for a problem file",
+                         add_help=False)
+    place_parser.add_argument('problem', help="Problem file")
+    place_parser.add_argument('options', nargs=argparse.REMAINDER,
+                              help="Options, as for cli.main")
+
+    serve_parser = subparsers.add_parser('serve',
+                                         help="Run a placement server")
+    address = serve_parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', default=None,
+                         help="Path of a Unix socket to listen on")
+    address.add_argument('--port', type=int, default=None,
+                         help="TCP port to listen on")
+    serve_parser.add_argument('--host', default="127.0.0.1",
+                              help="Address to listen on with --port")
+    serve_parser.add_argument('--max-jobs', type=int, default=1,
+                              help="Maximum number of problems to solve at "
+                                   "once")
+    serve_parser.add_argument('--solver', default=None,
+                              choices=sorted(solver.solvers.keys()),
+                              help="Solver to use")
+    serve_parser.add_argument('--cache-dir', default=None,
+                              help="Directory in which to keep encodings, "
+                                   "in addition to memory")
+
+    parsed_args = parser.parse_args(args if args is not None else sys.argv[1:])
+
+    if parsed_args.command == 'serve':
+        backing = (cache.Cache(os.path.join(parsed_args.cache_dir,
+                                            "encodings"))
+                       if parsed_args.cache_dir else None)
+        server.serve(
+            server.Server(
+                max_jobs=parsed_args.max_jobs,
+                encoding_cache=cache.MemoryCache(backing=backing),
+                slvr=(solver.make_solver(parsed_args.solver)
+                                      if parsed_args.solver else None)),
+            socket_path=parsed_args.socket,
+            host=parsed_args.host,
+            port=parsed_args.port)
+        return
+
+    try:
+        with open(parsed_args.problem) as f:
+            problem = netlist.load(f)
+    except (OSError, ValueError) as e:
+        print("Could not read {}: {}".format(parsed_args.problem, e),
+              file=sys.stderr)
+        sys.exit(2)
+
+    cli.main(problem.board, problem.components, problem.nets,
+             parsed_args.options, **problem.restrictions())
+
+if __name__ == "__main__":
+    main()
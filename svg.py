@@ -25,10 +25,18 @@ Module to output SVG files showing circuit board placements.
 
 
 __all__ = (
+    'Heatmap',
+    'print_heatmap',
     'print_svg',
+    'print_svg_pages',
 )
 
+import array
+import collections
+import itertools
+import shutil
 import sys
+import tempfile
 
 _LINE_WIDTH = 1.
 _GRID_CELL_SIZE = 60.
@@ -55,15 +63,14 @@ def _grid_coords_to_pixel(coords, center=False):
         y += 0.5
     return (x * _GRID_CELL_SIZE, y * _GRID_CELL_SIZE)
 
-def _draw_hole(h, file=sys.stdout):
+def _draw_hole(h):
     center = _grid_coords_to_pixel(h, center=True)
 
-    print('<circle cx="{}" cy="{}" r="{}" stroke="{}" '
-          'stroke-width="{}" fill="transparent" />'.format(
-                center[0], center[1], _HOLE_RADIUS, _HOLE_COLOR, _LINE_WIDTH),
-          file=file)
+    return ('<circle cx="{}" cy="{}" r="{}" stroke="{}" '
+            'stroke-width="{}" fill="transparent" />'.format(
+                center[0], center[1], _HOLE_RADIUS, _HOLE_COLOR, _LINE_WIDTH))
 
-def _draw_drilled_hole(h, file=sys.stdout):
+def _draw_drilled_hole(h):
     center = _grid_coords_to_pixel(h, center=True)
 
     r = _CROSS_SIZE / 2.
@@ -73,65 +80,64 @@ def _draw_drilled_hole(h, file=sys.stdout):
                     ((center[0] + r, center[1] - r),
                      (center[0] - r, center[1] + r)))
 
-    for i in range(2):
-        print('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
-              'stroke-width="{}" />'.format(
+    return "\n".join(
+            '<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
+            'stroke-width="{}" />'.format(
                 cross_coords[i][0][0], cross_coords[i][0][1],
                 cross_coords[i][1][0], cross_coords[i][1][1],
-                _CROSS_COLOR, _LINE_WIDTH),
-              file=file)
+                _CROSS_COLOR, _LINE_WIDTH)
+                for i in range(2))
 
-def _draw_jumper(j, file=sys.stdout):
+def _draw_jumper(j):
     points = tuple(_grid_coords_to_pixel(h, center=True) for h in j)
 
-    print('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
-          'stroke-width="{}" />'.format(
-            points[0][0], points[0][1], points[1][0], points[1][1],
-            _JUMPER_COLOR, _JUMPER_WIDTH),
-          file=file)
+    return ('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
+            'stroke-width="{}" />'.format(
+                points[0][0], points[0][1], points[1][0], points[1][1],
+                _JUMPER_COLOR, _JUMPER_WIDTH))
 
-def _draw_trace(t, file=sys.stdout):
+def _draw_trace(t):
     points = tuple(_grid_coords_to_pixel(t[i], center=True) for i in range(2))
 
-    print('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
-          'stroke-width="{}" />'.format(
-            points[0][0], points[0][1], points[1][0], points[1][1],
-            _TRACE_COLOR, _LINE_WIDTH),
-          file=file)
+    return ('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
+            'stroke-width="{}" />'.format(
+                points[0][0], points[0][1], points[1][0], points[1][1],
+                _TRACE_COLOR, _LINE_WIDTH))
 
-def _draw_component_terminals(comp, pos, file=sys.stdout):
+def _draw_component_terminals(comp, pos):
+    out = []
     for terminal, hole in pos.terminal_positions.items():
         center = _grid_coords_to_pixel(hole, center=True)
 
-        print('<circle cx="{}" cy="{}" r="{}" stroke="{}" '
-              'stroke-width="{}" fill="transparent" />'.format(
-                  center[0], center[1], _TERMINAL_RADIUS, comp.color,
-                  _LINE_WIDTH),
-              file=file)
+        out.append('<circle cx="{}" cy="{}" r="{}" stroke="{}" '
+                   'stroke-width="{}" fill="transparent" />'.format(
+                       center[0], center[1], _TERMINAL_RADIUS, comp.color,
+                       _LINE_WIDTH))
 
-        print('<text x="{}" y="{}" font-family="{}" font-size="{}" '
-              'color="{}">{}</text>'.format(
-                  center[0], center[1], _FONT_FAMILY, _FONT_SIZE, _FONT_COLOR,
-                  terminal.label),
-              file=file)
+        out.append('<text x="{}" y="{}" font-family="{}" font-size="{}" '
+                   'color="{}">{}</text>'.format(
+                       center[0], center[1], _FONT_FAMILY, _FONT_SIZE,
+                       _FONT_COLOR, terminal.label))
 
-def _draw_component_label(comp, pos, file=sys.stdout):
+    return "\n".join(out)
+
+def _draw_component_label(comp, pos):
     top_left_cell = tuple(min(c[i] for c in pos.occupies) for i in range(2))
     top_left_pixel = _grid_coords_to_pixel(top_left_cell)
 
-    print('<text x="{}" y="{}" font-family="{}" font-size="{}" '
-          'color="{}">{}</text>'.format(
-              top_left_pixel[0], top_left_pixel[1] + _FONT_SIZE, _FONT_FAMILY,
-              _FONT_SIZE, _FONT_COLOR, comp.label),
-          file=file)
+    return ('<text x="{}" y="{}" font-family="{}" font-size="{}" '
+            'color="{}">{}</text>'.format(
+                top_left_pixel[0], top_left_pixel[1] + _FONT_SIZE,
+                _FONT_FAMILY, _FONT_SIZE, _FONT_COLOR, comp.label))
 
-def _draw_component_occupies(comp, pos, file=sys.stdout):
+def _draw_component_occupies(comp, pos):
     """
     Draw a translucent region over cells that are occupied by a component.
 
     However, don't draw near edges of the region.
 
     """
+    out = []
     for cell in pos.occupies:
         top_left = _grid_coords_to_pixel(cell)
 
@@ -149,66 +155,319 @@ def _draw_component_occupies(comp, pos, file=sys.stdout):
         for y_offset in (-1, 0, 1):
             for x_offset in (-1, 0, 1):
                 if (cell[0] + x_offset, cell[1] + y_offset) in pos.occupies:
-                    print('<rect x="{}" y="{}" width="{}" height="{}" '
-                          'fill="{}" fill-opacity="{}" />'.format(
-                              xs[1 + x_offset],
-                              ys[1 + y_offset],
-                              xs[2 + x_offset] - xs[1 + x_offset],
-                              ys[2 + y_offset] - ys[1 + y_offset],
-                              comp.color,
-                              _OCCUPY_OPACITY),
-                         file=file)
+                    out.append('<rect x="{}" y="{}" width="{}" height="{}" '
+                               'fill="{}" fill-opacity="{}" />'.format(
+                                   xs[1 + x_offset],
+                                   ys[1 + y_offset],
+                                   xs[2 + x_offset] - xs[1 + x_offset],
+                                   ys[2 + y_offset] - ys[1 + y_offset],
+                                   comp.color,
+                                   _OCCUPY_OPACITY))
+
+    return "\n".join(out)
+
+def _board_size(board):
+    return tuple(_GRID_CELL_SIZE * (1 + max(h[i] for h in board.holes))
+                 for i in (0, 1))
 
-def print_svg(placements, file=sys.stdout):
-    placements = list(placements)
+def _draw_board(board, board_id):
+    """
+    Draw the static parts of a board, as a definition to be referenced by
+    each placement on the board.
 
-    def placement_size(placement):
-        size = tuple(_GRID_CELL_SIZE * (1 + max(h[i] 
-                                              for h in placement.board.holes))
-                 for i in (0, 1))
-        return size
+    """
+    size = _board_size(board)
+
+    out = ['<defs>', '<g id="{}">'.format(board_id)]
+    out.append('<rect x="0" y="0" width="{}" height="{}" '
+               'fill="transparent" stroke="{}" stroke-width="{}" />'.format(
+                   size[0], size[1], _BORDER_COLOR, _LINE_WIDTH))
+    out.extend(_draw_hole(hole) for hole in sorted(board.holes))
+    out.extend(_draw_trace(trace) for trace in sorted(board.traces))
+    out.extend(('</g>', '</defs>'))
+
+    return "\n".join(out)
+
+def _draw_placement(placement, board_id, offset):
+    out = ['<g transform="translate({} {})">'.format(*offset),
+           '<use xlink:href="#{}" />'.format(board_id)]
+
+    out.extend(_draw_drilled_hole(hole) for hole in placement.drilled_holes)
+    out.extend(_draw_jumper(jumper) for jumper in placement.jumpers)
+
+    for comp, pos in placement.items():
+        out.append(_draw_component_terminals(comp, pos))
+        out.append(_draw_component_occupies(comp, pos))
+        out.append(_draw_component_label(comp, pos))
 
-    widths, heights = zip(*(placement_size(placement)
-                                                 for placement in placements))
-    doc_width = max(widths) + _PLACEMENT_SEP
-    doc_height = (sum(heights) + _PLACEMENT_SEP * (len(placements) - 1) +
-                    _PLACEMENT_SEP)
+    out.append('</g>')
 
-    print('<svg width="{}" height="{}" '
-          'xmlns="http://www.w3.org/2000/svg">'.format(doc_width, doc_height),
-          file=file)
+    return "\n".join(out)
+
+class _SvgWriter():
+    """
+    Write placements into an SVG document as they arrive.
+
+    Placements are stacked vertically. The document's dimensions are not
+    known until the last placement has been written, so a fixed-width
+    placeholder is written in their place and fixed up by `close`. This
+    requires `file` to be seekable.
+
+    Each board is drawn once, as a definition that is then referenced by
+    each placement on the board.
+
+    """
+
+    # Width reserved for the document's size attributes.
+    _SIZE_ATTRS_WIDTH = 48
+
+    def __init__(self, file):
+        self._file = file
+        self._board_ids = {}
+        self._width = 0
+        self._vertical_offset = _PLACEMENT_SEP / 2
+        self.count = 0
+
+        self._size_attrs_pos = file.tell()
+        self._write_size_attrs()
+        file.write(' xmlns="http://www.w3.org/2000/svg" '
+                   'xmlns:xlink="http://www.w3.org/1999/xlink">\n')
+
+    def _write_size_attrs(self):
+        doc_width = self._width + _PLACEMENT_SEP
+        doc_height = self._vertical_offset + _PLACEMENT_SEP / 2
+        if self.count == 0:
+            doc_height = 0
+        attrs = '<svg width="{}" height="{}"'.format(doc_width, doc_height)
+        self._file.write(attrs.ljust(self._SIZE_ATTRS_WIDTH))
+
+    def write(self, placement):
+        board = placement.board
+        if id(board) not in self._board_ids:
+            # Keep a reference to the board, so that its ID isn't reused.
+            board_id = "board{}".format(len(self._board_ids))
+            self._board_ids[id(board)] = board_id, board
+            self._file.write(_draw_board(board, board_id) + "\n")
+        board_id, _ = self._board_ids[id(board)]
+
+        if self.count > 0:
+            self._vertical_offset += _PLACEMENT_SEP
+        self._file.write(_draw_placement(
+                             placement, board_id,
+                             (_PLACEMENT_SEP / 2, self._vertical_offset)) +
+                         "\n")
+
+        size = _board_size(board)
+        self._width = max(self._width, size[0])
+        self._vertical_offset += size[1]
+        self.count += 1
+
+    def close(self):
+        self._file.write('</svg>\n')
+
+        end = self._file.tell()
+        self._file.seek(self._size_attrs_pos)
+        self._write_size_attrs()
+        self._file.seek(end)
+
+def print_svg(placements, file=sys.stdout):
+    """
+    Write an SVG document showing each of a sequence of placements.
 
-    vertical_offset = _PLACEMENT_SEP / 2
+    Placements are written as they are produced by `placements`, so memory use
+    is constant. If `file` is not seekable the document is assembled in a
+    temporary file, and copied to `file` once complete.
+
+    Returns:
+        The number of placements written.
+
+    """
+    if not file.seekable():
+        with tempfile.TemporaryFile(mode="w+") as tmp:
+            count = print_svg(placements, file=tmp)
+            tmp.seek(0)
+            shutil.copyfileobj(tmp, file)
+        return count
+
+    writer = _SvgWriter(file)
     for placement in placements:
-        print('<g transform="translate({} {})">'.format(
-                                         _PLACEMENT_SEP / 2, vertical_offset),
-              file=file)
+        writer.write(placement)
+    writer.close()
 
-        size = placement_size(placement)
+    return writer.count
 
-        print('<rect x="0" y="0" width="{}" height="{}" '
-              'fill="transparent" stroke="{}" stroke-width="{}" />'.format(
-                      size[0], size[1], _BORDER_COLOR, _LINE_WIDTH),
-              file=file)
-        for hole in placement.board.holes:
-            _draw_hole(hole, file=file)
+def print_svg_pages(placements, path_format, per_page=1):
+    """
+    Write placements into a series of SVG documents.
 
-        for trace in placement.board.traces:
-            _draw_trace(trace, file=file)
+    path_format: Format string which gives the path of each page when
+        formatted with the page number (starting at 0). For example
+        "output/solution-{}.svg".
+    per_page: Maximum number of placements on each page.
 
-        for hole in placement.drilled_holes:
-            _draw_drilled_hole(hole, file=file)
+    Returns:
+        The number of pages written.
+
+    """
+    placements = iter(placements)
+    page = 0
+    while True:
+        # Don't create a page until there is a placement to put on it.
+        try:
+            first = next(placements)
+        except StopIteration:
+            break
+
+        with open(path_format.format(page), "w") as f:
+            writer = _SvgWriter(f)
+            writer.write(first)
+            for placement in itertools.islice(placements, per_page - 1):
+                writer.write(placement)
+            writer.close()
+
+        page += 1
+
+    return page
+
+class Heatmap():
+    """
+    Summary statistics over a stream of placements on a common board.
+
+    Counts are kept per board cell (or per jumper), so memory use depends only
+    on the board and the components, and not on the number of placements
+    accumulated.
+
+    Attributes:
+        board: The board that the placements are on.
+        count: Number of placements accumulated.
+        occupancy: Mapping of each component to an array, giving for each cell
+            in `cells` the number of placements in which the component
+            occupies the cell.
+        drilled: Array giving for each cell in `cells` the number of
+            placements in which the hole in that cell is drilled.
+        jumpers: Mapping of jumpers to the number of placements in which
+            they're present.
+
+    """
 
-        for jumper in placement.jumpers:
-            _draw_jumper(jumper, file=file)
+    def __init__(self, board):
+        self.board = board
+        self.cells = sorted(board.spaces | board.holes)
+        self._cell_idx = {cell: idx for idx, cell in enumerate(self.cells)}
+        self.count = 0
+        self.occupancy = {}
+        self.drilled = array.array('L', [0] * len(self.cells))
+        self.jumpers = collections.Counter()
+
+    def add(self, placement):
+        """
+        Accumulate the statistics of a placement.
+
+        """
+        if placement.board is not self.board:
+            raise ValueError("Placement is not on the heatmap's board")
 
         for comp, pos in placement.items():
-            _draw_component_terminals(comp, pos, file=file)
-            _draw_component_occupies(comp, pos, file=file)
-            _draw_component_label(comp, pos, file=file)
+            if comp not in self.occupancy:
+                self.occupancy[comp] = array.array('L', [0] * len(self.cells))
+            counts = self.occupancy[comp]
+            for cell in pos.occupies:
+                counts[self._cell_idx[cell]] += 1
+
+        for hole in placement.drilled_holes:
+            self.drilled[self._cell_idx[hole]] += 1
+
+        self.jumpers.update(placement.jumpers)
+
+        self.count += 1
+
+    def _draw_cells(self, counts, color):
+        out = []
+        for cell, n in zip(self.cells, counts):
+            if n == 0:
+                continue
+            top_left = _grid_coords_to_pixel(cell)
+            out.append('<rect x="{}" y="{}" width="{}" height="{}" '
+                       'fill="{}" fill-opacity="{:.3f}" />'.format(
+                           top_left[0], top_left[1],
+                           _GRID_CELL_SIZE, _GRID_CELL_SIZE,
+                           color, n / self.count))
+        return "\n".join(out)
+
+    def _draw_jumpers(self):
+        out = []
+        for jumper, n in sorted(self.jumpers.items()):
+            points = tuple(_grid_coords_to_pixel(h, center=True)
+                                                               for h in jumper)
+            out.append('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="{}" '
+                       'stroke-width="{}" stroke-opacity="{:.3f}" />'.format(
+                           points[0][0], points[0][1],
+                           points[1][0], points[1][1],
+                           _JUMPER_COLOR, 4 * _JUMPER_WIDTH, n / self.count))
+        return "\n".join(out)
+
+    def print_svg(self, file=sys.stdout):
+        """
+        Write the heatmap as an SVG document.
+
+        There is one panel for each component, showing how often it occupies
+        each cell, followed by panels showing how often each hole is drilled
+        and how often each jumper is used.
+
+        """
+        panels = [(comp.label, self._draw_cells(counts, comp.color))
+                  for comp, counts in sorted(self.occupancy.items(),
+                                             key=lambda item: item[0].label)]
+        panels.append(("Drilled", self._draw_cells(self.drilled,
+                                                   _CROSS_COLOR)))
+        panels.append(("Jumpers", self._draw_jumpers()))
+
+        size = _board_size(self.board)
+        panel_height = size[1] + _FONT_SIZE + _PLACEMENT_SEP
+        doc_width = size[0] + _PLACEMENT_SEP
+        doc_height = panel_height * len(panels)
+
+        out = ['<svg width="{}" height="{}" '
+               'xmlns="http://www.w3.org/2000/svg" '
+               'xmlns:xlink="http://www.w3.org/1999/xlink">'.format(
+                   doc_width, doc_height),
+               _draw_board(self.board, "board")]
+        for idx, (title, body) in enumerate(panels):
+            top = idx * panel_height + _PLACEMENT_SEP / 2
+            out.append('<text x="{}" y="{}" font-family="{}" font-size="{}" '
+                       'color="{}">{} ({} placements)</text>'.format(
+                           _PLACEMENT_SEP / 2, top + _FONT_SIZE,
+                           _FONT_FAMILY, _FONT_SIZE, _FONT_COLOR,
+                           title, self.count))
+            out.append('<g transform="translate({} {})">'.format(
+                           _PLACEMENT_SEP / 2, top + _FONT_SIZE))
+            out.append(body)
+            out.append('<use xlink:href="#board" />')
+            out.append('</g>')
+        out.append('</svg>')
+
+        file.write("\n".join(out) + "\n")
+
+def print_heatmap(placements, file=sys.stdout):
+    """
+    Write an SVG heatmap summarising a sequence of placements.
+
+    See `Heatmap` for details. All placements must be on the same board. If
+    there are no placements nothing is written.
+
+    Returns:
+        The number of placements summarised.
+
+    """
+    heatmap = None
+    for placement in placements:
+        if heatmap is None:
+            heatmap = Heatmap(placement.board)
+        heatmap.add(placement)
 
-        print('</g>', file=file)
-        vertical_offset += size[1] + _PLACEMENT_SEP
+    if heatmap is None:
+        return 0
 
-    print('</svg>', file=file)
+    heatmap.print_svg(file=file)
 
+    return heatmap.count
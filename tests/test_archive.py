@@ -0,0 +1,87 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the archive module.
+
+"""
+
+import pytest
+
+import component
+import archive
+import placer
+
+def _placement_key(components, placement):
+    return (tuple(placer.position_key(c, placement[c]) for c in components),
+            sorted(placement.drilled_holes),
+            sorted(placement.jumpers))
+
+def test_round_trip(tmp_path):
+    r1 = component.Resistor("R1", 1)
+    r2 = component.Resistor("R2", 1)
+    components = [r1, r2]
+    board = component.StripBoard((3, 2))
+    nets = [(r1.terminals[0], r2.terminals[0]),
+            (r1.terminals[1], r2.terminals[1])]
+    placements = list(placer.place(board, components, nets, max_drilled=1,
+                                   max_jumpers=1, max_jumper_length=1))
+    assert placements
+
+    path = str(tmp_path / "placements.arc")
+    with open(path, "wb") as f:
+        writer = archive.ArchiveWriter(f, board, components,
+                                       max_jumper_length=1)
+        assert writer.write_all(placements) == len(placements)
+
+    with archive.ArchiveReader(path, components) as reader:
+        assert len(reader) == len(placements)
+        assert ([_placement_key(components, p) for p in reader] ==
+                [_placement_key(components, p) for p in placements])
+
+    # Stand-in components are made from the header if none are given.
+    with archive.ArchiveReader(path) as reader:
+        assert [c.label for c in reader.components] == ["R1", "R2"]
+        assert ([_placement_key(reader.components, p) for p in reader] ==
+                [_placement_key(components, p) for p in placements])
+
+def test_empty(tmp_path):
+    path = str(tmp_path / "empty.arc")
+    with open(path, "wb") as f:
+        archive.ArchiveWriter(f, component.StripBoard((2, 2)),
+                              [component.Resistor("R1", 1)])
+    with archive.ArchiveReader(path) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+
+@pytest.mark.parametrize('length', [0, 4, 12, 20, None])
+def test_not_archive(tmp_path, length):
+    path = str(tmp_path / "truncated.arc")
+    with open(path, "wb") as f:
+        archive.ArchiveWriter(f, component.StripBoard((2, 2)),
+                              [component.Resistor("R1", 1)])
+    with open(path, "r+b") as f:
+        if length is None:
+            # Corrupt the magic instead.
+            f.write(b"X")
+        else:
+            f.truncate(length)
+    with pytest.raises(ValueError, match="not a placement archive"):
+        archive.ArchiveReader(path)
@@ -0,0 +1,77 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the batch module.
+
+"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+import batch
+
+_EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(
+                                             os.path.abspath(__file__))),
+                         "examples")
+
+def _write_manifest(tmp_path, jobs):
+    path = str(tmp_path / "manifest.json")
+    with open(path, "w") as f:
+        json.dump({'jobs': jobs}, f)
+    return path
+
+def test_read_manifest(tmp_path):
+    path = _write_manifest(tmp_path, [
+        {'script': "dip2.py", 'args': ["--max-drilled=2"]},
+        {'name': "netlist", 'problem': "dip2.netlist", 'timeout': 60},
+    ])
+    jobs = batch.read_manifest(path, memory=1024)
+    assert [(j.name, j.kind, os.path.basename(j.path), j.args, j.timeout,
+             j.memory) for j in jobs] == [
+        ("dip2", "script", "dip2.py", ["--max-drilled=2"], None, 1024),
+        ("netlist", "problem", "dip2.netlist", [], 60, 1024),
+    ]
+
+@pytest.mark.parametrize('jobs', [
+    [{'args': []}],
+    [{'script': "a.py", 'problem': "a.json"}],
+    [{'script': "a.py"}, {'problem': "a.json"}],
+])
+def test_read_manifest_invalid(tmp_path, jobs):
+    with pytest.raises(ValueError):
+        batch.read_manifest(_write_manifest(tmp_path, jobs))
+
+def test_problem_without_json_extension(tmp_path):
+    # Problems are run as problem files whatever their extension, not as
+    # Python scripts.
+    shutil.copy(os.path.join(_EXAMPLES, "dip2.json"),
+                str(tmp_path / "dip2.netlist"))
+    jobs = batch.read_manifest(_write_manifest(tmp_path, [
+        {'problem': "dip2.netlist", 'args': ["--max-drilled=2"]},
+    ]))
+    output_dir = str(tmp_path / "output")
+    with open(os.devnull, "w") as devnull:
+        results = batch.run_jobs(jobs, output_dir, workers=1, file=devnull)
+    assert [r['status'] for r in results] == ["ok"]
+    assert os.path.exists(os.path.join(output_dir, "dip2", "stats.json"))
@@ -0,0 +1,97 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the cache module.
+
+"""
+
+import os
+import pickle
+import zlib
+
+import cache
+
+def test_store_and_load(tmp_path):
+    c = cache.Cache(str(tmp_path))
+    c.store("key", {'a': [1, 2, 3]})
+    assert c.load("key") == {'a': [1, 2, 3]}
+    assert c.load("missing") is None
+
+def test_corrupt_entries_are_misses(tmp_path):
+    c = cache.Cache(str(tmp_path))
+    bad_entries = {
+        'not_zlib': b"not compressed",
+        'truncated': zlib.compress(pickle.dumps(list(range(100)))[:-5]),
+        # A pickle of a class in a module which doesn't exist.
+        'missing_class': zlib.compress(
+                             b"\x80\x04\x8c\x0bno_such_mod\x94\x8c\x03Foo"
+                             b"\x94\x93\x94."),
+        'empty': b"",
+    }
+    for key, data in bad_entries.items():
+        with open(c._path(key), "wb") as f:
+            f.write(data)
+
+    for key in bad_entries:
+        assert c.load(key) is None
+        assert not os.path.exists(c._path(key))
+
+def test_eviction(tmp_path):
+    c = cache.Cache(str(tmp_path), max_entries=2)
+    for i in range(3):
+        c.store(str(i), i)
+        # Make the order of the entries unambiguous.
+        os.utime(c._path(str(i)), (i, i))
+    c.store("3", 3)
+    assert c.load("0") is None
+    assert c.load("1") is None
+    assert c.load("2") == 2
+    assert c.load("3") == 3
+
+def test_eviction_by_size(tmp_path):
+    c = cache.Cache(str(tmp_path), max_entries=None, max_bytes=2000)
+    # Random bytes don't compress, so each entry is a little over its length.
+    c.store("0", os.urandom(400))
+    os.utime(c._path("0"), (0, 0))
+    c.store("1", os.urandom(1200))
+    os.utime(c._path("1"), (1, 1))
+    c.store("2", os.urandom(1000))
+
+    # "1" doesn't fit alongside the newer "2", but the older "0" still does.
+    assert c.load("1") is None
+    assert c.load("0") is not None
+    assert c.load("2") is not None
+
+    # An entry which can never fit is not stored, and evicts nothing.
+    c.store("3", os.urandom(3000))
+    assert c.load("3") is None
+    assert c.load("0") is not None
+    assert c.load("2") is not None
+
+def test_memory_cache_backing(tmp_path):
+    backing = cache.Cache(str(tmp_path))
+    backing.store("key", "value")
+
+    c = cache.MemoryCache(max_entries=1, backing=backing)
+    assert c.load("key") == "value"
+    c.store("other", "other value")
+    assert backing.load("other") == "other value"
+    assert c.load("key") == "value"
@@ -0,0 +1,168 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the cnf module.
+
+`cnf.preprocess` is checked against brute force on random small formulae.
+
+"""
+
+import itertools
+import pickle
+import random
+
+import pytest
+
+import cnf
+
+def _random_formula(rng, max_vars, max_clauses, max_length):
+    num_vars = rng.randint(1, max_vars)
+    clauses = [[rng.choice((1, -1)) * rng.randint(1, num_vars)
+                    for _ in range(rng.randint(1, max_length))]
+                        for _ in range(rng.randint(1, max_clauses))]
+    frozen = [v for v in range(1, num_vars + 1) if rng.random() < 0.4]
+    return num_vars, clauses, frozen
+
+def _satisfies(values, clauses):
+    # `values[v]` is the value of variable `v`.
+    return all(any(values[l] if l > 0 else not values[-l] for l in clause)
+                   for clause in clauses)
+
+def _solutions(num_vars, clauses):
+    # Every assignment of variables 1 to `num_vars` which satisfies `clauses`,
+    # with `None` standing in for variable 0.
+    for values in itertools.product((False, True), repeat=num_vars):
+        values = (None,) + values
+        if _satisfies(values, clauses):
+            yield values
+
+def _check_preprocess(num_vars, clauses, frozen, extra):
+    """
+    Check `cnf.preprocess` on one formula.
+
+    The simplified formula must have the same solutions as the original over
+    the frozen variables, with `extra` (clauses over the frozen variables)
+    added to both, and every solution of the simplified formula must be
+    turned into a solution of the original by the reconstruction.
+
+    """
+    simplified, reconstruction = cnf.preprocess(clauses, frozen=frozen,
+                                                num_vars=num_vars)
+    assert all(0 < abs(l) <= num_vars for c in simplified for l in c)
+
+    def project(solutions):
+        return {tuple(values[v] for v in frozen) for values in solutions}
+
+    original = list(_solutions(num_vars, clauses + extra))
+    if [] in simplified:
+        assert not original
+        return
+
+    found = list(_solutions(num_vars, simplified + extra))
+    assert project(found) == project(original)
+
+    for values in found:
+        sol = [v if values[v] else -v for v in range(1, num_vars + 1)]
+        extended = reconstruction.extend(sol, num_vars)
+        assert _satisfies((None,) + tuple(l > 0 for l in extended), clauses)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_preprocess_brute_force(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        num_vars, clauses, frozen = _random_formula(rng, max_vars=8,
+                                                    max_clauses=20,
+                                                    max_length=4)
+        extra = []
+        if frozen:
+            extra = [[rng.choice((1, -1)) * rng.choice(frozen)
+                          for _ in range(rng.randint(1, 2))]
+                             for _ in range(rng.randint(0, 2))]
+        _check_preprocess(num_vars, clauses, frozen, [])
+        _check_preprocess(num_vars, clauses, frozen, extra)
+
+def test_preprocess_fixes_eliminated_variables():
+    # Variable 2 only occurs positively, and is eliminated. It must still be
+    # fixed, so that enumerating solutions doesn't yield each one twice.
+    clauses, _ = cnf.preprocess([[1, 2]], frozen=[1], num_vars=3)
+    assert len(list(_solutions(3, clauses))) == 2
+
+def test_preprocess_unsatisfiable():
+    clauses, _ = cnf.preprocess([[1], [-1, 2], [-2]])
+    assert clauses == [[]]
+
+def test_solve():
+    a, b = cnf.Var("a"), cnf.Var("b")
+    expr = cnf.exactly_one([a, b])
+    sols = list(cnf.solve(expr))
+    assert sorted((s[a], s[b]) for s in sols) == [(False, True),
+                                                  (True, False)]
+
+def test_var_pool_ids_are_dense():
+    with cnf.VarPool() as pool:
+        pvars = [cnf.Var() for _ in range(5)]
+    assert [v.id for v in pvars] == [1, 2, 3, 4, 5]
+    assert len(pool) == 5
+
+def test_vars_outside_a_pool():
+    assert cnf.current_pool() is None
+    v1, v2 = cnf.Var("a"), cnf.Var()
+    assert v1.id != v2.id
+    assert v1.name == "a"
+    assert v2.name == "t{}".format(v2.id)
+
+def test_var_pool_names():
+    with cnf.VarPool() as pool:
+        kind = pool.add_kind("{} at {}", ["a", "b"], 3)
+        v1 = cnf.Var((kind, 1, 2))
+        v2 = cnf.Var("named")
+        v3 = cnf.Var()
+    assert v1.name == "b at 2"
+    assert v2.name == "named"
+    assert v3.name == "t3"
+
+def test_var_pool_keys_hold_no_objects():
+    class Thing():
+        pass
+    things = [Thing() for _ in range(3)]
+    with cnf.VarPool() as pool:
+        kind = pool.add_kind("{}", things)
+        for i in range(len(things)):
+            cnf.Var((kind, i))
+    # The objects are only referenced by the kind's table, not per variable.
+    assert all(isinstance(k, int) for k in pool._var_kinds)
+    assert all(isinstance(k, int) for k in pool._var_indices)
+
+def test_var_pool_extend():
+    with cnf.VarPool() as pool:
+        kind = pool.add_kind("x{}", 10)
+        cnf.Var((kind, 0))
+        cnf.Var("shared")
+    with cnf.VarPool(len(pool) + 1) as part_pool:
+        kind = part_pool.add_kind("y{},{}", 2, 2)
+        cnf.Var((kind, 1, 0))
+        cnf.Var("private")
+
+    # Parts come back from worker processes pickled.
+    part_pool = pickle.loads(pickle.dumps(part_pool))
+    pool.extend(part_pool)
+    assert [pool.name(i) for i in range(1, 5)] == ["x0", "shared", "y1,0",
+                                                    "private"]
@@ -0,0 +1,98 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the netlist module.
+
+"""
+
+import json
+import os
+
+import pytest
+
+import netlist
+
+_EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))),
+                        "examples", "dip2.json")
+
+def test_load_example():
+    with open(_EXAMPLE) as f:
+        problem = netlist.load(f)
+    labels = [c.label for c in problem.components]
+    assert labels == ["IC1", "R1", "R2"]
+    assert len(problem.nets) == 4
+    assert all(len(net) == 2 for net in problem.nets)
+    assert problem.restrictions() == {'pins': None, 'keep_out': None,
+                                      'component_keep_out': None}
+
+def test_restrictions():
+    problem = netlist.from_json({
+        'board': {'size': [3, 2]},
+        'components': [{'label': "R1", 'type': "resistor",
+                        'max_length': 1}],
+        'nets': [["R1.1"], ["R1.2"]],
+        'pins': {'R1': {'1': [0, 0]}},
+        'keep_out': [[2, 1]],
+    })
+    r1, = problem.components
+    assert problem.pins == {r1: {r1.terminals[0]: (0, 0)}}
+    assert set(problem.keep_out) == {(2, 1)}
+
+@pytest.mark.parametrize('obj', [
+    {},
+    {'board': {'size': [2, 2]}, 'components': [], 'nets': [["R1.1"]]},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "transistor"}], 'nets': []},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': 1},
+                    {'label': "R1", 'type': "resistor", 'max_length': 1}],
+     'nets': []},
+    {'board': 1, 'components': [], 'nets': []},
+    {'board': {'size': [4, 4]},
+     'components': [{'label': "IC1", 'type': "dip", 'num_terminals': 5}],
+     'nets': []},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': "x"}],
+     'nets': []},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': True}],
+     'nets': []},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': 1,
+                     'allow_vertical': "no"}],
+     'nets': []},
+    {'board': {'size': [4, 4]},
+     'components': [{'label': "IC1", 'type': "dip", 'num_terminals': 4,
+                     'row_spacing': 2.5}],
+     'nets': []},
+    {'board': {'size': [3, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': 1}],
+     'nets': [["R1.1"]]},
+    {'board': {'size': [3, 2]},
+     'components': [{'label': "R1", 'type': "resistor", 'max_length': 1}],
+     'nets': [["R1.1"], ["R1.2", "R1.1"]]},
+])
+def test_invalid(obj):
+    with pytest.raises(ValueError) as excinfo:
+        netlist.loads(json.dumps(obj))
+    # The message is shown to the user, so must say what is wrong.
+    assert str(excinfo.value)
@@ -0,0 +1,469 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the placer module.
+
+The problems here are small enough to enumerate every placement, so that the
+other entry points can be checked against `placer.place`.
+
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import threading
+import time
+
+import pytest
+
+import cache
+import component
+import instrument
+import placer
+import solver
+
+from bench import problems
+
+def _problem():
+    r1 = component.Resistor("R1", 1)
+    r2 = component.Resistor("R2", 1)
+    nets = [(r1.terminals[1], r2.terminals[0]),
+            (r2.terminals[1], r1.terminals[0])]
+    return component.StripBoard((3, 2)), [r1, r2], nets
+
+def _key(placement):
+    return (tuple(sorted((c.label, placer.position_key(c, placement[c]))
+                             for c in placement)),
+            frozenset(placement.drilled_holes),
+            frozenset(placement.jumpers))
+
+def _moves(previous, placement):
+    return sum(placer.position_key(c, placement[c]) !=
+                   placer.position_key(c, previous[c])
+               for c in placement)
+
+def test_place():
+    board, components, nets = _problem()
+    keys = {_key(p) for p in placer.place(board, components, nets,
+                                          max_drilled=0)}
+    assert len(keys) == 12
+
+def test_position_key():
+    board = component.StripBoard((3, 2))
+    r1 = component.Resistor("R1", 1)
+    r2 = component.Resistor("R2", 1)
+    keys1 = [placer.position_key(r1, p) for p in placer.get_positions(r1,
+                                                                      board)]
+    keys2 = [placer.position_key(r2, p) for p in placer.get_positions(r2,
+                                                                      board)]
+    assert keys1 == keys2
+    assert len(set(keys1)) == len(keys1)
+
+def test_prepare():
+    board, components, nets = _problem()
+    problem = placer.prepare(board, components, nets, max_drilled=0)
+    first = [_key(p) for p in placer.place_prepared(problem)]
+    stats = instrument.Stats()
+    second = [_key(p) for p in placer.place_prepared(problem, hooks=stats)]
+    assert first == second
+    assert len(first) == 12
+    # The encoding is kept by the prepared problem.
+    assert "encode" not in stats.timers
+
+def test_prepare_threads():
+    ring = problems.resistor_ring(4, 3, 4, max_length=2)
+    problem = placer.prepare(ring.board, ring.components, ring.nets,
+                             **ring.options)
+    num_threads = 4
+    barrier = threading.Barrier(num_threads)
+    stats = [instrument.Stats() for _ in range(num_threads)]
+    encodings = [None] * num_threads
+
+    def run(idx):
+        barrier.wait()
+        encodings[idx] = problem.encode(hooks=stats[idx])
+        problem.get_quality_table()
+
+    threads = [threading.Thread(target=run, args=(idx,))
+                   for idx in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Only one thread encodes the problem, and the others wait for it.
+    assert sum("encode" in s.timers for s in stats) == 1
+    assert all(encoding is encodings[0] for encoding in encodings)
+
+def _ring_problem():
+    return problems.resistor_ring(4, 3, 4, max_length=2)
+
+def _place_problem(problem, **kwargs):
+    return placer.place(problem.board, problem.components, problem.nets,
+                        **problem.options, **kwargs)
+
+def _place_first(problem, n, **kwargs):
+    placements = _place_problem(problem, **kwargs)
+    try:
+        return [_key(p) for p in itertools.islice(placements, n)]
+    finally:
+        placements.close()
+
+@pytest.mark.parametrize('num_first', [0, 5, 48])
+def test_solution_cache(tmp_path, num_first):
+    problem = _ring_problem()
+    expected = [_key(p) for p in _place_problem(problem)]
+    assert len(expected) == 48
+    solution_cache = cache.Cache(str(tmp_path))
+
+    # Stop part way through, then resume.
+    first = _place_first(problem, num_first, solution_cache=solution_cache)
+    assert first == expected[:num_first]
+    stats = instrument.Stats()
+    second = [_key(p) for p in _place_problem(problem, hooks=stats,
+                                              solution_cache=solution_cache)]
+    assert second[:num_first] == first
+    assert sorted(second) == sorted(expected)
+    assert stats.counters["cached_solutions"] == num_first
+
+    # The log is now complete, so it is replayed without solving.
+    stats = instrument.Stats()
+    third = [_key(p) for p in _place_problem(problem, hooks=stats,
+                                             solution_cache=solution_cache)]
+    assert third == second
+    assert stats.counters["cached_solutions"] == 48
+    assert "solve" not in stats.timers
+
+def test_solution_cache_invalidation(tmp_path, monkeypatch):
+    problem = _ring_problem()
+    solution_cache = cache.Cache(str(tmp_path))
+    list(_place_problem(problem, solution_cache=solution_cache))
+
+    def num_cached(**kwargs):
+        stats = instrument.Stats()
+        list(_place_problem(problem, hooks=stats,
+                            solution_cache=solution_cache, **kwargs))
+        return stats.counters["cached_solutions"]
+
+    assert num_cached() == 48
+    assert num_cached(slvr=solver.make_solver(seed=1)) == 0
+    monkeypatch.setattr(placer, 'ENCODING_VERSION',
+                        placer.ENCODING_VERSION + 1)
+    assert num_cached() == 0
+
+def test_solution_cache_unknown(tmp_path):
+    problem = _ring_problem()
+    solution_cache = cache.Cache(str(tmp_path))
+    slvr = solver.make_solver(prop_limit=1)
+
+    # The solver gives up, so the log must not be stored as complete, or the
+    # second run would replay it rather than try again.
+    for _ in range(2):
+        with pytest.raises(solver.Unknown):
+            list(_place_problem(problem, slvr=slvr,
+                                solution_cache=solution_cache))
+
+def test_solution_cache_shared_log():
+    problem = _ring_problem()
+    expected = sorted(_key(p) for p in _place_problem(problem))
+    solution_cache = cache.MemoryCache()
+    _place_first(problem, 5, solution_cache=solution_cache)
+
+    # Two runs load the same log object from the cache. Both replay it and go
+    # on to find new solutions, and then they take turns.
+    first, second = [_place_problem(problem, solution_cache=solution_cache)
+                         for _ in range(2)]
+    list(itertools.islice(first, 6))
+    list(itertools.islice(second, 7))
+    for _ in itertools.zip_longest(first, second):
+        pass
+
+    found = [_key(p) for p in _place_problem(problem,
+                                             solution_cache=solution_cache)]
+    assert sorted(found) == expected
+
+def test_infeasible():
+    board, components, nets = _problem()
+    with pytest.raises(placer.Infeasible):
+        placer.check(component.StripBoard((1, 1)), components, nets)
+
+@pytest.mark.parametrize('max_drilled', [0, 1])
+def test_eco(max_drilled):
+    board, components, nets = _problem()
+    placements = list(placer.place(board, components, nets,
+                                   max_drilled=max_drilled))
+    previous = placements[-1]
+
+    found = list(placer.eco(previous, board, components, nets,
+                            max_drilled=max_drilled))
+    moves = [_moves(previous, p) for p in found]
+
+    # Each placement is found once, in order of the number of moves.
+    assert moves == sorted(moves)
+    assert moves[0] == 0
+    assert len({_key(p) for p in found}) == len(found)
+    assert {_key(p) for p in found} == {_key(p) for p in placements}
+
+    limited = list(placer.eco(previous, board, components, nets,
+                              max_drilled=max_drilled, max_moves=1))
+    assert ({_key(p) for p in limited} ==
+            {_key(p) for p, m in zip(found, moves) if m <= 1})
+
+def test_eco_added_component():
+    board, components, nets = _problem()
+    previous = next(placer.place(board, components, nets, max_drilled=0))
+
+    # Add a resistor in parallel with the others. It's new, so moving it is free.
+    r3 = component.Resistor("R3", 1)
+    nets = [nets[0] + (r3.terminals[0],), nets[1] + (r3.terminals[1],)]
+    placement = next(placer.eco(previous, board, components + [r3], nets,
+                                max_drilled=0, max_moves=0))
+    assert all(placer.position_key(c, placement[c]) ==
+                   placer.position_key(c, previous[c])
+               for c in components)
+
+def test_parallel_encoding_matches_serial():
+    board, components, nets = _problem()
+    results = []
+    for workers in (1, 2):
+        stats = instrument.Stats()
+        keys = [_key(p) for p in placer.place(board, components, nets,
+                                              max_drilled=1, max_jumpers=1,
+                                              max_jumper_length=1,
+                                              workers=workers, hooks=stats)]
+        results.append((keys, stats.families))
+    assert results[0] == results[1]
+
+def test_cost_rejects_unknown_weights():
+    q = placer.Quality(1, 2, 3, 4, 5)
+    assert q.cost({'drilled': 2}) == 18
+    with pytest.raises(ValueError):
+        q.cost({'jumper': 5})
+    board, components, nets = _problem()
+    for prune in (False, True):
+        with pytest.raises(ValueError):
+            placer.place_best(board, components, nets, 1,
+                              weights={'length': 1}, prune=prune)
+
+def test_rank():
+    board, components, nets = _problem()
+    kwargs = dict(max_drilled=1, max_jumpers=1, max_jumper_length=1)
+    weights = {'area': 2, 'jumpers': 3}
+    placements = list(placer.place(board, components, nets, **kwargs))
+    costs = sorted(placer.quality(p, nets).cost(weights) for p in placements)
+
+    # Repeats of a placement are only ranked once.
+    ranked = placer.rank(placements + placements, nets, 5, weights=weights)
+    assert [r.cost for r in ranked] == costs[:5]
+    assert len({_key(r.placement) for r in ranked}) == 5
+    assert all(r.cost == r.quality.cost(weights) for r in ranked)
+
+@pytest.mark.parametrize('k', [1, 4, 50])
+@pytest.mark.parametrize('make_problem', problems.SUITES['quick'])
+def test_place_best_prune(make_problem, k):
+    problem = make_problem()
+    results = [[r.cost for r in placer.place_best(problem.board,
+                                                  problem.components,
+                                                  problem.nets, k,
+                                                  prune=prune,
+                                                  **problem.options)]
+                   for prune in (False, True)]
+    assert results[0] == results[1]
+
+def test_sweep():
+    board, components, nets = _problem()
+    points = placer.sweep(board, components, nets, drilled=range(2),
+                          jumpers=range(2), jumper_lengths=range(2),
+                          workers=1)
+    assert len(points) == 8
+    for point in points:
+        expected = next(placer.place(board, components, nets,
+                                     max_jumper_length=point.max_jumper_length,
+                                     max_drilled=point.max_drilled,
+                                     max_jumpers=point.max_jumpers),
+                        None)
+        assert point.feasible == (expected is not None)
+        if point.feasible:
+            assert len(point.placement.drilled_holes) <= point.max_drilled
+            assert len(point.placement.jumpers) <= point.max_jumpers
+
+def _sweep_points(workers):
+    board, components, nets = _problem()
+    return [(p.limits, p.feasible)
+                for p in placer.sweep(board, components, nets,
+                                      drilled=range(3), jumpers=range(2),
+                                      jumper_lengths=range(2),
+                                      workers=workers)]
+
+def test_sweep_workers():
+    assert _sweep_points(2) == _sweep_points(1)
+
+def test_sweep_with_other_threads(monkeypatch):
+    expected = _sweep_points(1)
+
+    # With other threads running the process isn't forked, and points are
+    # solved in this process instead.
+    def no_pool(*args, **kwargs):
+        raise AssertionError("Forked with other threads running")
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", no_pool)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+                                                         _sweep_points(2)))
+    thread.start()
+    thread.join()
+    assert results == [expected]
+
+def _estimate_configs():
+    configs = [lambda make=make: (lambda p: (p.board, p.components, p.nets,
+                                             p.options))(make())
+                   for make in problems.SUITES['quick']]
+
+    def keep_out():
+        board, components, nets = _problem()
+        return board, components, nets, dict(keep_out=[(1, 0)],
+                                             max_drilled=0)
+
+    def pins():
+        board, components, nets = _problem()
+        r1 = components[0]
+        return board, components, nets, dict(
+                     pins={r1: {r1.terminals[0]: (0, 0)}},
+                     component_keep_out={components[1]: [(2, 1)]},
+                     max_drilled=1)
+
+    def unbounded():
+        board, components, nets = _problem()
+        return board, components, nets, dict(max_jumper_length=1)
+
+    return configs + [keep_out, pins, unbounded]
+
+@pytest.mark.parametrize('make_config', _estimate_configs())
+def test_estimate(make_config):
+    board, components, nets, kwargs = make_config()
+    estimate = placer.estimate(board, components, nets, **kwargs)
+
+    stats = instrument.Stats()
+    placer.prepare(board, components, nets, **kwargs).encode(hooks=stats)
+    assert dict(estimate.families) == dict(stats.families)
+
+def _has_placement(board, components, nets, kwargs):
+    try:
+        return next(placer.place(board, components, nets, **kwargs),
+                    None) is not None
+    except placer.Infeasible:
+        return False
+
+@pytest.mark.parametrize('make_problem', problems.SUITES['quick'])
+def test_place_smallest(make_problem):
+    problem = make_problem()
+    max_size = (max(x for x, y in problem.board.holes) + 1,
+                max(y for x, y in problem.board.holes) + 1)
+    size, placement = placer.place_smallest(problem.components,
+                                            problem.nets, max_size,
+                                            **problem.options)
+
+    # Every smaller size, in order of area, has no placement.
+    sizes = sorted(((w, h) for w in range(1, max_size[0] + 1)
+                               for h in range(1, max_size[1] + 1)),
+                   key=lambda s: (s[0] * s[1], s[1], s[0]))
+    for smaller in sizes[:sizes.index(size)]:
+        assert not _has_placement(component.StripBoard(smaller),
+                                  problem.components, problem.nets,
+                                  problem.options)
+    assert _has_placement(component.StripBoard(size), problem.components,
+                          problem.nets, problem.options)
+    assert all(x < size[0] and y < size[1]
+                   for pos in placement.values()
+                   for x, y in pos.occupies)
+
+def test_place_smallest_infeasible():
+    board, components, nets = _problem()
+    with pytest.raises(placer.Infeasible):
+        placer.place_smallest(components, nets, (1, 2), max_drilled=0)
+
+def _jumper_cells(jumper):
+    (x1, y1), (x2, y2) = jumper
+    return {(x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)}
+
+def test_restrictions():
+    board, components, nets = _problem()
+    r1, r2 = components
+    kwargs = dict(max_drilled=1, max_jumpers=1, max_jumper_length=1)
+    pins = {r1: {r1.terminals[0]: (0, 0)}}
+    keep_out = [(2, 1)]
+    component_keep_out = {r2: [(0, 1)]}
+
+    def allowed(p):
+        return (p[r1].terminal_positions[r1.terminals[0]] == (0, 0) and
+                not any((2, 1) in p[c].occupies for c in components) and
+                not any((2, 1) in _jumper_cells(j) for j in p.jumpers) and
+                (0, 1) not in p[r2].occupies)
+
+    placements = list(placer.place(board, components, nets, **kwargs))
+    expected = {_key(p) for p in placements if allowed(p)}
+    found = {_key(p) for p in placer.place(board, components, nets,
+                                           pins=pins, keep_out=keep_out,
+                                           component_keep_out=
+                                               component_keep_out,
+                                           **kwargs)}
+    assert 0 < len(expected) < len(placements)
+    assert found == expected
+
+async def _collect(agen):
+    return [p async for p in agen]
+
+@pytest.mark.parametrize('make_problem', problems.SUITES['quick'])
+def test_aplace(make_problem):
+    problem = make_problem()
+    expected = [_key(p) for p in placer.place(problem.board,
+                                              problem.components,
+                                              problem.nets,
+                                              **problem.options)]
+    found = asyncio.run(_collect(placer.aplace(problem.board,
+                                               problem.components,
+                                               problem.nets,
+                                               **problem.options)))
+    assert [_key(p) for p in found] == expected
+
+def test_aplace_stop_early():
+    problem = problems.resistor_ring(4, 3, 4, max_length=2)
+    num_threads = threading.active_count()
+
+    async def first():
+        agen = placer.aplace(problem.board, problem.components, problem.nets,
+                             max_queued=1, **problem.options)
+        try:
+            async for placement in agen:
+                break
+        finally:
+            await agen.aclose()
+
+        # While the event loop is still running, the thread placing the
+        # problem notices that the consumer has gone, and finishes.
+        deadline = time.monotonic() + 10
+        while (threading.active_count() > num_threads and
+                   time.monotonic() < deadline):
+            await asyncio.sleep(0.05)
+        return placement
+
+    assert asyncio.run(first()) is not None
+    assert threading.active_count() == num_threads
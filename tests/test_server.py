@@ -0,0 +1,178 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the server module.
+
+"""
+
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+import server
+
+_EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))),
+                        "examples", "dip2.json")
+
+with open(_EXAMPLE) as f:
+    _PROBLEM = json.load(f)
+
+class _Client():
+    def __init__(self, address):
+        self._sock = socket.create_connection(address, timeout=60)
+        self._rfile = self._sock.makefile('rb')
+
+    def send(self, obj):
+        self.send_line(json.dumps(obj))
+
+    def send_line(self, line):
+        self._sock.sendall((line + "\n").encode("utf-8"))
+
+    def recv(self):
+        return json.loads(self._rfile.readline().decode("utf-8"))
+
+    def recv_until_done(self, ids):
+        """Receive responses until each request in `ids` has ended."""
+        responses = {request_id: [] for request_id in ids}
+        remaining = set(ids)
+        while remaining:
+            response = self.recv()
+            responses[response['id']].append(response)
+            if 'placement' not in response:
+                remaining.remove(response['id'])
+        return responses
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+
+@pytest.fixture
+def placement_server():
+    placement_server = server.Server(max_jobs=2)
+    transport = server._TCPServer(("127.0.0.1", 0), server._Handler)
+    transport.placement_server = placement_server
+    thread = threading.Thread(target=transport.serve_forever, daemon=True)
+    thread.start()
+    client = _Client(transport.server_address)
+    try:
+        yield placement_server, client
+    finally:
+        client.close()
+        transport.shutdown()
+        transport.server_close()
+
+def test_concurrent_requests(placement_server):
+    placement_server, client = placement_server
+
+    # Requests on one connection don't wait for earlier ones: while request 1
+    # waits for a slot, later requests are read, and cancel it.
+    for _ in range(2):
+        placement_server._slots.acquire()
+    try:
+        client.send({'id': 1, 'session': "editor", 'problem': _PROBLEM,
+                     'max_drilled': 2})
+        client.send({'id': 2, 'problem': _PROBLEM, 'max_drilled': 2,
+                     'max_solutions': 2})
+        client.send({'id': 3, 'problem': _PROBLEM, 'max_drilled': 2})
+        client.send({'id': 4, 'session': "editor", 'cancel': True})
+        assert client.recv_until_done([1, 4]) == {
+            1: [{'id': 1, 'cancelled': True}],
+            4: [{'id': 4, 'done': True, 'solutions': 0}],
+        }
+    finally:
+        for _ in range(2):
+            placement_server._slots.release()
+
+    responses = client.recv_until_done([2, 3])
+    assert responses[2][-1] == {'id': 2, 'done': True, 'solutions': 2}
+    assert len(responses[2]) == 3
+    assert responses[3][-1] == {'id': 3, 'done': True, 'solutions': 1}
+    placement = responses[3][0]['placement']
+    assert set(placement['components']) == {"IC1", "R1", "R2"}
+
+def test_session_cancellation(placement_server):
+    placement_server, client = placement_server
+
+    # With every slot taken, requests wait until they are cancelled.
+    for _ in range(2):
+        placement_server._slots.acquire()
+    try:
+        client.send({'id': 1, 'session': "editor", 'problem': _PROBLEM})
+        client.send({'id': 2, 'session': "editor", 'problem': _PROBLEM})
+
+        # Whichever request started first is cancelled by the other.
+        first = client.recv()
+        assert first['cancelled']
+        second = 3 - first['id']
+
+        client.send({'id': 3, 'session': "editor", 'cancel': True})
+        assert client.recv_until_done([second, 3]) == {
+            second: [{'id': second, 'cancelled': True}],
+            3: [{'id': 3, 'done': True, 'solutions': 0}],
+        }
+    finally:
+        for _ in range(2):
+            placement_server._slots.release()
+
+def test_too_many_outstanding_requests(placement_server):
+    placement_server, client = placement_server
+
+    for _ in range(2):
+        placement_server._slots.acquire()
+    try:
+        for request_id in range(server._MAX_PENDING + 1):
+            client.send({'id': request_id, 'session': str(request_id),
+                         'problem': _PROBLEM, 'max_drilled': 2})
+        assert client.recv() == {'id': server._MAX_PENDING,
+                                 'error': "Too many outstanding requests"}
+    finally:
+        for _ in range(2):
+            placement_server._slots.release()
+
+    responses = client.recv_until_done(range(server._MAX_PENDING))
+    assert all(r[-1]['done'] for r in responses.values())
+
+@pytest.mark.parametrize('line', [
+    "not json",
+    "[1, 2]",
+])
+def test_invalid_line(placement_server, line):
+    _, client = placement_server
+    client.send_line(line)
+    response = client.recv()
+    assert response['id'] is None
+    assert response['error'].startswith("Invalid request: ")
+
+@pytest.mark.parametrize('problem', [
+    {},
+    {'board': {'size': [2, 2]},
+     'components': [{'label': "R1", 'type': "transistor"}], 'nets': []},
+])
+def test_invalid_problem(placement_server, problem):
+    _, client = placement_server
+    client.send({'id': 7, 'problem': problem})
+    response, = client.recv_until_done([7])[7]
+    assert response['id'] == 7
+    assert response['error'].startswith("Invalid request: ")
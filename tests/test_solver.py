@@ -0,0 +1,93 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Tests for the solver module.
+
+"""
+
+import threading
+
+import pytest
+
+import solver
+
+def _at_most_one(n):
+    """A formula satisfied when at most one of `n` variables is true."""
+    return [[-i, -j] for i in range(1, n + 1) for j in range(i + 1, n + 1)]
+
+def _pigeonhole(n):
+    """An unsatisfiable formula: `n` pigeons in `n - 1` holes."""
+    def var(pigeon, hole):
+        return pigeon * (n - 1) + hole + 1
+    cnf = [[var(p, h) for h in range(n - 1)] for p in range(n)]
+    cnf += [[-var(p, h), -var(q, h)] for h in range(n - 1)
+                                     for p in range(n)
+                                     for q in range(p + 1, n)]
+    return cnf
+
+def _solution_set(slvr, cnf):
+    return {tuple(sol) for sol in slvr.itersolve(cnf)}
+
+def test_itersolve():
+    slvr = solver.make_solver()
+    assert len(_solution_set(slvr, _at_most_one(8))) == 9
+    assert _solution_set(slvr, _pigeonhole(5)) == set()
+
+def test_prop_limit():
+    slvr = solver.make_solver(prop_limit=1)
+    with pytest.raises(solver.Unknown):
+        slvr.solve(_pigeonhole(5))
+    # Reaching the limit part way through an enumeration is an error, rather
+    # than the end of the solutions.
+    with pytest.raises(solver.Unknown):
+        list(slvr.itersolve(_pigeonhole(5)))
+
+def test_make_solver():
+    first = solver.make_solver(seed=1)
+    second = solver.make_solver(seed=2, prop_limit=100)
+    assert first is not second
+    assert (first.seed, first.prop_limit) == (1, 0)
+    assert (second.seed, second.prop_limit) == (2, 100)
+    assert first.version != second.version
+    assert solver.make_solver(seed=1).version == first.version
+
+def test_threads():
+    cnf = _at_most_one(10)
+    expected = _solution_set(solver.make_solver(), cnf)
+    slvrs = [solver.make_solver(seed=seed) for seed in range(4)]
+    # One of the solvers is shared between two threads.
+    slvrs.append(slvrs[0])
+    barrier = threading.Barrier(len(slvrs))
+    results = [None] * len(slvrs)
+
+    def run(idx):
+        barrier.wait()
+        results[idx] = [_solution_set(slvrs[idx], cnf) for _ in range(20)]
+
+    threads = [threading.Thread(target=run, args=(idx,))
+                   for idx in range(len(slvrs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(r == expected for result in results for r in result)
@@ -0,0 +1,137 @@
+# Copyright (c) 2015 Matthew Earl
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+#     The above copyright notice and this permission notice shall be included
+#     in all copies or substantial portions of the Software.
+# 
+#     THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#     OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#     MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN
+#     NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#     DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#     OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+#     USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Tests for the svg module.
+
+The documents written are parsed, to check that they are well formed.
+
+"""
+
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import component
+import placer
+import svg
+
+_SVG = "{http://www.w3.org/2000/svg}"
+_HREF = "{http://www.w3.org/1999/xlink}href"
+
+def _placements(size, **kwargs):
+    r1 = component.Resistor("R1", 1)
+    r2 = component.Resistor("R2", 1)
+    nets = [(r1.terminals[1], r2.terminals[0]),
+            (r2.terminals[1], r1.terminals[0])]
+    return list(placer.place(component.StripBoard(size), [r1, r2], nets,
+                             **kwargs))
+
+class _Pipe(io.StringIO):
+    # Output which can't be seeked, like a pipe or a terminal.
+    def seekable(self):
+        return False
+
+def _check_document(text, sizes):
+    """
+    Check an SVG document of placements, on boards of the given sizes (in
+    cells), in order.
+
+    """
+    root = ET.fromstring(text)
+    sep = svg._PLACEMENT_SEP
+    cell = svg._GRID_CELL_SIZE
+    assert float(root.get('width')) == (max(w for w, h in sizes) * cell + sep
+                                            if sizes else sep)
+    assert float(root.get('height')) == sum(h * cell + sep for w, h in sizes)
+
+    # Each board is defined once, and each placement refers to its board.
+    board_ids = [g.get('id') for defs in root.iter(_SVG + "defs")
+                                 for g in defs.findall(_SVG + "g")]
+    assert len(board_ids) == len(set(board_ids)) == len(set(sizes))
+    uses = [u.get(_HREF) for u in root.iter(_SVG + "use")]
+    assert len(uses) == len(sizes)
+    assert {u.lstrip("#") for u in uses} == set(board_ids)
+    return root
+
+@pytest.mark.parametrize('file_type', [io.StringIO, _Pipe])
+def test_print_svg(file_type):
+    placements = _placements((3, 2), max_drilled=0)
+    placements += _placements((2, 3), max_drilled=0)[:2]
+    f = file_type()
+    assert svg.print_svg(placements, file=f) == len(placements)
+    _check_document(f.getvalue(), [(3, 2)] * (len(placements) - 2) +
+                                  [(2, 3)] * 2)
+
+def test_print_svg_empty():
+    f = io.StringIO()
+    assert svg.print_svg([], file=f) == 0
+    _check_document(f.getvalue(), [])
+
+def test_print_svg_pages(tmp_path):
+    placements = _placements((3, 2), max_drilled=0)[:5]
+    path_format = str(tmp_path / "page-{}.svg")
+    assert svg.print_svg_pages(placements, path_format, per_page=2) == 3
+    for page, num in enumerate([2, 2, 1]):
+        with open(path_format.format(page)) as f:
+            _check_document(f.read(), [(3, 2)] * num)
+    assert not (tmp_path / "page-3.svg").exists()
+
+def test_heatmap():
+    placements = _placements((3, 2), max_drilled=1, max_jumpers=1,
+                             max_jumper_length=1)
+    board = placements[0].board
+    heatmap = svg.Heatmap(board)
+    for placement in placements:
+        heatmap.add(placement)
+
+    assert heatmap.count == len(placements)
+    for comp, counts in heatmap.occupancy.items():
+        assert list(counts) == [sum(cell in p[comp].occupies
+                                        for p in placements)
+                                    for cell in heatmap.cells]
+    assert list(heatmap.drilled) == [sum(cell in p.drilled_holes
+                                             for p in placements)
+                                         for cell in heatmap.cells]
+    assert sum(heatmap.jumpers.values()) == sum(len(p.jumpers)
+                                                    for p in placements)
+
+    f = io.StringIO()
+    assert svg.print_heatmap(placements, file=f) == len(placements)
+    root = ET.fromstring(f.getvalue())
+    # A panel for each component, drilled holes and jumpers.
+    titles = [t.text for t in root.iter(_SVG + "text")]
+    assert titles == ["{} ({} placements)".format(name, len(placements))
+                          for name in ("R1", "R2", "Drilled", "Jumpers")]
+    opacities = [float(e.get('fill-opacity') or e.get('stroke-opacity'))
+                     for e in root.iter()
+                     if e.get('fill-opacity') or e.get('stroke-opacity')]
+    assert opacities and all(0 < o <= 1 for o in opacities)
+
+def test_heatmap_other_board():
+    heatmap = svg.Heatmap(component.StripBoard((3, 2)))
+    with pytest.raises(ValueError):
+        heatmap.add(_placements((3, 2), max_drilled=0)[0])
+
+def test_print_heatmap_empty():
+    f = io.StringIO()
+    assert svg.print_heatmap([], file=f) == 0
+    assert f.getvalue() == ""
@@ -240,6 +240,13 @@ class _Formula(metaclass=abc.ABCMeta):
 
         clauses = self._eliminate_constants(formula._extract_clauses())
 
+        # The clauses are sets, ordered by the identity of their variables, so
+        # sort them by variable ID to produce the same expression every run.
+        def term_key(term):
+            return term.atom.id, term.negated
+        clauses = sorted((sorted(clause, key=term_key) for clause in clauses),
+                         key=lambda clause: [term_key(t) for t in clause])
+
         expr = cnf.Expr(
             cnf.Clause(cnf.Term(term.atom, negated=term.negated)
                                                             for term in clause)